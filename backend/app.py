@@ -3,12 +3,16 @@ from flask import Flask
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from config import Config
-from models import db, User
+from models import db, User, ensure_columns
 from werkzeug.security import generate_password_hash
 from routes.auth import auth_bp
 from routes.feedback import feedback_bp
 from routes.analysis import analysis_bp
 from routes.admin import admin_bp
+from routes.jobs import jobs_bp
+from services.job_runner import start_job_runner
+from services.model_registry import registry
+from services.near_duplicates import backfill_signatures
 import os
 
 def create_app():
@@ -30,10 +34,14 @@ def create_app():
     app.register_blueprint(feedback_bp)
     app.register_blueprint(analysis_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(jobs_bp)
     
     
     with app.app_context():
         db.create_all()
+        ensure_columns()
+        if Config.NEAR_DUPLICATE_ENABLED:
+            backfill_signatures()
         
        
         admin = User.query.filter_by(username=Config.DEFAULT_ADMIN_USERNAME).first()
@@ -47,11 +55,26 @@ def create_app():
             db.session.commit()
             print(f"默认管理员账户已创建: {Config.DEFAULT_ADMIN_USERNAME} / {Config.DEFAULT_ADMIN_PASSWORD}")
     
+    # With the debug reloader only the serving child process runs jobs and loads the model
+    serving_process = not Config.DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    if Config.JOB_RUNNER_ENABLED and serving_process:
+        start_job_runner(app)
+    if Config.MODEL_PRELOAD and serving_process:
+        registry.preload()
+    
     @app.route('/api/health', methods=['GET'])
     def health_check():
        
         return {'status': 'ok', 'message': '服务运行正常'}, 200
     
+    @app.route('/api/ready', methods=['GET'])
+    def readiness_check():
+        # 200 only once the model is loaded, so load balancers route to warm instances only
+        readiness = registry.readiness()
+        messages = {'ready': '模型已就绪', 'loading': '模型加载中', 'failed': '模型加载失败', 'not_loaded': '模型未加载'}
+        code = 200 if readiness['status'] == 'ready' else 503
+        return {**readiness, 'message': messages.get(readiness['status'], '')}, code
+    
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,89 @@
+"""
+Aspect lexicon micro-benchmark.
+
+Per-call cost of the compiled lexicon (services/aspect_lexicon.py) against the linear
+keyword scans it replaced, on batch-sized inputs:
+  - label mapping: aspect names as the model writes them ("hotel location", "早餐", ...)
+  - keyword extraction: which aspects each review mentions
+Also counts inputs where the two disagree (the lexicon prefers the longest keyword).
+
+Usage (from the backend directory):
+    python benchmarks/bench_aspect_lexicon.py [--batch-size 64] [--repeat 200]
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from services.aspect_extractor import ASPECT_KEYWORDS, ASPECT_LEXICON, COMMON_ASPECTS, ASPECT_NAME_EN
+from benchmarks.sample_reviews import SAMPLE_REVIEWS
+
+LABELS = [
+    'Room', 'room cleanliness', 'hotel location', 'Location', 'price', 'value for money', 'Service',
+    'front desk staff', 'Food', 'breakfast buffet', 'Facilities', 'swimming pool', 'wifi connection',
+    '房间', '早餐', '前台服务', '交通', '性价比', 'parking lot', 'noise level'
+]
+
+
+def linear_map(label):
+    """The previous _map_to_standard_aspect: exact match, then first substring hit in table order."""
+    key = label.strip().lower()
+    for allowed in ASPECT_NAME_EN.values():
+        if key == allowed.lower():
+            return allowed
+    if key in ASPECT_KEYWORDS:
+        return ASPECT_KEYWORDS[key]
+    for keyword, aspect in ASPECT_KEYWORDS.items():
+        if keyword in key:
+            return aspect
+    return None
+
+
+def linear_find(text):
+    """The previous candidate scan: every keyword of both tables tested against the text."""
+    text_lower = text.lower()
+    found = {ASPECT_NAME_EN[name] for name, keywords in COMMON_ASPECTS.items() if any(k.lower() in text_lower for k in keywords)}
+    found.update(aspect for keyword, aspect in ASPECT_KEYWORDS.items() if keyword in text_lower)
+    return [aspect for aspect in ASPECT_NAME_EN.values() if aspect in found]
+
+
+def per_call_us(fn, inputs, repeat):
+    seconds = min(timeit.repeat(lambda: fn(inputs), number=repeat, repeat=3))
+    return seconds / repeat / len(inputs) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    labels = [LABELS[i % len(LABELS)] for i in range(args.batch_size)]
+    reviews = [SAMPLE_REVIEWS[i % len(SAMPLE_REVIEWS)] for i in range(args.batch_size)]
+
+    rows = [
+        ('map: linear scan', per_call_us(lambda xs: [linear_map(x) for x in xs], labels, args.repeat)),
+        # Uncached cost first, then the steady state where the model repeats the same names
+        ('map: lexicon (uncached)', per_call_us(lambda xs: [ASPECT_LEXICON._map(x) for x in xs], labels, args.repeat)),
+        ('map: lexicon batch', per_call_us(ASPECT_LEXICON.map_many, labels, args.repeat)),
+        ('find: linear scan', per_call_us(lambda xs: [linear_find(x) for x in xs], reviews, args.repeat)),
+        ('find: lexicon per text', per_call_us(lambda xs: [ASPECT_LEXICON.find(x) for x in xs], reviews, args.repeat)),
+        ('find: lexicon batch', per_call_us(ASPECT_LEXICON.find_many, reviews, args.repeat)),
+    ]
+
+    print(f"\nbatch size {args.batch_size}, {len(ASPECT_LEXICON.keywords)} keywords")
+    print(f"{'method':<28}{'us/input':>10}")
+    for name, us in rows:
+        print(f"{name:<28}{us:>10.2f}")
+
+    map_diffs = [(x, linear_map(x), ASPECT_LEXICON.map(x)) for x in LABELS if linear_map(x) != ASPECT_LEXICON.map(x)]
+    find_diffs = sum(1 for x in SAMPLE_REVIEWS if linear_find(x) != ASPECT_LEXICON.find(x))
+    print(f"\nlabel mappings changed: {len(map_diffs)}")
+    for label, before, after in map_diffs:
+        print(f"  {label!r}: {before} -> {after}")
+    print(f"reviews with different candidates: {find_diffs}/{len(SAMPLE_REVIEWS)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Inference backend benchmark.
+
+Loads the analyzer once per Config.INFERENCE_BACKEND and reports, over the sample
+review set:
+  - latency of single-review calls (analyze, analyze_with_aspects): median and p95
+  - batch throughput of analyze_with_aspects_batch: reviews/s and generated tokens/s
+
+Usage (from the backend directory):
+    python benchmarks/bench_backends.py [--backends transformers onnx] [--batch-size 8]
+"""
+import argparse
+import gc
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from services.sentiment_analyzer import SentimentAnalyzer
+from benchmarks.sample_reviews import SAMPLE_REVIEWS
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def time_calls(fn, texts):
+    timings = []
+    for text in texts:
+        start = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), percentile(timings, 0.95)
+
+
+def run_backend(backend, batch_size):
+    Config.INFERENCE_BACKEND = backend
+    start = time.perf_counter()
+    analyzer = SentimentAnalyzer()
+    load_seconds = time.perf_counter() - start
+
+    # Warm-up call, excluded from timings
+    analyzer.analyze_with_aspects(SAMPLE_REVIEWS[0])
+
+    overall_p50, overall_p95 = time_calls(analyzer.analyze, SAMPLE_REVIEWS)
+    aspects_p50, aspects_p95 = time_calls(analyzer.analyze_with_aspects, SAMPLE_REVIEWS)
+
+    tokens_before = analyzer.generation_stats['generated_tokens']
+    start = time.perf_counter()
+    analyzer.analyze_with_aspects_batch(SAMPLE_REVIEWS, batch_size=batch_size)
+    batch_seconds = time.perf_counter() - start
+    tokens = analyzer.generation_stats['generated_tokens'] - tokens_before
+
+    return {
+        'load_s': load_seconds,
+        'overall_p50': overall_p50, 'overall_p95': overall_p95,
+        'aspects_p50': aspects_p50, 'aspects_p95': aspects_p95,
+        'reviews_per_s': len(SAMPLE_REVIEWS) / batch_seconds,
+        'tokens_per_s': tokens / batch_seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['transformers', 'onnx'])
+    parser.add_argument('--batch-size', type=int, default=Config.ANALYSIS_BATCH_SIZE)
+    args = parser.parse_args()
+
+    # Same device and no result cache for every backend
+    Config.DEVICE = 'cpu'
+    Config.ANALYSIS_CACHE_ENABLED = False
+
+    reports = {}
+    for backend in args.backends:
+        print(f"Running {backend}...")
+        reports[backend] = run_backend(backend, args.batch_size)
+        gc.collect()
+
+    print(f"\n{'backend':<14}{'load s':>8}{'overall p50/p95 s':>20}{'aspects p50/p95 s':>20}{'reviews/s':>11}{'tok/s':>9}")
+    for backend, r in reports.items():
+        print(
+            f"{backend:<14}{r['load_s']:>8.1f}"
+            f"{r['overall_p50']:>11.2f} / {r['overall_p95']:<6.2f}"
+            f"{r['aspects_p50']:>11.2f} / {r['aspects_p95']:<6.2f}"
+            f"{r['reviews_per_s']:>11.2f}{r['tokens_per_s']:>9.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
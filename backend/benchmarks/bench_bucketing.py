@@ -0,0 +1,73 @@
+"""
+Length bucketing benchmark.
+
+Analyzes a mixed batch (mostly one-liners, some long reviews) with Config.LENGTH_BUCKETING
+off (fixed ANALYSIS_BATCH_SIZE batches in input order) and on (sorted, token-budget
+batches), and prints the padding ratio, wall time and the per-bucket report from
+get_generation_stats() for each.
+
+Usage (from the backend directory):
+    python benchmarks/bench_bucketing.py [--rows 256] [--long-every 16] [--budget 4096] [--detail labels]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from services.sentiment_analyzer import SentimentAnalyzer
+from benchmarks.sample_reviews import SAMPLE_REVIEWS
+
+
+def mixed_reviews(rows, long_every):
+    """Short reviews with every `long_every`-th row a long one (several reviews joined)."""
+    texts = []
+    for i in range(rows):
+        review = SAMPLE_REVIEWS[i % len(SAMPLE_REVIEWS)]
+        if long_every and i % long_every == 0:
+            review = ' '.join(SAMPLE_REVIEWS[(i + k) % len(SAMPLE_REVIEWS)] for k in range(8))
+        texts.append(f"{review} #{i}")
+    return texts
+
+
+def run(texts, bucketing, detail):
+    Config.LENGTH_BUCKETING = bucketing
+    analyzer = SentimentAnalyzer()
+    start = time.perf_counter()
+    results = analyzer.analyze_with_aspects_batch(texts, detail=detail)
+    seconds = time.perf_counter() - start
+    return results, seconds, analyzer.get_generation_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=256)
+    parser.add_argument('--long-every', type=int, default=16)
+    parser.add_argument('--budget', type=int, default=Config.ANALYSIS_TOKEN_BUDGET)
+    parser.add_argument('--detail', choices=['labels', 'full'], default='labels')
+    args = parser.parse_args()
+
+    # Every row must reach the model
+    Config.ANALYSIS_CACHE_ENABLED = False
+    Config.DISTILLED_CASCADE_ENABLED = False
+    Config.PACKED_PROMPTS = False
+    Config.ANALYSIS_TOKEN_BUDGET = args.budget
+    texts = mixed_reviews(args.rows, args.long_every)
+
+    runs = {}
+    for name, bucketing in (('fixed batches', False), ('length buckets', True)):
+        results, seconds, stats = run(texts, bucketing, args.detail)
+        runs[name] = results
+        print(f"\n{name}: {seconds:.2f} s, {stats['generate_calls']} generate calls, padding ratio {stats['padding_ratio']:.1%}")
+        print(f"  {'bucket':<10}{'batches':>8}{'rows':>7}{'padding':>9}{'prompt tok/s':>14}{'gen tok/s':>11}")
+        for b in stats['length_buckets']:
+            print(f"  {b['bucket']:<10}{b['batches']:>8}{b['rows']:>7}{b['padding_ratio']:>9.1%}"
+                  f"{b['prompt_tokens_per_second'] or 0:>14.0f}{b['generated_tokens_per_second'] or 0:>11.0f}")
+
+    differing = sum(1 for a, b in zip(*runs.values()) if (a and a['aspect_sentiments']) != (b and b['aspect_sentiments']))
+    print(f"\nrows with different aspect labels: {differing}/{len(texts)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Constrained JSON decoding benchmark.
+
+Runs the aspect analysis over the sample review set with free decoding and with
+schema-constrained, early-terminating decoding, and reports the average number of
+generated tokens, the fallback-parse rate and wall time per review for each mode.
+
+Usage (from the backend directory):
+    python benchmarks/bench_constrained_decoding.py [--batch-size 8]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from services.sentiment_analyzer import SentimentAnalyzer
+from services.json_constraints import JsonVocabularyIndex
+from benchmarks.sample_reviews import SAMPLE_REVIEWS
+
+
+def reset_stats(analyzer):
+    for key in analyzer.generation_stats:
+        analyzer.generation_stats[key] = 0
+
+
+def run_mode(analyzer, batch_size):
+    reset_stats(analyzer)
+    start = time.perf_counter()
+    results = analyzer.analyze_with_aspects_batch(SAMPLE_REVIEWS, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    stats = analyzer.get_generation_stats()
+    failed = sum(1 for r in results if r is None)
+    return stats, elapsed / len(SAMPLE_REVIEWS), failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=Config.ANALYSIS_BATCH_SIZE)
+    args = parser.parse_args()
+
+    # Measure the model, not the result cache
+    Config.ANALYSIS_CACHE_ENABLED = False
+    Config.CONSTRAINED_DECODING = True
+    analyzer = SentimentAnalyzer()
+    backend = analyzer.backend
+    json_index = backend.json_index or JsonVocabularyIndex(backend.tokenizer, {
+        'labels': analyzer.SENTIMENT_LABELS,
+        'aspects': analyzer.ALLOWED_ASPECTS
+    })
+
+    print(f"\n{'mode':<14}{'avg tokens':>12}{'fallback rate':>15}{'failed':>8}{'s/review':>10}")
+    for mode, index in (('free', None), ('constrained', json_index)):
+        backend.json_index = index
+        stats, per_review, failed = run_mode(analyzer, args.batch_size)
+        print(f"{mode:<14}{stats['avg_generated_tokens']:>12.1f}{stats['fallback_parse_rate']:>15.2%}{failed:>8}{per_review:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Output mode benchmark.
+
+Runs the aspect analysis over the sample review set in full-detail mode (JSON with
+reasoning, evidence and explanations) and in labels-only mode (compact "O:+;R:++"
+codes), and reports generated tokens and wall time per review for each mode, plus
+how often the two modes agree on the overall label.
+
+Usage (from the backend directory):
+    python benchmarks/bench_output_modes.py [--batch-size 8]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from services.sentiment_analyzer import SentimentAnalyzer
+from benchmarks.sample_reviews import SAMPLE_REVIEWS
+
+
+def reset_stats(analyzer):
+    for key in analyzer.generation_stats:
+        analyzer.generation_stats[key] = 0
+
+
+def run_mode(analyzer, detail, batch_size):
+    reset_stats(analyzer)
+    start = time.perf_counter()
+    results = analyzer.analyze_with_aspects_batch(SAMPLE_REVIEWS, batch_size=batch_size, detail=detail)
+    elapsed = time.perf_counter() - start
+    stats = analyzer.get_generation_stats()
+    return results, stats, elapsed / len(SAMPLE_REVIEWS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=Config.ANALYSIS_BATCH_SIZE)
+    args = parser.parse_args()
+
+    # Measure the model, not the result cache
+    Config.ANALYSIS_CACHE_ENABLED = False
+    analyzer = SentimentAnalyzer()
+
+    outputs = {}
+    print(f"\n{'mode':<10}{'avg tokens':>12}{'failed':>8}{'s/review':>10}")
+    for detail in ('full', 'labels'):
+        results, stats, per_review = run_mode(analyzer, detail, args.batch_size)
+        outputs[detail] = results
+        failed = sum(1 for r in results if r is None)
+        print(f"{detail:<10}{stats['avg_generated_tokens']:>12.1f}{failed:>8}{per_review:>10.2f}")
+
+    pairs = [(f, l) for f, l in zip(outputs['full'], outputs['labels']) if f is not None and l is not None]
+    if pairs:
+        agree = sum(1 for f, l in pairs if f['sentiment']['label'] == l['sentiment']['label'])
+        print(f"\nOverall label agreement: {agree}/{len(pairs)} ({agree / len(pairs):.0%})")
+
+
+if __name__ == '__main__':
+    main()
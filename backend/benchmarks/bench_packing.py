@@ -0,0 +1,77 @@
+"""
+Packed prompt benchmark.
+
+Runs the same labels-mode batch with Config.PACKED_PROMPTS off and on and reports, for
+the configured backend: generate calls, sequences, prompt tokens (all / per-review body
+only, i.e. what the prefix cache cannot skip), generated tokens, wall time, and how many
+packed entries fell back to single-review analysis. Also counts rows whose labels differ.
+
+Usage (from the backend directory):
+    python benchmarks/bench_packing.py [--rows 256] [--budget 512] [--max-reviews 16]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from services.sentiment_analyzer import SentimentAnalyzer
+from benchmarks.sample_reviews import SAMPLE_REVIEWS
+
+
+def run(analyzer, texts, packed):
+    Config.PACKED_PROMPTS = packed
+    counted = {'prompt_tokens': 0, 'body_tokens': 0}
+    backend_generate = analyzer.backend.generate
+
+    def generate(requests, *args, **kwargs):
+        counted['prompt_tokens'] += sum(analyzer.backend.token_counts([r.system + r.head + r.body for r in requests]))
+        counted['body_tokens'] += sum(analyzer.backend.token_counts([r.body for r in requests]))
+        return backend_generate(requests, *args, **kwargs)
+
+    analyzer.backend.generate = generate
+    before = dict(analyzer.generation_stats)
+    start = time.perf_counter()
+    results = analyzer.analyze_with_aspects_batch(texts, detail='labels')
+    seconds = time.perf_counter() - start
+    analyzer.backend.generate = backend_generate
+
+    stats = {key: analyzer.generation_stats[key] - before[key] for key in before}
+    return results, {**counted, **stats, 'seconds': seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=256)
+    parser.add_argument('--budget', type=int, default=Config.PACKED_PROMPT_TOKEN_BUDGET)
+    parser.add_argument('--max-reviews', type=int, default=Config.PACKED_MAX_REVIEWS)
+    args = parser.parse_args()
+
+    # Every row must reach the model
+    Config.ANALYSIS_CACHE_ENABLED = False
+    Config.DISTILLED_CASCADE_ENABLED = False
+    Config.PACKED_PROMPT_TOKEN_BUDGET = args.budget
+    Config.PACKED_MAX_REVIEWS = args.max_reviews
+    analyzer = SentimentAnalyzer()
+    texts = [f"{SAMPLE_REVIEWS[i % len(SAMPLE_REVIEWS)]} #{i}" for i in range(args.rows)]
+
+    single_results, single = run(analyzer, texts, packed=False)
+    packed_results, packed = run(analyzer, texts, packed=True)
+
+    print(f"\nbackend: {analyzer.backend.name}, rows: {args.rows}, budget: {args.budget} tokens, K <= {args.max_reviews}")
+    print(f"{'':<22}{'single':>12}{'packed':>12}")
+    for key in ('generate_calls', 'sequences', 'prompt_tokens', 'body_tokens', 'generated_tokens'):
+        print(f"{key:<22}{single[key]:>12}{packed[key]:>12}")
+    print(f"{'seconds':<22}{single['seconds']:>12.2f}{packed['seconds']:>12.2f}")
+    print(f"\npacked prompts: {packed['packed_prompts']} (avg K {packed['packed_reviews'] / max(packed['packed_prompts'], 1):.1f}), "
+          f"fallbacks: {packed['packed_fallbacks']}")
+
+    def labels(result):
+        return result and (result['sentiment']['label'], result['aspect_sentiments'])
+    differing = sum(1 for a, b in zip(single_results, packed_results) if labels(a) != labels(b))
+    print(f"rows with different labels: {differing}/{args.rows}")
+
+
+if __name__ == '__main__':
+    main()
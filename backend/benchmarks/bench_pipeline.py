@@ -0,0 +1,105 @@
+"""
+Batch pipeline load test on the stub backend.
+
+Runs the real serving path without model weights: POST /api/analysis/batch with a
+generated CSV, then the job runner analyzes it chunk by chunk and writes Feedback and
+AspectSentiment rows to a throwaway SQLite database. Reports upload latency, job
+wall time, rows/s and the share of time spent in (simulated) inference.
+
+Usage (from the backend directory):
+    python benchmarks/bench_pipeline.py [--rows 1000] [--latency-ms 150] [--ms-per-token 40]
+"""
+import argparse
+import csv
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from benchmarks.sample_reviews import SAMPLE_REVIEWS
+
+
+def build_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['text', 'hotel_name', 'rating'])
+    for i in range(rows):
+        # Suffix keeps rows distinct so the result cache cannot short-circuit them
+        writer.writerow([f"{SAMPLE_REVIEWS[i % len(SAMPLE_REVIEWS)]} (#{i})", f"Hotel {i % 7}", 1 + i % 5])
+    return buffer.getvalue().encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=int, default=Config.STUB_CALL_LATENCY_MS)
+    parser.add_argument('--ms-per-token', type=int, default=Config.STUB_MS_PER_TOKEN)
+    parser.add_argument('--detail', choices=['full', 'labels'], default=Config.BATCH_ANALYSIS_DETAIL)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='bench_pipeline_'))
+    Config.INFERENCE_BACKEND = 'stub'
+    Config.INFERENCE_WORKER_ENABLED = False
+    Config.STUB_CALL_LATENCY_MS = args.latency_ms
+    Config.STUB_MS_PER_TOKEN = args.ms_per_token
+    Config.BATCH_ANALYSIS_DETAIL = args.detail
+    Config.DATABASE_URL = f"sqlite:///{workdir / 'bench.db'}"
+    Config.ANALYSIS_CACHE_PATH = workdir / 'analysis_cache.db'
+    Config.JOB_POLL_SECONDS = 0.2
+    Config.MODEL_PRELOAD = False
+    # create_app() only starts the runner in the reloader's serving process; start it here instead
+    Config.JOB_RUNNER_ENABLED = False
+
+    from app import create_app
+    from models import User
+    from services.job_runner import start_job_runner
+    from services.model_registry import registry
+
+    app = create_app()
+    start_job_runner(app)
+    client = app.test_client()
+    with app.app_context():
+        admin = User.query.filter_by(username=Config.DEFAULT_ADMIN_USERNAME).first()
+    with client.session_transaction() as session:
+        session['user_id'] = admin.id
+        session['role'] = 'admin'
+
+    # Load the stub up front so model loading is not part of the job time
+    analyzer = registry.get()
+
+    payload = build_csv(args.rows)
+    start = time.perf_counter()
+    response = client.post(
+        '/api/analysis/batch',
+        data={'file': (io.BytesIO(payload), 'bench.csv')},
+        content_type='multipart/form-data'
+    )
+    upload_seconds = time.perf_counter() - start
+    if response.status_code != 202:
+        print(f"Upload failed ({response.status_code}): {response.get_json()}")
+        return
+    job_id = response.get_json()['job']['id']
+
+    while True:
+        job = client.get(f'/api/jobs/{job_id}').get_json()['job']
+        if job['status'] in ('completed', 'failed', 'cancelled'):
+            break
+        time.sleep(0.1)
+    job_seconds = time.perf_counter() - start
+
+    stats = analyzer.get_generation_stats()
+    inference_calls = stats['generate_calls']
+    print(f"\nrows: {args.rows}  detail: {args.detail}  backend: {stats['backend']}")
+    print(f"upload response:   {upload_seconds * 1000:.0f} ms")
+    print(f"job status:        {job['status']} ({job['processed']} processed, {job['error_count']} errors)")
+    print(f"job wall time:     {job_seconds:.1f} s  ({job['processed'] / job_seconds:.1f} rows/s)")
+    print(f"generate calls:    {inference_calls}  (~{inference_calls * args.latency_ms / 1000:.1f} s fixed call latency)")
+    print(f"generated tokens:  {stats['generated_tokens']}")
+    print(f"database:          {workdir / 'bench.db'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Prefix KV cache benchmark.
+
+Measures prompt prefill time per review for each prompt kind, once with the full
+prompt and once with the cached instruction prefix (only the review body prefilled).
+
+Usage (from the backend directory):
+    python benchmarks/bench_prefix_cache.py [--repeat 3]
+"""
+import argparse
+import copy
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import torch
+from config import Config
+from services.sentiment_analyzer import SentimentAnalyzer
+from benchmarks.sample_reviews import SAMPLE_REVIEWS
+
+
+def time_full_prefill(backend, prefix, rest):
+    ids = backend.tokenizer(prefix + rest, return_tensors="pt", add_special_tokens=False).input_ids.to(backend.device)
+    start = time.perf_counter()
+    with torch.no_grad():
+        backend.model(input_ids=ids, use_cache=True)
+    return time.perf_counter() - start, ids.shape[1]
+
+
+def time_cached_prefill(backend, prefix, rest):
+    prefix_ids, prefix_kv = backend.get_prefix_cache(prefix)
+    ids = backend.tokenizer(rest, return_tensors="pt", add_special_tokens=False).input_ids.to(backend.device)
+    mask = torch.ones((1, prefix_ids.shape[1] + ids.shape[1]), dtype=torch.long, device=backend.device)
+    start = time.perf_counter()
+    kv = copy.deepcopy(prefix_kv)
+    with torch.no_grad():
+        backend.model(input_ids=ids, attention_mask=mask, past_key_values=kv, use_cache=True)
+    return time.perf_counter() - start, ids.shape[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help='Timed passes per review')
+    args = parser.parse_args()
+
+    # CPU is the target platform for this comparison
+    Config.DEVICE = 'cpu'
+    Config.INFERENCE_BACKEND = 'transformers'
+    analyzer = SentimentAnalyzer()
+    backend = analyzer.backend
+
+    print(f"\n{'kind':<10}{'prefix tok':>12}{'body tok':>10}{'full ms':>10}{'cached ms':>11}{'speedup':>9}")
+    for kind in analyzer.PROMPTS:
+        full_total, cached_total, body_tokens, runs = 0.0, 0.0, 0, 0
+        for review in SAMPLE_REVIEWS:
+            prefix, rest = backend.render(analyzer._build_request(
+                kind, text=review, aspect='Service', categories='- Service (staff, check-in, attitude)'
+            ))
+            # Warm-up pass, excluded from timings
+            time_full_prefill(backend, prefix, rest)
+            time_cached_prefill(backend, prefix, rest)
+            for _ in range(args.repeat):
+                elapsed, _ = time_full_prefill(backend, prefix, rest)
+                full_total += elapsed
+                elapsed, n_body = time_cached_prefill(backend, prefix, rest)
+                cached_total += elapsed
+                body_tokens += n_body
+                runs += 1
+
+        prefix_tokens = backend.get_prefix_cache(prefix)[0].shape[1]
+        full_ms = full_total / runs * 1000
+        cached_ms = cached_total / runs * 1000
+        print(f"{kind:<10}{prefix_tokens:>12}{body_tokens / runs:>10.1f}{full_ms:>10.1f}{cached_ms:>11.1f}{full_ms / cached_ms:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
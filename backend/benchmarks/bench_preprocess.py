@@ -0,0 +1,61 @@
+"""
+Batch preprocessing benchmark.
+
+Times utils.preprocess.preprocess_batch on an upload-sized batch, against the
+per-row work it replaces (strip + detect_language + keyword extraction + cache key
+normalization, one row at a time; the batch also computes dedupe keys and near-duplicate
+signatures).
+
+Usage (from the backend directory):
+    python benchmarks/bench_preprocess.py [--rows 10000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from services.analysis_cache import normalize_text
+from services.aspect_extractor import ASPECT_LEXICON
+from utils.language_detector import detect_language
+from utils.preprocess import preprocess_batch
+from benchmarks.sample_reviews import SAMPLE_REVIEWS
+
+
+def per_row(texts):
+    out = []
+    for text in texts:
+        text = (text or '').strip()
+        if text:
+            out.append((text, detect_language(text), ASPECT_LEXICON.find(text), normalize_text(text)))
+    return out
+
+
+def best_of(fn, texts, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(texts)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    # Distinct rows, with some blank ones as real uploads have
+    texts = [f"  {SAMPLE_REVIEWS[i % len(SAMPLE_REVIEWS)]} #{i} " if i % 50 else '  ' for i in range(args.rows)]
+
+    batch_seconds = best_of(preprocess_batch, texts)
+    row_seconds = best_of(per_row, texts)
+    stats = preprocess_batch(texts).stats()
+
+    print(f"\nrows: {stats['rows']} (empty {stats['empty_rows']}, unique {stats['unique_rows']}, zh {stats['zh_rows']})")
+    print(f"preprocess_batch:  {batch_seconds * 1000:.1f} ms  ({batch_seconds / args.rows * 1e6:.1f} us/row)")
+    print(f"per-row loop:      {row_seconds * 1000:.1f} ms  ({row_seconds / args.rows * 1e6:.1f} us/row)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Sharded batch execution benchmark.
+
+Sweeps worker processes x threads per worker (services/sharded_executor.py) over the
+same set of reviews and reports, per combination:
+  - model load time of the pool (workers load in parallel)
+  - batch throughput in reviews/s and generated tokens/s
+  - speedup over the first combination (run 1 x <all cores> first for a baseline)
+Combinations needing more threads than physical cores are skipped unless
+--oversubscribe is given.
+
+Usage (from the backend directory):
+    python benchmarks/bench_sharding.py [--workers 1 2 4 8] [--threads 1 2 4 8] [--rows 128]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from services.sharded_executor import ShardedExecutor, physical_cpus
+from benchmarks.sample_reviews import SAMPLE_REVIEWS
+
+
+def make_texts(rows):
+    # Suffix keeps rows distinct, in case a run enables the result cache
+    return [f"{SAMPLE_REVIEWS[i % len(SAMPLE_REVIEWS)]} (#{i})" for i in range(rows)]
+
+
+def run_combination(workers, threads, texts, detail):
+    start = time.perf_counter()
+    executor = ShardedExecutor(workers=workers, threads=threads)
+    # One sub-batch per worker: waits for every model load and warms each worker up
+    executor.analyze_with_aspects_batch(texts[:workers * executor.shard_size], detail=detail)
+    load_seconds = time.perf_counter() - start
+
+    tokens_before = executor.stats['generated_tokens']
+    start = time.perf_counter()
+    results = executor.analyze_with_aspects_batch(texts, detail=detail)
+    seconds = time.perf_counter() - start
+    tokens = executor.stats['generated_tokens'] - tokens_before
+    executor.close()
+
+    return {
+        'load_s': load_seconds,
+        'seconds': seconds,
+        'reviews_per_s': len(texts) / seconds,
+        'tokens_per_s': tokens / seconds,
+        'failed': sum(1 for r in results if r is None)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--rows', type=int, default=128)
+    parser.add_argument('--detail', choices=['full', 'labels'], default=Config.BATCH_ANALYSIS_DETAIL)
+    parser.add_argument('--oversubscribe', action='store_true', help='also run workers x threads > physical cores')
+    args = parser.parse_args()
+
+    # Measure the model, not the result cache
+    Config.ANALYSIS_CACHE_ENABLED = False
+    cores = len(physical_cpus())
+    texts = make_texts(args.rows)
+    print(f"Physical cores: {cores}, rows: {args.rows}, backend: {Config.INFERENCE_BACKEND}")
+
+    reports = []
+    for workers in args.workers:
+        for threads in args.threads:
+            if workers * threads > cores and not args.oversubscribe:
+                print(f"Skipping {workers} x {threads} (needs {workers * threads} cores)")
+                continue
+            print(f"Running {workers} workers x {threads} threads...")
+            reports.append(((workers, threads), run_combination(workers, threads, texts, args.detail)))
+
+    if not reports:
+        return
+    baseline = reports[0][1]['reviews_per_s']
+    print(f"\n{'workers x threads':<20}{'load s':>8}{'batch s':>9}{'reviews/s':>11}{'tok/s':>9}{'speedup':>9}{'failed':>8}")
+    for (workers, threads), r in reports:
+        print(
+            f"{f'{workers} x {threads}':<20}{r['load_s']:>8.1f}{r['seconds']:>9.1f}"
+            f"{r['reviews_per_s']:>11.2f}{r['tokens_per_s']:>9.1f}"
+            f"{r['reviews_per_s'] / baseline:>8.2f}x{r['failed']:>8}"
+        )
+
+
+if __name__ == '__main__':
+    main()
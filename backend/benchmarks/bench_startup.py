@@ -0,0 +1,77 @@
+"""
+Startup time benchmark.
+
+Measures, in a fresh interpreter, how long each startup phase takes:
+  1. importing config and the Flask app module (routes, models, services)
+  2. create_app() (database setup, blueprint registration)
+  3. the first /api/health and /api/admin/stats requests
+  4. importing the ML stack (torch, transformers, SentimentAnalyzer)
+  5. loading the model
+and checks that torch/transformers are not imported before phase 4.
+
+Usage (from the backend directory):
+    python benchmarks/bench_startup.py [--skip-model]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+HEAVY_MODULES = ('torch', 'transformers')
+
+
+def heavy_loaded():
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skip-model', action='store_true', help='stop after the web phases')
+    args = parser.parse_args()
+
+    phases = []
+
+    def timed(name, fn):
+        start = time.perf_counter()
+        value = fn()
+        phases.append((name, time.perf_counter() - start, heavy_loaded()))
+        return value
+
+    config = timed('import config', lambda: __import__('config'))
+    Config = config.Config
+    # Keep the benchmark off the real database and job queue
+    Config.DATABASE_URL = f"sqlite:///{Path(tempfile.mkdtemp()) / 'bench_startup.db'}"
+    Config.JOB_RUNNER_ENABLED = False
+    Config.MODEL_PRELOAD = False
+
+    app_module = timed('import app', lambda: __import__('app'))
+    app = timed('create_app()', app_module.create_app)
+
+    client = app.test_client()
+    timed('GET /api/health', lambda: client.get('/api/health'))
+    with client.session_transaction() as session:
+        session['user_id'] = 1
+    timed('GET /api/admin/stats', lambda: client.get('/api/admin/stats'))
+    web_ready = sum(seconds for _, seconds, _ in phases)
+
+    if not args.skip_model:
+        timed('import ML stack', lambda: __import__('services.sentiment_analyzer'))
+        from services.model_registry import registry
+        timed('load model', registry.get)
+
+    print(f"\n{'phase':<24}{'seconds':>10}  heavy modules loaded")
+    for name, seconds, heavy in phases:
+        print(f"{name:<24}{seconds:>10.3f}  {', '.join(heavy) or '-'}")
+    print(f"\nWeb endpoints ready after {web_ready:.3f}s")
+
+    web_heavy = phases[4][2]
+    if web_heavy:
+        print(f"⚠️ Web phases imported {', '.join(web_heavy)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
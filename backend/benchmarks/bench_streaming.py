@@ -0,0 +1,63 @@
+"""
+Streaming aspect analysis benchmark.
+
+For each sample review, compares analyze_with_aspects (blocking) with
+analyze_with_aspects_stream and reports medians of:
+  - time to the first token event (what the user waits before anything appears)
+  - time to the first completed aspect_details entry
+  - time to the final result (should match the blocking call)
+
+Usage (from the backend directory):
+    python benchmarks/bench_streaming.py
+"""
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from services.sentiment_analyzer import SentimentAnalyzer
+from benchmarks.sample_reviews import SAMPLE_REVIEWS
+
+
+def time_stream(analyzer, text):
+    start = time.perf_counter()
+    first_token = first_aspect = None
+    for event in analyzer.analyze_with_aspects_stream(text):
+        elapsed = time.perf_counter() - start
+        if event['type'] == 'token' and first_token is None:
+            first_token = elapsed
+        elif event['type'] == 'aspect' and first_aspect is None:
+            first_aspect = elapsed
+    return first_token, first_aspect, time.perf_counter() - start
+
+
+def median(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else float('nan')
+
+
+def main():
+    # Every call must generate
+    Config.ANALYSIS_CACHE_ENABLED = False
+    analyzer = SentimentAnalyzer()
+    analyzer.analyze_with_aspects(SAMPLE_REVIEWS[0])
+
+    blocking = []
+    for text in SAMPLE_REVIEWS:
+        start = time.perf_counter()
+        analyzer.analyze_with_aspects(text)
+        blocking.append(time.perf_counter() - start)
+
+    streamed = [time_stream(analyzer, text) for text in SAMPLE_REVIEWS]
+
+    print(f"\nbackend: {analyzer.backend.name}, reviews: {len(SAMPLE_REVIEWS)}")
+    print(f"blocking call, median:          {median(blocking):.2f} s")
+    print(f"stream first token, median:     {median(s[0] for s in streamed):.2f} s")
+    print(f"stream first aspect, median:    {median(s[1] for s in streamed):.2f} s")
+    print(f"stream final result, median:    {median(s[2] for s in streamed):.2f} s")
+
+
+if __name__ == '__main__':
+    main()
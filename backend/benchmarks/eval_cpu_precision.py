@@ -0,0 +1,129 @@
+"""
+CPU precision evaluation.
+
+Loads the model once per Config.CPU_PRECISION mode (fp32, bf16, int8), each in its own
+process so memory numbers are not mixed, runs the aspect analysis over the sample
+review set and reports:
+  - overall / aspect label agreement with fp32
+  - generated tokens per second
+  - resident memory after load and peak RSS
+
+Usage (from the backend directory):
+    python benchmarks/eval_cpu_precision.py [--modes fp32 bf16 int8] [--batch-size 8] [--detail full]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+
+MODES = ('fp32', 'bf16', 'int8')
+
+
+def run_child(mode, batch_size, detail):
+    """Analyze the sample set in this process with one precision mode and print a JSON report."""
+    from services.sentiment_analyzer import SentimentAnalyzer
+    from services.model_registry import _process_rss_bytes
+    from benchmarks.sample_reviews import SAMPLE_REVIEWS
+
+    Config.DEVICE = 'cpu'
+    Config.CPU_PRECISION = mode
+    # Measure the model, not the result cache
+    Config.ANALYSIS_CACHE_ENABLED = False
+
+    start = time.perf_counter()
+    analyzer = SentimentAnalyzer()
+    load_seconds = time.perf_counter() - start
+    rss_loaded = _process_rss_bytes()
+
+    start = time.perf_counter()
+    results = analyzer.analyze_with_aspects_batch(SAMPLE_REVIEWS, batch_size=batch_size, detail=detail)
+    elapsed = time.perf_counter() - start
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:  # Windows
+        peak = None
+    print(json.dumps({
+        'mode': mode,
+        'load_seconds': load_seconds,
+        'seconds': elapsed,
+        'generated_tokens': analyzer.generation_stats['generated_tokens'],
+        'rss_loaded_bytes': rss_loaded,
+        'peak_rss_bytes': peak,
+        'parameter_bytes': analyzer.memory_footprint()['parameter_bytes'],
+        'labels': [
+            None if r is None else {'overall': r['sentiment']['label'], 'aspects': r['aspect_sentiments']}
+            for r in results
+        ]
+    }))
+
+
+def agreement(reference, candidate):
+    """Share of reviews with the same overall label, and of reference aspects with the same label."""
+    overall_same = overall_total = aspect_same = aspect_total = 0
+    for ref, cand in zip(reference, candidate):
+        if ref is None or cand is None:
+            continue
+        overall_total += 1
+        overall_same += ref['overall'] == cand['overall']
+        for aspect, label in ref['aspects'].items():
+            aspect_total += 1
+            aspect_same += cand['aspects'].get(aspect) == label
+    return (
+        overall_same / overall_total if overall_total else 0.0,
+        aspect_same / aspect_total if aspect_total else 0.0
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--batch-size', type=int, default=Config.ANALYSIS_BATCH_SIZE)
+    parser.add_argument('--detail', choices=('full', 'labels'), default='full')
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.batch_size, args.detail)
+        return
+
+    # fp32 is the reference for agreement, so it always runs first
+    modes = ['fp32'] + [m for m in args.modes if m != 'fp32']
+    reports = {}
+    for mode in modes:
+        print(f"Running {mode}...")
+        output = subprocess.run(
+            [sys.executable, __file__, '--child', mode, '--batch-size', str(args.batch_size), '--detail', args.detail],
+            capture_output=True, text=True, cwd=str(Path(__file__).parent.parent)
+        )
+        if output.returncode != 0:
+            print(f"❌ {mode} failed:\n{output.stderr[-2000:]}")
+            continue
+        # The report is the last line; model loading prints progress before it
+        reports[mode] = json.loads(output.stdout.strip().splitlines()[-1])
+
+    if 'fp32' not in reports:
+        return
+    reference = reports['fp32']['labels']
+
+    mb = 1024 ** 2
+    print(f"\n{'mode':<6}{'overall agree':>15}{'aspect agree':>14}{'tok/s':>9}{'load s':>8}{'weights MB':>12}{'RSS MB':>9}{'peak MB':>9}")
+    for mode, report in reports.items():
+        overall, aspects = agreement(reference, report['labels'])
+        tokens_per_second = report['generated_tokens'] / report['seconds'] if report['seconds'] else 0.0
+        print(
+            f"{mode:<6}{overall:>15.1%}{aspects:>14.1%}{tokens_per_second:>9.1f}{report['load_seconds']:>8.1f}"
+            f"{report['parameter_bytes'] / mb:>12.0f}{(report['rss_loaded_bytes'] or 0) / mb:>9.0f}"
+            f"{(report['peak_rss_bytes'] or 0) / mb:>9.0f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
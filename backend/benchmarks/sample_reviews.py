@@ -0,0 +1,30 @@
+"""
+Fixed review set shared by the benchmark scripts.
+Mix of short/long, English/Chinese reviews so timings are comparable between runs.
+"""
+
+SAMPLE_REVIEWS = [
+    "Great hotel!",
+    "Good",
+    "The room was spotless and the bed was very comfortable, but the wifi kept dropping.",
+    "Staff at reception were rude and check-in took forty minutes. Never again.",
+    "Excellent location, five minutes walk to the metro and lots of restaurants nearby.",
+    "Breakfast was average, limited choice and the coffee was cold.",
+    "Way too expensive for what you get. The pool was closed and the gym equipment was broken.",
+    "Lovely view from the balcony, quiet neighborhood, friendly staff. Would stay again.",
+    "The bathroom smelled of mold and the shower had no hot water.",
+    "Decent value for money. Nothing special but clean and convenient.",
+    "Parking was free and easy, elevator was fast, the lobby looked modern.",
+    "Our room faced the street so it was noisy all night, and the air conditioning was loud.",
+    "房间很干净，床也很舒服，前台服务态度很好。",
+    "位置不错，离地铁站很近，但是价格有点贵。",
+    "早餐种类太少了，餐厅环境一般。",
+    "隔音很差，晚上根本睡不着，再也不会来了。",
+    "性价比很高，服务人员热情，设施齐全，泳池很干净。",
+    "电梯太慢了，停车场也很难找，整体体验一般。",
+    "The hotel itself was fine but the restaurant prices were outrageous and the service slow.",
+    "We arrived late at night and the night manager upgraded us to a suite. Fantastic service, "
+    "huge room with a separate living area, great breakfast buffet the next morning, and the "
+    "location right next to the old town made sightseeing effortless. Only complaint: the "
+    "deposit took a week to be refunded.",
+]
@@ -1,12 +1,40 @@
 """
 Project Configuration File
 """
-import torch
+import os
 from pathlib import Path
 
 # Project root directory
 BASE_DIR = Path(__file__).parent.parent
 
+
+def _detect_device():
+    """Probe CUDA (imports torch); only runs the first time Config.DEVICE is read."""
+    import torch
+    if torch.cuda.is_available():
+        print(f"✅ CUDA detected, will use GPU: {torch.cuda.get_device_name(0)}")
+        print(f"   CUDA version: {torch.version.cuda}")
+        print(f"   PyTorch version: {torch.__version__}")
+        return 'cuda'
+    print("⚠️  CUDA not detected, will use CPU")
+    print("   Note: To use GPU, please ensure:")
+    print("   1. NVIDIA GPU drivers are installed")
+    print("   2. CUDA toolkit is installed")
+    print("   3. CUDA-enabled PyTorch version is installed")
+    print("   Installation command: pip install torch torchvision torchaudio --index-url https://download.pytorch.org/whl/cu118")
+    return 'cpu'
+
+
+class _LazyDevice:
+    """Class attribute resolved on first access, so importing config never loads torch."""
+
+    def __get__(self, instance, owner):
+        device = _detect_device()
+        # Replace the descriptor with the plain value; later reads (and overrides) are ordinary
+        setattr(owner, 'DEVICE', device)
+        return device
+
+
 class Config:
     """Configuration Class"""
     # Database Configuration
@@ -20,21 +48,58 @@ class Config:
     MODEL_NAME = 'Qwen/Qwen2-1.5B-Instruct'  # Suitable for 8GB GPU, excellent performance in Chinese/English
     MODEL_CACHE_DIR = BASE_DIR / 'model' / 'cache'
     
+    # Inference backend: 'transformers' (PyTorch), 'onnx' (ONNX Runtime via optimum, CPU only;
+    # exported with KV-cache inputs on first load, prompt prefix cache not used) or 'stub'
+    # (deterministic canned answers, no model weights; for load tests and profiling)
+    INFERENCE_BACKEND = 'transformers'
+    STUB_CALL_LATENCY_MS = 150  # Stub: fixed cost per batch (prefill)
+    STUB_MS_PER_TOKEN = 40  # Stub: cost per decoding step (rows of a batch decode in parallel)
+    STUB_REASONING_WORDS = 25  # Stub: length of reasoning/explanation prose, sets output token counts
+    ONNX_MODEL_DIR = BASE_DIR / 'model' / 'onnx'
+    ONNX_INTRA_OP_THREADS = 0  # 0 = ONNX Runtime default (all physical cores)
+    
+    # Weight precision when running on CPU: 'fp32', 'bf16' (half the memory, needs AVX512-BF16/AMX
+    # for full speed) or 'int8' (dynamic-quantized Linear layers, smallest and usually fastest)
+    CPU_PRECISION = 'fp32'
+    
+    # Load the model on a background thread at startup (readiness reported by /api/ready)
+    MODEL_PRELOAD = True
+    
     # Device Configuration: Prioritize GPU
-    # Check if CUDA is available
-    if torch.cuda.is_available():
-        DEVICE = 'cuda'
-        print(f"✅ CUDA detected, will use GPU: {torch.cuda.get_device_name(0)}")
-        print(f"   CUDA version: {torch.version.cuda}")
-        print(f"   PyTorch version: {torch.__version__}")
-    else:
-        DEVICE = 'cpu'
-        print("⚠️  CUDA not detected, will use CPU")
-        print("   Note: To use GPU, please ensure:")
-        print("   1. NVIDIA GPU drivers are installed")
-        print("   2. CUDA toolkit is installed")
-        print("   3. CUDA-enabled PyTorch version is installed")
-        print("   Installation command: pip install torch torchvision torchaudio --index-url https://download.pytorch.org/whl/cu118")
+    # 'cuda' if available, else 'cpu'; detected lazily because probing CUDA imports torch
+    DEVICE = _LazyDevice()
+    
+    # Inference Worker Configuration
+    # When enabled, web processes send analyses to a separate worker process
+    # (python services/inference_worker.py) that owns the model and micro-batches requests.
+    INFERENCE_WORKER_ENABLED = False
+    INFERENCE_WORKER_ADDRESS = ('127.0.0.1', 6007) if os.name == 'nt' else str(BASE_DIR / 'data' / 'inference_worker.sock')
+    INFERENCE_WORKER_AUTHKEY = b'change-me-inference-worker'  # Change in production environment
+    INFERENCE_WORKER_TIMEOUT = 600  # Seconds a web request waits for its result
+    INFERENCE_BATCH_WINDOW_MS = 20  # Requests arriving within this window share one generate call
+    INFERENCE_MAX_BATCH = 32  # Upper bound on reviews per micro-batch
+    
+    # Background Job Configuration (batch analysis runs as persisted, resumable jobs)
+    JOB_RUNNER_ENABLED = True
+    JOB_CHUNK_SIZE = 64  # Rows analyzed and committed together with the job cursor
+    JOB_POLL_SECONDS = 2  # Idle runner checks for new jobs this often
+    JOB_HEARTBEAT_SECONDS = 10
+    JOB_STALE_SECONDS = 60  # A running job without heartbeat for this long is taken over
+    JOB_MAX_STORED_ERRORS = 100
+    JOB_PROGRESS_POLL_SECONDS = 1  # SSE progress stream refresh interval
+    JOB_PROGRESS_STREAM_TIMEOUT = 3600  # Upload progress stream stops following the job after this (job keeps running)
+    # Re-analysis of stored rows whose model/prompt fingerprints are stale (POST /api/admin/reanalyze,
+    # python manage.py reanalyze-stale); paced so interactive analyses keep most of the model's time
+    REANALYZE_ROWS_PER_MINUTE = 600  # Default rate limit per job; 0 = unlimited
+    
+    # Sharded batch execution: batch jobs run on several CPU model processes, each with
+    # its own analyzer, thread count and pinned physical cores (each holds a full model copy)
+    BATCH_SHARD_ENABLED = False
+    BATCH_SHARD_WORKERS = 0  # 0 = physical cores // BATCH_SHARD_THREADS
+    BATCH_SHARD_THREADS = 4  # Intra-op threads per worker; 0 = split the physical cores evenly
+    BATCH_SHARD_PIN_CORES = True  # Linux: give each worker its own cores (skipped if they would overlap)
+    BATCH_SHARD_START_TIMEOUT = 600  # Seconds for every worker to load its model before the pool is abandoned
+    BATCH_SHARD_TIMEOUT = 600  # Seconds one sub-batch may take before the pool is torn down and the job fails
     
     # Flask Configuration
     SECRET_KEY = 'your-secret-key-here-change-in-production'
@@ -45,6 +110,58 @@ class Config:
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB (supports batch processing of 10,000 reviews)
     ALLOWED_EXTENSIONS = {'txt', 'csv', 'xlsx', 'xls', 'json'}
     
+    # Analysis Configuration
+    ANALYSIS_BATCH_SIZE = 8  # Reviews per batched generate call (lower it if GPU memory is tight)
+    # Length bucketing: sort rows by prompt length and size each batch by padded tokens instead of rows
+    LENGTH_BUCKETING = True
+    ANALYSIS_TOKEN_BUDGET = 4096  # Max rows x longest prompt body per generate call
+    ANALYSIS_MAX_BATCH_ROWS = 16  # Row cap per call even for very short reviews (bounds decode memory)
+    PREFIX_CACHE_ENABLED = True  # Reuse the KV cache of the fixed instruction prompt across reviews
+    SENTIMENT_SCORING_MODE = 'logits'  # 'logits': one forward pass over the 5 label tokens; 'generate': decode free text
+    # With 'logits', single-review aspect analyses also get a logit-scored overall score (clamped into the
+    # generated label's band); batch analyses only when this is on (one extra forward pass per row)
+    BATCH_LOGIT_SCORING = False
+    CONSTRAINED_DECODING = True  # Restrict aspect JSON to allowed labels/aspects and stop when the object closes
+    # Batch jobs only persist labels: 'labels' uses the compact code output, 'full' keeps reasoning/evidence
+    BATCH_ANALYSIS_DETAIL = 'labels'
+    LABELS_MAX_NEW_TOKENS = 40  # "O:+;R:++;..." for all six categories fits comfortably
+    # Packed prompts (labels mode): several short reviews numbered in one prompt, answered as a JSON array
+    PACKED_PROMPTS = False
+    PACKED_PROMPT_TOKEN_BUDGET = 512  # Max review tokens (numbering included) per packed prompt; sets K per pack
+    PACKED_MAX_REVIEWS = 16  # Upper bound on K
+    PACKED_MAX_REVIEW_TOKENS = 96  # Longer reviews are analyzed one per prompt
+    PACKED_TOKENS_PER_REVIEW = 32  # Output budget per review ({"id": n, "labels": "..."})
+    # Long reviews are split into sentence-aligned chunks analyzed in one batch
+    LONG_REVIEW_TOKEN_BUDGET = 384  # Max review tokens per chunk (0 disables chunking)
+    LONG_REVIEW_MAX_CHUNKS = 8  # Chunks beyond this are dropped to bound cost on pathological inputs
+    CHUNK_MERGE_RULE = 'weighted'  # 'worst' (most negative chunk wins) or 'weighted' (length/evidence weighted)
+    # Keyword-guided prompts: only ask about aspects the keyword prefilter found
+    TARGETED_PROMPTS = True
+    TARGETED_FALLBACK_FULL = True  # No keyword match -> full 6-category prompt (False: overall sentiment only)
+    TARGETED_BASE_TOKENS = 120  # Output budget for overall label, reasoning and JSON framing
+    TARGETED_TOKENS_PER_ASPECT = 90  # Extra output budget per candidate aspect
+    
+    # Analysis Result Cache (in-process LRU + SQLite), invalidated on model/prompt change
+    ANALYSIS_CACHE_ENABLED = True
+    ANALYSIS_CACHE_PATH = BASE_DIR / 'data' / 'analysis_cache.db'
+    ANALYSIS_CACHE_MEMORY_SIZE = 2000  # Entries kept in memory
+    ANALYSIS_CACHE_DISK_SIZE = 200000  # Entries kept in SQLite
+
+    # Near-Duplicate Reuse (batch jobs): SimHash of the text without case/punctuation/emoji/trailing hotel name
+    NEAR_DUPLICATE_ENABLED = True
+    NEAR_DUPLICATE_MAX_DISTANCE = 3  # Max differing signature bits (of 64) for a reuse candidate; <= 3 is found exactly
+    # Candidates are reused only if the canonical texts match up to this many token edits. 0 = identical
+    # after canonicalization; more tolerates typos but one edit can flip the meaning ("never", "not")
+    NEAR_DUPLICATE_MAX_TOKEN_EDITS = 0
+    NEAR_DUPLICATE_MIN_FEATURES = 8  # Shorter texts only reuse an identical signature (distance 0)
+
+    # Distilled Cascade: hashed n-gram linear model trained on stored LLM labels (python manage.py train-distilled)
+    DISTILLED_CASCADE_ENABLED = True  # Takes effect once DISTILLED_MODEL_PATH exists
+    DISTILLED_MODEL_PATH = BASE_DIR / 'data' / 'distilled_classifier.npz'
+    DISTILLED_CONFIDENCE_THRESHOLD = 0.8  # Lowest per-head probability answered without the LLM
+    DISTILLED_CASCADE_FULL_DETAIL = False  # Also answer full-detail requests (no reasoning/evidence) without the LLM
+    DISTILLED_AUDIT_RATE = 0.02  # Share of confident reviews also sent to the LLM to measure agreement
+
     # User Configuration
     DEFAULT_ADMIN_USERNAME = 'admin'
     DEFAULT_ADMIN_PASSWORD = 'admin123'  # Change in production environment
@@ -0,0 +1,181 @@
+"""
+Management commands.
+
+Usage (from the backend directory):
+    python manage.py train-distilled [--epochs 10] [--bits 16] [--holdout 0.1] [--min-rows 200] [--output PATH]
+    python manage.py reanalyze-stale [--hotel NAME] [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+                                     [--sentiment LABEL ...] [--rate ROWS_PER_MINUTE] [--dry-run] [--foreground]
+
+train-distilled  Distill the LLM labels stored in feedbacks / aspect_sentiments into the
+                 cascade's first-stage classifier (Config.DISTILLED_MODEL_PATH). Rows the
+                 distilled model labelled itself are left out. Restart the server to load it.
+reanalyze-stale  Queue a job that re-analyzes stored rows whose model/prompt fingerprints
+                 differ from the current ones (after a model or prompt change). The server's
+                 job runner picks it up; --foreground runs it in this process instead and
+                 prints progress. Interrupted jobs resume where they stopped.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from config import Config
+
+
+def _create_app():
+    """App for a one-off command: no job runner, no model preload."""
+    Config.JOB_RUNNER_ENABLED = False
+    Config.MODEL_PRELOAD = False
+    from app import create_app
+    return create_app()
+
+
+def _app_context():
+    return _create_app().app_context()
+
+
+def train_distilled(args):
+    from models import db, Feedback
+    from services.analysis_cache import normalize_text
+    from services.distilled_classifier import DistilledClassifier
+    from services.sentiment_analyzer import SentimentAnalyzer
+
+    labels = SentimentAnalyzer.SENTIMENT_LABELS
+    aspects = list(SentimentAnalyzer.ASPECT_DESCRIPTIONS)
+
+    with _app_context():
+        rows = Feedback.query.options(db.selectinload(Feedback.aspects)).filter(
+            Feedback.sentiment_label.in_(labels),
+            db.or_(Feedback.analysis_source.is_(None), Feedback.analysis_source == 'llm')
+        ).all()
+        # One example per distinct review, so repeated texts do not leak into the holdout
+        examples = {}
+        for feedback in rows:
+            target = (feedback.sentiment_label, {
+                aspect.aspect_name: aspect.sentiment_label for aspect in feedback.aspects
+                if aspect.aspect_name in aspects and aspect.sentiment_label in labels
+            })
+            examples.setdefault(normalize_text(feedback.text), (feedback.text, target))
+
+    examples = list(examples.values())
+    print(f"📚 {len(examples)} distinct LLM-labelled reviews ({len(rows)} rows)")
+    if len(examples) < args.min_rows:
+        print(f"❌ Need at least {args.min_rows} labelled reviews to train")
+        return 1
+
+    random.Random(args.seed).shuffle(examples)
+    holdout = int(len(examples) * args.holdout)
+    train, test = examples[holdout:], examples[:holdout]
+
+    model = DistilledClassifier(labels, aspects, bits=args.bits, meta={'model_name': Config.MODEL_NAME})
+    model.fit([text for text, _ in train], [target for _, target in train], epochs=args.epochs, seed=args.seed)
+    print(f"✅ Trained on {len(train)} reviews")
+
+    if test:
+        report = model.evaluate([text for text, _ in test], [target for _, target in test])
+        model.meta['holdout'] = report
+        print(f"\nHoldout ({report['rows']} reviews): overall agreement {report['overall_agreement']:.1%}, "
+              f"all aspects agree {report['aspect_agreement']:.1%}")
+        print(f"{'threshold':>10}{'coverage':>10}{'overall':>10}{'aspects':>10}")
+        for row in report['thresholds']:
+            overall = f"{row['overall_agreement']:.1%}" if row['overall_agreement'] is not None else '-'
+            aspect = f"{row['aspect_agreement']:.1%}" if row['aspect_agreement'] is not None else '-'
+            marker = '  <- DISTILLED_CONFIDENCE_THRESHOLD' if row['threshold'] == Config.DISTILLED_CONFIDENCE_THRESHOLD else ''
+            print(f"{row['threshold']:>10}{row['coverage']:>10.1%}{overall:>10}{aspect:>10}{marker}")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    model.save(output)
+    print(f"\n💾 Saved to {output} (restart the server to load it)")
+    return 0
+
+
+def reanalyze_stale(args):
+    from models import db, AnalysisJob, User
+    from services.job_runner import TERMINAL_STATUSES, create_reanalyze_job, start_job_runner
+    from services.reanalysis import parse_filters, stale_summary
+
+    try:
+        filters = parse_filters({
+            'hotel_name': args.hotel, 'date_from': args.date_from, 'date_to': args.date_to, 'sentiment': args.sentiment
+        })
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    app = _create_app()
+    with app.app_context():
+        summary = stale_summary(filters)
+        current = summary['current']
+        print(f"🔎 Current fingerprints: model {current['model']}, prompt {current['prompt']}"
+              + (f", distilled {current['distilled']}" if current['distilled'] else ''))
+        for pair in summary['stale_fingerprints']:
+            print(f"   stale: model {pair['model']}, prompt {pair['prompt']}")
+        print(f"📋 {summary['stale']} stale rows match {filters or 'no filters'}")
+        if args.dry_run or not summary['stale']:
+            return 0
+
+        admin = User.query.filter_by(role='admin').order_by(User.id).first()
+        if admin is None:
+            print("❌ No admin user to own the job")
+            return 1
+        job, active = create_reanalyze_job(admin.id, filters, args.rate)
+        if job is None:
+            job = active
+            print(f"⚠️ Re-analysis job {job.id} is already {job.status} ({job.cursor}/{job.total})")
+        else:
+            print(f"✅ Queued re-analysis job {job.id}")
+        if not args.foreground:
+            print("   The server's job runner will process it; progress: GET /api/jobs/<id>")
+            return 0
+        job_id = job.id
+
+    start_job_runner(app)
+    with app.app_context():
+        last_cursor = None
+        while True:
+            db.session.expire_all()
+            job = db.session.get(AnalysisJob, job_id)
+            if job.status in TERMINAL_STATUSES:
+                break
+            if job.cursor != last_cursor:
+                last_cursor = job.cursor
+                print(f"   {job.cursor}/{job.total} ({job.status})")
+            time.sleep(Config.JOB_PROGRESS_POLL_SECONDS)
+    print(f"{'✅' if job.status == 'completed' else '❌'} Job {job.id} {job.status}: "
+          f"{job.processed} rows re-analyzed, {job.error_count} errors")
+    return 0 if job.status == 'completed' else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train = commands.add_parser('train-distilled', help='Train the distilled first-stage classifier')
+    train.add_argument('--epochs', type=int, default=10)
+    train.add_argument('--bits', type=int, default=16, help='log2 of the hashed feature space')
+    train.add_argument('--holdout', type=float, default=0.1, help='Share of reviews kept out for the agreement report')
+    train.add_argument('--min-rows', type=int, default=200)
+    train.add_argument('--seed', type=int, default=0)
+    train.add_argument('--output', default=str(Config.DISTILLED_MODEL_PATH))
+    train.set_defaults(handler=train_distilled)
+
+    reanalyze = commands.add_parser('reanalyze-stale', help='Re-analyze rows labelled by another model or prompt version')
+    reanalyze.add_argument('--hotel', help='Only this hotel_name')
+    reanalyze.add_argument('--from', dest='date_from', help='Created on or after (YYYY-MM-DD)')
+    reanalyze.add_argument('--to', dest='date_to', help='Created on or before (YYYY-MM-DD)')
+    reanalyze.add_argument('--sentiment', nargs='+', help='Only rows currently labelled with these sentiments')
+    reanalyze.add_argument('--rate', type=int, default=None,
+                           help=f'Rows per minute, 0 = unlimited (default Config.REANALYZE_ROWS_PER_MINUTE = {Config.REANALYZE_ROWS_PER_MINUTE})')
+    reanalyze.add_argument('--dry-run', action='store_true', help='Only count the stale rows')
+    reanalyze.add_argument('--foreground', action='store_true', help='Run the job in this process until it finishes')
+    reanalyze.set_defaults(handler=reanalyze_stale)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
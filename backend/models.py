@@ -3,6 +3,7 @@ Database Models
 """
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import json
 
 db = SQLAlchemy()
 
@@ -39,8 +40,22 @@ class Feedback(db.Model):
     sentiment_score = db.Column(db.Float)
     hotel_name = db.Column(db.String(200))  # Hotel name
     rating = db.Column(db.Float)  # Rating (1-5)
+    analysis_source = db.Column(db.String(20))  # 'llm' or 'distilled'; NULL for rows analyzed before it was recorded
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
+    # SimHash of the text (services/near_duplicates.py) and its four 16-bit bands for candidate lookup
+    simhash = db.Column(db.BigInteger)
+    simhash_band0 = db.Column(db.Integer, index=True)
+    simhash_band1 = db.Column(db.Integer, index=True)
+    simhash_band2 = db.Column(db.Integer, index=True)
+    simhash_band3 = db.Column(db.Integer, index=True)
+    simhash_version = db.Column(db.Integer)  # near_duplicates.SIGNATURE_VERSION the signature was built with
+    # Model / prompt templates that produced the labels (SentimentAnalyzer.fingerprints); NULL before
+    # they were recorded. Rows whose values differ from the current ones are re-analyzed by reanalyze jobs
+    model_fingerprint = db.Column(db.String(120))
+    prompt_fingerprint = db.Column(db.String(20))
+
+    __table_args__ = (db.Index('ix_feedbacks_fingerprints', 'model_fingerprint', 'prompt_fingerprint'),)
+
     # 关系
     aspects = db.relationship('AspectSentiment', backref='feedback', lazy=True, cascade='all, delete-orphan')
     
@@ -55,6 +70,9 @@ class Feedback(db.Model):
             'sentiment_score': self.sentiment_score,
             'hotel_name': self.hotel_name,
             'rating': self.rating,
+            'analysis_source': self.analysis_source,
+            'model_fingerprint': self.model_fingerprint,
+            'prompt_fingerprint': self.prompt_fingerprint,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'aspects': [aspect.to_dict() for aspect in self.aspects]
         }
@@ -68,6 +86,8 @@ class AspectSentiment(db.Model):
     aspect_name = db.Column(db.String(100), nullable=False)
     sentiment_label = db.Column(db.String(20))  # very_positive, positive, neutral, negative, very_negative
     sentiment_score = db.Column(db.Float)
+    model_fingerprint = db.Column(db.String(120))  # Same as the parent Feedback row's
+    prompt_fingerprint = db.Column(db.String(20))
     
     def to_dict(self):
         return {
@@ -75,6 +95,72 @@ class AspectSentiment(db.Model):
             'feedback_id': self.feedback_id,
             'aspect_name': self.aspect_name,
             'sentiment_label': self.sentiment_label,
-            'sentiment_score': self.sentiment_score
+            'sentiment_score': self.sentiment_score,
+            'model_fingerprint': self.model_fingerprint,
+            'prompt_fingerprint': self.prompt_fingerprint
+        }
+
+
+class AnalysisJob(db.Model):
+    """Batch Analysis Job Model (persisted so a job survives dropped connections and restarts)"""
+    __tablename__ = 'analysis_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(20), default='batch')  # 'batch' (uploaded rows) or 'reanalyze' (stale stored rows)
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, completed, failed, cancelled
+    source_name = db.Column(db.String(255))  # Uploaded file name
+    payload = db.Column(db.Text)  # batch: JSON list of rows to analyze; reanalyze: JSON filters and last feedback id
+    total = db.Column(db.Integer, default=0)
+    cursor = db.Column(db.Integer, default=0)  # Next row index; everything before it is committed
+    processed = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    errors = db.Column(db.Text, default='[]')  # JSON list of the first error messages
+    near_duplicate_stats = db.Column(db.Text)  # JSON: reuse hit rate and signature distance histogram
+    cancel_requested = db.Column(db.Boolean, default=False)
+    worker_id = db.Column(db.String(100))  # Runner that owns the job while running
+    heartbeat_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'kind': self.kind,
+            'status': self.status,
+            'source_name': self.source_name,
+            'total': self.total,
+            'cursor': self.cursor,
+            'processed': self.processed,
+            'progress': round(self.cursor / self.total * 100, 1) if self.total else 100.0,
+            'error_count': self.error_count,
+            'errors': json.loads(self.errors or '[]'),
+            'near_duplicates': json.loads(self.near_duplicate_stats) if self.near_duplicate_stats else None,
+            'cancel_requested': self.cancel_requested,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
         }
 
+
+def ensure_columns():
+    """
+    Add columns declared on the models but missing from an existing database, plus their
+    indexes. create_all() only creates missing tables; this covers columns added later.
+    """
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        missing = [column for column in table.columns if column.name not in existing]
+        for column in missing:
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            print(f"🛠️ Added column {table.name}.{column.name}")
+        db.session.commit()
+        if missing:
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
@@ -6,6 +6,10 @@ import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from models import db, User, Feedback, AspectSentiment
+from services.model_registry import registry, get_analyzer
+from services.feedback_writer import apply_analysis
+from services.job_runner import create_reanalyze_job
+from services.reanalysis import parse_filters, stale_summary
 from sqlalchemy import func, case
 from datetime import datetime, timedelta
 
@@ -189,31 +193,14 @@ def analyze_feedback(feedback_id):
         
         feedback = Feedback.query.get_or_404(feedback_id)
         
-        # Import analyzer (local import to avoid circular dependency)
-        from services.sentiment_analyzer import SentimentAnalyzer
-        
-        analyzer = SentimentAnalyzer()
+        # Shared analyzer: weights are loaded once per process
+        analyzer = get_analyzer()
         
         # Analyze sentiment and aspects
         result = analyzer.analyze_with_aspects(feedback.text)
         
-        # 更新反馈记录
-        feedback.sentiment_label = result.get('sentiment', {}).get('label', 'neutral')
-        feedback.sentiment_score = result.get('sentiment', {}).get('score', 0.5)
-        
-        # Delete old aspect sentiments
-        AspectSentiment.query.filter_by(feedback_id=feedback.id).delete()
-        
-        # Save new aspect sentiments
-        aspect_sentiments = result.get('aspect_sentiments', {})
-        for aspect_name, sentiment_label in aspect_sentiments.items():
-            aspect_sentiment = AspectSentiment(
-                feedback_id=feedback.id,
-                aspect_name=aspect_name,
-                sentiment_label=sentiment_label
-            )
-            db.session.add(aspect_sentiment)
-        
+        # 更新反馈记录及其方面情感（含模型/提示词指纹）
+        apply_analysis(feedback, result)
         db.session.commit()
         
         return jsonify({
@@ -227,4 +214,93 @@ def analyze_feedback(feedback_id):
         import traceback
         print(f"分析失败: {str(e)}")
         print(traceback.format_exc())
-        return jsonify({'error': f'分析失败: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'分析失败: {str(e)}'}), 500
+
+@admin_bp.route('/reanalyze/stale', methods=['GET'])
+def stale_analyses():
+    """Count rows analyzed by another model/prompt version (same filters as POST /reanalyze)"""
+    try:
+        error = require_login()
+        if error:
+            return error
+        
+        try:
+            filters = parse_filters({
+                'hotel_name': request.args.get('hotel_name'),
+                'date_from': request.args.get('date_from'),
+                'date_to': request.args.get('date_to'),
+                'sentiment': request.args.getlist('sentiment')
+            })
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'filters': filters, **stale_summary(filters)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'获取失败: {str(e)}'}), 500
+
+@admin_bp.route('/reanalyze', methods=['POST'])
+def reanalyze_stale():
+    """Start a background job that re-analyzes stale rows (progress via /api/jobs/<id>)"""
+    try:
+        error = require_login()
+        if error:
+            return error
+        # 批量重写所有用户的分析结果，仅限管理员
+        if session.get('role') != 'admin':
+            return jsonify({'error': '无权操作'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        try:
+            filters = parse_filters(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        rows_per_minute = data.get('rows_per_minute')
+        if rows_per_minute is not None and (not isinstance(rows_per_minute, int) or rows_per_minute < 0):
+            return jsonify({'error': 'rows_per_minute 必须是非负整数'}), 400
+        
+        job, active = create_reanalyze_job(session['user_id'], filters, rows_per_minute)
+        if job is None:
+            return jsonify({'error': '已有重新分析任务在进行中', 'job': active.to_dict()}), 409
+        
+        return jsonify({'message': '重新分析任务已创建', 'job': job.to_dict()}), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'创建任务失败: {str(e)}'}), 500
+
+@admin_bp.route('/models', methods=['GET'])
+def model_stats():
+    """Loaded models with load time and memory footprint"""
+    try:
+        error = require_login()
+        if error:
+            return error
+        # 进程内存与模型加载信息，仅限管理员
+        if session.get('role') != 'admin':
+            return jsonify({'error': '无权操作'}), 403
+        
+        return jsonify(registry.stats()), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'获取失败: {str(e)}'}), 500
+
+@admin_bp.route('/models/warmup', methods=['POST'])
+def warmup_model():
+    """Load the model now and run one short analysis"""
+    try:
+        error = require_login()
+        if error:
+            return error
+        # 加载模型并预热会占用大量内存和算力，仅限管理员
+        if session.get('role') != 'admin':
+            return jsonify({'error': '无权操作'}), 403
+        
+        info = registry.warm_up()
+        return jsonify({'message': '模型预热完成', 'model': info}), 200
+        
+    except Exception as e:
+        import traceback
+        print(f"模型预热失败: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({'error': f'模型预热失败: {str(e)}'}), 500
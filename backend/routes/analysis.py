@@ -1,28 +1,22 @@
 """
 分析路由
 """
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
 import sys
 from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from models import db, Feedback, AspectSentiment
-from services.sentiment_analyzer import SentimentAnalyzer
+from config import Config
+from models import db
+from services.model_registry import get_analyzer
+from services.job_runner import create_batch_job
+from services.sharded_executor import running_sharded_executor
 from utils.language_detector import detect_language
 from utils.file_parser import parse_uploaded_file
+import json
 import traceback
 
 analysis_bp = Blueprint('analysis', __name__, url_prefix='/api/analysis')
 
-# 全局情感分析器实例
-analyzer = None
-
-def get_analyzer():
-    
-    global analyzer
-    if analyzer is None:
-        analyzer = SentimentAnalyzer()
-    return analyzer
-
 def require_admin():
    
     if 'user_id' not in session:
@@ -112,6 +106,33 @@ def analyze_aspects():
         print(traceback.format_exc())
         return jsonify({'error': f'分析失败: {str(e)}'}), 500
 
+@analysis_bp.route('/aspects/stream', methods=['POST'])
+def analyze_aspects_stream():
+    """方面分析（SSE 流式）：逐 token 推送，每完成一个 aspect_details 条目推送一次，最后推送完整结果"""
+    error = require_admin()
+    if error:
+        return error
+    
+    data = request.get_json() or {}
+    text = data.get('text', '').strip()
+    if not text:
+        return jsonify({'error': '文本不能为空'}), 400
+    
+    analyzer = get_analyzer()
+    
+    def generate():
+        try:
+            for event in analyzer.analyze_with_aspects_stream(text):
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            print(f"流式方面分析失败: {str(e)}")
+            print(traceback.format_exc())
+            yield f"data: {json.dumps({'type': 'error', 'error': f'分析失败: {str(e)}'}, ensure_ascii=False)}\n\n"
+    
+    # 关闭代理缓冲，保证每个事件立即送达
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @analysis_bp.route('/batch', methods=['POST'])
 def batch_analyze():
   
@@ -148,89 +169,26 @@ def batch_analyze():
                 'error': f'文件包含的评论数量过多（{len(feedbacks_data)}条），请分批上传，每次不超过{max_batch_size}条'
             }), 400
         
-     
-        analyzer = get_analyzer()
-        processed = 0
-        errors = []
-        
-        print(f"开始批量分析，共 {len(feedbacks_data)} 条评论")
-        
-        
-        commit_interval = 50 if len(feedbacks_data) > 1000 else 20
-        
-        for idx, feedback_data in enumerate(feedbacks_data):
-            try:
-                text = feedback_data.get('text', '').strip()
-                if not text:
-                    continue
-                
-              
-                result = analyzer.analyze_with_aspects(text)
-                
-                language = detect_language(text)
-                feedback = Feedback(
-                    user_id=session['user_id'],
-                    text=text,
-                    original_language=language,
-                    sentiment_label=result.get('sentiment', {}).get('label', 'neutral'),
-                    sentiment_score=result.get('sentiment', {}).get('score', 0.5),
-                    hotel_name=feedback_data.get('hotel_name'),
-                    rating=feedback_data.get('rating')
-                )
-                db.session.add(feedback)
-                db.session.flush()
-                
-         
-                aspect_sentiments = result.get('aspect_sentiments', {})
-                for aspect_name, sentiment_label in aspect_sentiments.items():
-                    aspect_sentiment = AspectSentiment(
-                        feedback_id=feedback.id,
-                        aspect_name=aspect_name,
-                        sentiment_label=sentiment_label
-                    )
-                    db.session.add(aspect_sentiment)
-                
-                processed += 1
-                
-             
-                if processed % commit_interval == 0:
-                    try:
-                        db.session.commit()
-                        print(f"已处理 {processed}/{len(feedbacks_data)} 条评论")
-                    except Exception as commit_error:
-                        db.session.rollback()
-                        error_msg = f"数据库提交失败（第{processed}条）: {str(commit_error)}"
-                        errors.append(error_msg)
-                        print(error_msg)
-                    
-                
-            except Exception as e:
-                error_msg = f"第{idx+1}条评论处理失败: {str(e)}"
-                errors.append(error_msg)
-                print(error_msg)
-              
-                if len(errors) <= 20:  
-                    print(traceback.format_exc())
-                db.session.rollback()  
-                continue
-            
-    
-        try:
-            db.session.commit()
-        except Exception as commit_error:
-            db.session.rollback()
-            error_msg = f"最终提交失败: {str(commit_error)}"
-            errors.append(error_msg)
-            print(error_msg)
         
-        print(f"批量分析完成，成功处理 {processed}/{len(feedbacks_data)} 条评论")
+        # 去除首尾空白并过滤空评论；语言、去重等预处理由任务执行器整批完成
+        rows = [
+            {
+                'text': (feedback_data.get('text') or '').strip(),
+                'hotel_name': feedback_data.get('hotel_name'),
+                'rating': feedback_data.get('rating')
+            }
+            for feedback_data in feedbacks_data
+            if (feedback_data.get('text') or '').strip()
+        ]
+        
+        # 分析在后台任务中进行，请求立即返回任务信息
+        job = create_batch_job(session['user_id'], rows, source_name=file.filename)
+        print(f"批量分析任务已创建: 任务 {job.id}，共 {len(rows)} 条评论")
         
         return jsonify({
-            'message': '批量分析完成',
-            'processed': processed,
-            'total': len(feedbacks_data),
-            'errors': errors[:10] if errors else []  
-        }), 200
+            'message': '批量分析任务已创建',
+            'job': job.to_dict()
+        }), 202
         
     except Exception as e:
         db.session.rollback()
@@ -239,3 +197,40 @@ def batch_analyze():
         print(traceback.format_exc())
         return jsonify({'error': error_msg}), 500
 
+@analysis_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    
+    try:
+        error = require_admin()
+        if error:
+            return error
+        
+        stats = get_analyzer().get_cache_stats()
+        if stats is None:
+            return jsonify({'enabled': False}), 200
+        
+        return jsonify({'enabled': True, **stats}), 200
+        
+    except Exception as e:
+        print(f"获取缓存统计失败: {str(e)}")
+        return jsonify({'error': f'获取缓存统计失败: {str(e)}'}), 500
+
+@analysis_bp.route('/generation/stats', methods=['GET'])
+def generation_stats():
+    
+    try:
+        error = require_admin()
+        if error:
+            return error
+        
+        analyzer = get_analyzer()
+        stats = analyzer.get_generation_stats()
+        # 开启分片时批量任务在分片进程中执行，其统计单独汇总（执行器尚未启动时不启动）
+        executor = running_sharded_executor() if Config.BATCH_SHARD_ENABLED else None
+        if executor is not None:
+            stats['sharded'] = executor.get_generation_stats()
+        return jsonify(stats), 200
+        
+    except Exception as e:
+        print(f"获取生成统计失败: {str(e)}")
+        return jsonify({'error': f'获取生成统计失败: {str(e)}'}), 500
@@ -9,21 +9,17 @@ import time
 from datetime import datetime
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
-from models import db, Feedback, AspectSentiment
-from services.sentiment_analyzer import SentimentAnalyzer
+from models import db, Feedback, AnalysisJob
+from services.model_registry import get_analyzer
+from services.job_runner import create_batch_job, runner_started, TERMINAL_STATUSES
+from services.feedback_writer import apply_analysis
+from services.near_duplicates import simhash, signature_columns
 from utils.language_detector import detect_language
-import traceback
+from config import Config
 
 feedback_bp = Blueprint('feedback', __name__, url_prefix='/api/feedback')
 
 
-analyzer = None
-def get_analyzer():
-    global analyzer
-    if analyzer is None:
-        analyzer = SentimentAnalyzer()
-    return analyzer
-
 @feedback_bp.route('/submit', methods=['POST'])
 def submit_feedback():
 
@@ -41,7 +37,8 @@ def submit_feedback():
             user_id=session['user_id'],
             text=text,
             original_language=detect_language(text),
-            created_at=datetime.utcnow()
+            created_at=datetime.utcnow(),
+            **signature_columns(simhash(text)[0])
         )
         
         db.session.add(feedback)
@@ -112,11 +109,7 @@ def batch_upload_stream():
         if not target_key:
             return jsonify({'error': f'无法识别评论列，请确保包含: {", ".join(possible_keys)}'}), 400
 
-        rows_to_process = []
-        for row in reader:
-            text_val = row.get(target_key, '').strip()
-            if text_val:
-                rows_to_process.append(text_val)
+        rows_to_process = [text for text in ((row.get(target_key) or '').strip() for row in reader) if text]
                 
         total_count = len(rows_to_process)
         if total_count == 0:
@@ -125,54 +118,50 @@ def batch_upload_stream():
     except Exception as e:
         return jsonify({'error': f'文件解析错误: {str(e)}'}), 400
 
+    # 分析由后台任务执行；断开连接不会丢失进度，可通过 /api/jobs/<id> 继续查询
+    job = create_batch_job(
+        session['user_id'],
+        [{'text': text_val} for text_val in rows_to_process],
+        source_name=file.filename
+    )
+    job_id = job.id
    
+    def event(status, current, error=None):
+        payload = {'current': current, 'total': total_count, 'status': status, 'job_id': job_id}
+        if error:
+            payload['error'] = error
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    
     def generate():
-        analyzer = get_analyzer()
-        user_id = session['user_id'] # 获取当前用户ID
-        
-        processed_count = 0
-        
-      
-        for text_val in rows_to_process:
-            try:
-             
-                result = analyzer.analyze_with_aspects(text_val)
-                
-              
-                feedback = Feedback(
-                    user_id=user_id,
-                    text=text_val,
-                    original_language=detect_language(text_val),
-                    sentiment_label=result.get('sentiment', {}).get('label', 'neutral'),
-                    sentiment_score=result.get('sentiment', {}).get('score', 0.5),
-                    created_at=datetime.utcnow()
-                )
-                db.session.add(feedback)
-                db.session.flush()
-                
-             
-                aspect_sentiments = result.get('aspect_sentiments', {})
-                for aspect_name, sentiment_label in aspect_sentiments.items():
-                    if aspect_name:
-                        db.session.add(AspectSentiment(
-                            feedback_id=feedback.id,
-                            aspect_name=aspect_name,
-                            sentiment_label=sentiment_label
-                        ))
-                
-                db.session.commit()
-                processed_count += 1
-                
-              
-                yield f"data: {json.dumps({'current': processed_count, 'total': total_count, 'status': 'processing'})}\n\n"
-                
-            except Exception as e:
-                print(f"处理出错: {str(e)}")
-                db.session.rollback()
-             
+        last_sent = None
+        started = time.monotonic()
         
-    
-        yield f"data: {json.dumps({'current': processed_count, 'total': total_count, 'status': 'completed'})}\n\n"
+        while True:
+            db.session.expire_all()
+            job = db.session.get(AnalysisJob, job_id)
+            
+            if job is None:
+                yield event('error', 0, '任务不存在')
+                return
+            
+            if job.status in TERMINAL_STATUSES:
+                yield event(job.status, job.processed)
+                return
+            
+            waited = time.monotonic() - started
+            # 本进程未启动任务执行器，且其他进程也迟迟未领取该任务：不再无限等待
+            if job.status == 'queued' and not runner_started() and waited > Config.JOB_STALE_SECONDS:
+                yield event('error', job.processed, f'没有任务执行器处理该任务（任务 {job_id} 仍在排队）')
+                return
+            if waited > Config.JOB_PROGRESS_STREAM_TIMEOUT:
+                yield event('timeout', job.processed, f'进度推送超时，任务仍在后台运行，可通过 /api/jobs/{job_id} 查询')
+                return
+            
+            if job.cursor != last_sent:
+                last_sent = job.cursor
+                yield event('processing', job.processed)
+            
+            time.sleep(Config.JOB_PROGRESS_POLL_SECONDS)
 
     
     return Response(stream_with_context(generate()), mimetype='text/event-stream')
@@ -192,19 +181,7 @@ def analyze_my_feedback(feedback_id):
         analyzer = get_analyzer()
         result = analyzer.analyze_with_aspects(feedback.text)
         
-        feedback.sentiment_label = result.get('sentiment', {}).get('label', 'neutral')
-        feedback.sentiment_score = result.get('sentiment', {}).get('score', 0.5)
-        
-        AspectSentiment.query.filter_by(feedback_id=feedback.id).delete()
-        
-        aspect_sentiments = result.get('aspect_sentiments', {})
-        for aspect_name, sentiment_label in aspect_sentiments.items():
-            db.session.add(AspectSentiment(
-                feedback_id=feedback.id,
-                aspect_name=aspect_name,
-                sentiment_label=sentiment_label
-            ))
-        
+        apply_analysis(feedback, result)
         db.session.commit()
         
         return jsonify({
@@ -215,4 +192,35 @@ def analyze_my_feedback(feedback_id):
         
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+
+@feedback_bp.route('/analyze/<int:feedback_id>/stream', methods=['POST'])
+def analyze_my_feedback_stream(feedback_id):
+    # 与 /analyze/<id> 相同，但以 SSE 推送生成过程；最终结果写库后随 result 事件返回
+    if 'user_id' not in session:
+        return jsonify({'error': '请先登录'}), 401
+    
+    feedback = Feedback.query.get_or_404(feedback_id)
+    
+    if session.get('role') != 'admin' and feedback.user_id != session['user_id']:
+        return jsonify({'error': '无权操作'}), 403
+    
+    analyzer = get_analyzer()
+    text = feedback.text
+    
+    def generate():
+        try:
+            for event in analyzer.analyze_with_aspects_stream(text):
+                if event['type'] == 'result':
+                    row = db.session.get(Feedback, feedback_id)
+                    apply_analysis(row, event['result'])
+                    db.session.commit()
+                    event = {**event, 'feedback': row.to_dict()}
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            db.session.rollback()
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
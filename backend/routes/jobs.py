@@ -0,0 +1,68 @@
+"""
+Background job routes
+"""
+from flask import Blueprint, request, jsonify, session
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from models import db, AnalysisJob
+from services.job_runner import request_cancel
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+def get_visible_job(job_id):
+    """Return (job, error_response); users only see their own jobs, admins see all."""
+    if 'user_id' not in session:
+        return None, (jsonify({'error': '请先登录'}), 401)
+    job = db.session.get(AnalysisJob, job_id)
+    if job is None:
+        return None, (jsonify({'error': '任务不存在'}), 404)
+    if session.get('role') != 'admin' and job.user_id != session['user_id']:
+        return None, (jsonify({'error': '无权操作'}), 403)
+    return job, None
+
+@jobs_bp.route('', methods=['GET'])
+def list_jobs():
+    """List recent jobs"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': '请先登录'}), 401
+        
+        limit = request.args.get('limit', 20, type=int)
+        query = AnalysisJob.query
+        if session.get('role') != 'admin':
+            query = query.filter_by(user_id=session['user_id'])
+        jobs = query.order_by(AnalysisJob.created_at.desc()).limit(limit).all()
+        
+        return jsonify({'jobs': [job.to_dict() for job in jobs]}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'获取失败: {str(e)}'}), 500
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job state and progress"""
+    try:
+        job, error = get_visible_job(job_id)
+        if error:
+            return error
+        
+        return jsonify({'job': job.to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'获取失败: {str(e)}'}), 500
+
+@jobs_bp.route('/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    try:
+        job, error = get_visible_job(job_id)
+        if error:
+            return error
+        
+        job = request_cancel(job)
+        return jsonify({'message': '已请求取消任务', 'job': job.to_dict()}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'取消失败: {str(e)}'}), 500
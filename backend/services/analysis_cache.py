@@ -0,0 +1,157 @@
+"""
+Analysis Result Cache
+Two-tier cache (in-process LRU + persistent SQLite table) in front of SentimentAnalyzer.
+Keys are a hash of the normalized review text, the model fingerprint (model, inference
+backend and precision, SentimentAnalyzer.model_fingerprint) and the prompt version, so
+switching model, backend or precision, or editing a prompt template, never serves stale
+results (nor stub results to a real model).
+"""
+import hashlib
+import json
+import copy
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+
+def normalize_text(text):
+    """Canonical form used for cache keys: NFKC, lower case, collapsed whitespace."""
+    text = text or ''
+    # The check is much cheaper than normalizing, and most reviews are already NFKC
+    if not unicodedata.is_normalized('NFKC', text):
+        text = unicodedata.normalize('NFKC', text)
+    # str.split() splits on the same whitespace as \s+ and drops the ends
+    return ' '.join(text.split()).lower()
+
+
+class AnalysisCache:
+    """
+    LRU in memory, SQLite on disk.
+    Memory hits are served without touching SQLite; disk hits are promoted into the LRU.
+    """
+
+    def __init__(self, db_path, model_fingerprint, prompt_version, max_memory_entries=2000, max_disk_entries=200000):
+        self.db_path = str(db_path)
+        self.model_fingerprint = model_fingerprint
+        self.prompt_version = prompt_version
+        self.fingerprint = f"{model_fingerprint}#{prompt_version}"
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+        os.makedirs(Path(self.db_path).parent, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS analysis_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' fingerprint TEXT NOT NULL,'
+            ' result TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_analysis_cache_accessed ON analysis_cache (accessed_at)')
+
+        # Invalidate rows written by another model or prompt version
+        removed = self._conn.execute(
+            'DELETE FROM analysis_cache WHERE fingerprint != ?', (self.fingerprint,)
+        ).rowcount
+        self._conn.commit()
+        if removed:
+            print(f"🧹 Analysis cache: dropped {removed} entries from an older model/prompt version")
+
+        self._disk_count = self._conn.execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+
+    def make_key(self, text, variant='aspects'):
+        """Hash of normalized text + model + prompt version + analysis variant."""
+        raw = '\x1f'.join([self.fingerprint, variant, normalize_text(text)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, text, variant='aspects'):
+        """Return a copy of the cached result, or None on a miss."""
+        key = self.make_key(text, variant)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return copy.deepcopy(self._memory[key])
+
+            row = self._conn.execute('SELECT result FROM analysis_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self._counters['misses'] += 1
+                return None
+
+            self._conn.execute('UPDATE analysis_cache SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+            result = json.loads(row[0])
+            self._remember(key, result)
+            self._counters['disk_hits'] += 1
+            return copy.deepcopy(result)
+
+    def put(self, text, result, variant='aspects'):
+        """Store a result in both tiers."""
+        key = self.make_key(text, variant)
+        now = time.time()
+        with self._lock:
+            self._remember(key, copy.deepcopy(result))
+            cursor = self._conn.execute(
+                'INSERT OR REPLACE INTO analysis_cache (key, fingerprint, result, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, self.fingerprint, json.dumps(result, ensure_ascii=False), now, now)
+            )
+            if cursor.rowcount:
+                self._disk_count += 1
+            self._counters['writes'] += 1
+            if self._disk_count > self.max_disk_entries:
+                self._evict_disk()
+            self._conn.commit()
+
+    def _remember(self, key, result):
+        """Insert into the LRU and evict the least recently used entry when full."""
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def _evict_disk(self):
+        """Trim the SQLite table to 90% of its bound, oldest access first."""
+        self._disk_count = self._conn.execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+        excess = self._disk_count - int(self.max_disk_entries * 0.9)
+        if excess <= 0:
+            return
+        self._conn.execute(
+            'DELETE FROM analysis_cache WHERE key IN '
+            '(SELECT key FROM analysis_cache ORDER BY accessed_at ASC LIMIT ?)', (excess,)
+        )
+        self._disk_count -= excess
+        self._counters['evictions'] += excess
+
+    def clear(self):
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute('DELETE FROM analysis_cache')
+            self._conn.commit()
+            self._disk_count = 0
+
+    def stats(self):
+        """Hit/miss counters and current sizes."""
+        with self._lock:
+            lookups = self._counters['memory_hits'] + self._counters['disk_hits'] + self._counters['misses']
+            hits = self._counters['memory_hits'] + self._counters['disk_hits']
+            return {
+                **self._counters,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_entries': self._disk_count,
+                'model_fingerprint': self.model_fingerprint,
+                'prompt_version': self.prompt_version
+            }
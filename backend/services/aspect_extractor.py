@@ -1,7 +1,12 @@
 """
 方面提取服务（严格限制为6个核心方面）
+关键词表编译为 ASPECT_LEXICON（services/aspect_lexicon.py，分析器的候选方面与方面名映射共用）；
+extract_aspects_from_text / extract_aspects_batch 使用只含 COMMON_ASPECTS 的 _EXTRACT_LEXICON，输出与原逐词子串匹配一致
 """
-import re
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from services.aspect_lexicon import AspectLexicon
 
 # 严格限制的酒店评论方面（只保留指定的六个）
 COMMON_ASPECTS = {
@@ -13,19 +18,84 @@ COMMON_ASPECTS = {
     '设施': ['设施', '设备', 'WiFi', '网络', '电梯', '空调', '泳池', '健身房', 'facility', 'equipment', 'wifi']
 }
 
+# 方面中文名 -> 标准英文名（与 SentimentAnalyzer.ALLOWED_ASPECTS 一致）
+ASPECT_NAME_EN = {
+    '房间': 'Room',
+    '位置': 'Location',
+    '价格': 'Price',
+    '服务': 'Service',
+    '餐饮': 'Food',
+    '设施': 'Facilities'
+}
+
+# 关键词/模型输出的方面名 -> 标准英文名 (Chinese/English -> Standard English)
+ASPECT_KEYWORDS = {
+    # Room Related
+    'room': 'Room', 'rooms': 'Room', 'bedroom': 'Room', 'suite': 'Room', 
+    'accommodation': 'Room', 'bed': 'Room', 'beds': 'Room', 'sleep': 'Room', 
+    'sleeping': 'Room', 'cleanliness': 'Room', 'clean': 'Room', 'cleaning': 'Room',
+    'noise': 'Room', 'soundproof': 'Room', 'space': 'Room', 'spacious': 'Room',
+    '房间': 'Room', '客房': 'Room', '卧室': 'Room', '床': 'Room', '卫生': 'Room', 
+    '睡眠': 'Room', '隔音': 'Room', '空间': 'Room',
+
+    # Location Related
+    'location': 'Location', 'position': 'Location', 'place': 'Location', 'area': 'Location', 
+    'loc': 'Location', 'neighborhood': 'Location', 'accessibility': 'Location',
+    'traffic': 'Location', 'transport': 'Location', 'view': 'Location', # View often relates to location
+    '位置': 'Location', '交通': 'Location', '地点': 'Location', '周边': 'Location', 
+    '景色': 'Location', '风景': 'Location',
+
+    # Price Related
+    'price': 'Price', 'cost': 'Price', 'value': 'Price', 'money': 'Price', 
+    'expensive': 'Price', 'cheap': 'Price', 'rate': 'Price', 'rates': 'Price',
+    'booking': 'Price', 'deposit': 'Price',
+    '价格': 'Price', '性价比': 'Price', '费用': 'Price', '贵': 'Price', '便宜': 'Price',
+
+    # Service Related
+    'service': 'Service', 'staff': 'Service', 'services': 'Service', 'personnel': 'Service',
+    'reception': 'Service', 'check-in': 'Service', 'checkin': 'Service', 'crew': 'Service',
+    'manager': 'Service', 'attitude': 'Service', 'response': 'Service',
+    '服务': 'Service', '前台': 'Service', '态度': 'Service', '人员': 'Service', '管理': 'Service',
+
+    # Food Related
+    'food': 'Food', 'breakfast': 'Food', 'meal': 'Food', 'meals': 'Food',
+    'dining': 'Food', 'restaurant': 'Food', 'drink': 'Food', 'drinks': 'Food',
+    'catering': 'Food', 'bar': 'Food', 'lunch': 'Food', 'dinner': 'Food',
+    '餐饮': 'Food', '早餐': 'Food', '吃饭': 'Food', '食物': 'Food', '餐厅': 'Food',
+
+    # Facilities Related
+    'facility': 'Facilities', 'facilities': 'Facilities', 'amenities': 'Facilities', 
+    'equipment': 'Facilities', 'wifi': 'Facilities', 'internet': 'Facilities', 
+    'pool': 'Facilities', 'gym': 'Facilities', 'parking': 'Facilities', 
+    'elevator': 'Facilities', 'lift': 'Facilities', 'bathroom': 'Facilities',
+    'shower': 'Facilities', 'toilet': 'Facilities', 'lobby': 'Facilities',
+    '设施': 'Facilities', '设备': 'Facilities', '网络': 'Facilities', '泳池': 'Facilities',
+    '电梯': 'Facilities', '浴室': 'Facilities', '停车场': 'Facilities'
+}
+
+# 共享词典：ASPECT_KEYWORDS 与 COMMON_ASPECTS 的全部关键词，标准英文名顺序
+ASPECT_LEXICON = AspectLexicon(
+    {**{keyword: ASPECT_NAME_EN[name] for name, keywords in COMMON_ASPECTS.items() for keyword in keywords},
+     **ASPECT_KEYWORDS},
+    ASPECT_NAME_EN.values()
+)
+
+# 提取函数专用：只含 COMMON_ASPECTS，子串匹配（不加词边界、不做跨类最长匹配），结果不受 ASPECT_KEYWORDS 影响
+_EXTRACT_LEXICON = AspectLexicon(
+    {keyword: name for name, keywords in COMMON_ASPECTS.items() for keyword in keywords},
+    COMMON_ASPECTS.keys(),
+    whole_words=False
+)
+
+
 def extract_aspects_from_text(text):
     """
     从文本中提取可能涉及的方面
-    返回: 方面名称列表
+    返回: 方面名称列表（中文名，COMMON_ASPECTS 顺序）
     """
-    text_lower = text.lower()
-    detected_aspects = []
-    
-    for aspect_name, keywords in COMMON_ASPECTS.items():
-        for keyword in keywords:
-            if keyword.lower() in text_lower:
-                if aspect_name not in detected_aspects:
-                    detected_aspects.append(aspect_name)
-                break
-    
-    return detected_aspects
\ No newline at end of file
+    return _EXTRACT_LEXICON.find(text)
+
+
+def extract_aspects_batch(texts):
+    """批量版本：每条文本返回一个方面名称列表"""
+    return _EXTRACT_LEXICON.find_many(texts)
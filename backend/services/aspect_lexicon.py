@@ -0,0 +1,105 @@
+"""
+Aspect Lexicon
+Keyword -> aspect lookup compiled once into a single regex (a trie of all keywords),
+so one scan finds every keyword in a text instead of one substring test per keyword.
+
+The shared instance (keyword tables included) is services.aspect_extractor.ASPECT_LEXICON;
+extract_aspects_from_text() keeps its own substring-only instance over COMMON_ASPECTS.
+"""
+import re
+from functools import lru_cache
+
+
+def _trie_pattern(words):
+    """
+    Regex matching any of `words`, factored as a character trie ('room', 'rooms' ->
+    'room(?:s)?') so the engine never retries a shared prefix. Optional suffixes are
+    greedy, so the longest keyword at a position wins.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+def _scan_pattern(words):
+    """
+    Trie pattern with the ASCII (Latin) keywords bounded by \\b, so 'bar' is not found in
+    'barely' nor 'view' in 'review'. CJK keywords stay unbounded: Chinese has no word breaks.
+    """
+    latin = [word for word in words if word.isascii()]
+    other = [word for word in words if not word.isascii()]
+    parts = []
+    if latin:
+        parts.append(rf'\b{_trie_pattern(latin)}\b')
+    if other:
+        parts.append(_trie_pattern(other))
+    return '|'.join(f'(?:{part})' for part in parts)
+
+
+class AspectLexicon:
+    """
+    keywords: {keyword: aspect}; order: aspects in canonical order (used to sort find() results).
+    Matching is case-insensitive: Latin keywords match whole words, CJK keywords any substring;
+    where keywords overlap the longest wins.
+    whole_words=False: every keyword matches as a plain substring and find() reports each aspect
+    with any keyword in the text, overlapping or not (the old `keyword in text` extraction).
+    """
+
+    def __init__(self, keywords, order, whole_words=True):
+        self.order = tuple(order)
+        self.keywords = {keyword.lower(): aspect for keyword, aspect in keywords.items()}
+        # Aspect names themselves map exactly ('Room' -> 'Room')
+        self._exact = {**self.keywords, **{aspect.lower(): aspect for aspect in self.order}}
+
+        # One leftmost-longest scan finds every (non-overlapping) keyword in a text
+        # ASCII \b: a Latin keyword right next to a CJK character ('房间wifi很慢') still matches
+        self._scan_re = re.compile(_scan_pattern(self.keywords) if whole_words else _trie_pattern(self.keywords), re.ASCII)
+        # Substring mode: one pattern per aspect, so an overlapping match can't hide an aspect
+        self._aspect_res = None if whole_words else [
+            (aspect, re.compile(_trie_pattern([k for k, a in self.keywords.items() if a == aspect])))
+            for aspect in self.order if aspect in self.keywords.values()
+        ]
+        self.map = lru_cache(maxsize=4096)(self._map)
+
+    def _map(self, text):
+        """Aspect for a label such as 'hotel location' or '早餐', or None."""
+        key = text.strip().lower()
+        if key in self._exact:
+            return self._exact[key]
+        best = None
+        for match in self._scan_re.finditer(key):
+            # Longest keyword wins; ties go to the earliest one
+            if best is None or len(match.group()) > len(best):
+                best = match.group()
+        return self.keywords[best] if best else None
+
+    def map_many(self, texts):
+        """map() for many labels, in input order."""
+        return [self.map(text) for text in texts]
+
+    def find(self, text):
+        """Aspects mentioned in a text, in canonical order."""
+        return self.find_many([text])[0]
+
+    def find_many(self, texts):
+        """find() for many texts."""
+        if self._aspect_res is not None:
+            return [[aspect for aspect, pattern in self._aspect_res if pattern.search(text.lower())] for text in texts]
+        keywords, order = self.keywords, self.order
+        results = []
+        for text in texts:
+            found = {keywords[k] for k in self._scan_re.findall(text.lower())}
+            results.append([aspect for aspect in order if aspect in found] if found else [])
+        return results
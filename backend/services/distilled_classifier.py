@@ -0,0 +1,177 @@
+"""
+Distilled Classifier
+A small CPU model trained on the labels the LLM already produced (python manage.py
+train-distilled), used by SentimentAnalyzer as the first stage of a cascade: reviews it
+is confident about are answered in microseconds, the rest escalate to the LLM.
+
+Features are hashed word / CJK-character unigrams and bigrams (signed, L2-normalized).
+Every output is a linear softmax head - 'overall' over the sentiment labels and one per
+aspect over 'absent' plus the sentiment labels - and all heads share one weight matrix,
+so a prediction is one sparse row gather and sum.
+"""
+import json
+import re
+import unicodedata
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+ABSENT = 'absent'
+
+# Each CJK character is a token, so bigrams cover two-character words
+_TOKEN_RE = re.compile(r'[\u4e00-\u9fff]|[^\W_]+')
+
+
+def vectorize(text, bits):
+    """Sparse feature vector of a text: (indices int32, values float32), empty for texts without tokens."""
+    tokens = _TOKEN_RE.findall(unicodedata.normalize('NFKC', text or '').lower())
+    grams = tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+    mask = (1 << bits) - 1
+    counts = {}
+    for gram in grams:
+        h = zlib.crc32(gram.encode('utf-8'))
+        # Sign from the top bit keeps collisions from only ever adding up
+        index = h & mask
+        counts[index] = counts.get(index, 0.0) + (1.0 if h >> 31 else -1.0)
+    if not counts:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    indices = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    norm = np.linalg.norm(values)
+    return indices, values / norm if norm else values
+
+
+def _fingerprint(meta):
+    return f"distilled@{meta.get('trained_at')}"
+
+
+def _softmax(z):
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+class DistilledClassifier:
+    """
+    labels: sentiment labels; aspects: aspect names (canonical order); bits: log2 of the
+    hashed feature space. Targets are (overall_label, {aspect: label}) pairs.
+    """
+
+    def __init__(self, labels, aspects, bits=16, weights=None, bias=None, meta=None):
+        self.labels = list(labels)
+        self.aspects = list(aspects)
+        self.bits = bits
+        self.heads = [('overall', self.labels)] + [(aspect, [ABSENT] + self.labels) for aspect in self.aspects]
+        self.slices = []
+        offset = 0
+        for _, classes in self.heads:
+            self.slices.append(slice(offset, offset + len(classes)))
+            offset += len(classes)
+        self.weights = weights if weights is not None else np.zeros((1 << bits, offset), dtype=np.float32)
+        self.bias = bias if bias is not None else np.zeros(offset, dtype=np.float32)
+        self.meta = meta or {}
+
+    def fingerprint(self):
+        """Model fingerprint stamped on the results this model answers (changes on retraining)."""
+        return _fingerprint(self.meta)
+
+    def predict(self, text):
+        """
+        {'overall': {label: p}, 'aspects': {aspect: label} for aspects predicted present,
+         'confidence': lowest top-class probability over all heads, 'features': non-zero features}
+        """
+        indices, values = vectorize(text, self.bits)
+        scores = values @ self.weights[indices] + self.bias
+        overall, aspects, confidence = None, {}, 1.0
+        for (name, classes), head in zip(self.heads, self.slices):
+            p = _softmax(scores[head])
+            top = int(p.argmax())
+            confidence = min(confidence, float(p[top]))
+            if name == 'overall':
+                overall = {label: float(prob) for label, prob in zip(classes, p)}
+            elif classes[top] != ABSENT:
+                aspects[name] = classes[top]
+        return {'overall': overall, 'aspects': aspects, 'confidence': confidence, 'features': len(indices)}
+
+    def predict_many(self, texts):
+        return [self.predict(text) for text in texts]
+
+    def _target_indices(self, target):
+        overall, aspects = target
+        row = [self.labels.index(overall)]
+        for aspect in self.aspects:
+            label = aspects.get(aspect)
+            row.append(1 + self.labels.index(label) if label in self.labels else 0)
+        return row
+
+    def fit(self, texts, targets, epochs=10, learning_rate=5.0, batch_size=32, seed=0):
+        """Minibatch SGD on the summed per-head cross-entropy. Rows without tokens are skipped."""
+        rows = [(vectorize(text, self.bits), self._target_indices(target)) for text, target in zip(texts, targets)]
+        rows = [(features, y) for features, y in rows if len(features[0])]
+        if not rows:
+            raise ValueError("No training rows with text features")
+        y_all = np.array([y for _, y in rows], dtype=np.int64)
+        rng = np.random.default_rng(seed)
+
+        for epoch in range(epochs):
+            lr = learning_rate / np.sqrt(1 + epoch)
+            order = rng.permutation(len(rows))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                indices = np.concatenate([rows[i][0][0] for i in batch])
+                values = np.concatenate([rows[i][0][1] for i in batch])
+                lengths = [len(rows[i][0][0]) for i in batch]
+                offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+                row_of = np.repeat(np.arange(len(batch)), lengths)
+
+                weighted = values[:, None] * self.weights[indices]
+                scores = np.add.reduceat(weighted, offsets, axis=0) + self.bias
+                grad = np.empty_like(scores)
+                for h, head in enumerate(self.slices):
+                    p = _softmax(scores[:, head])
+                    p[np.arange(len(batch)), y_all[batch, h]] -= 1.0
+                    grad[:, head] = p
+                grad /= len(batch)
+
+                np.add.at(self.weights, indices, -lr * values[:, None] * grad[row_of])
+                self.bias -= lr * grad.sum(axis=0)
+
+        self.meta.update({'trained_at': datetime.utcnow().isoformat(), 'rows': len(rows), 'epochs': epochs})
+        return self
+
+    def evaluate(self, texts, targets, thresholds=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95)):
+        """
+        Agreement with the target labels: overall label and the full aspect set, on all rows and,
+        per confidence threshold, on the rows the cascade would answer (coverage).
+        """
+        predictions = self.predict_many(texts)
+        agree_overall = [max(p['overall'], key=p['overall'].get) == overall for p, (overall, _) in zip(predictions, targets)]
+        agree_aspects = [p['aspects'] == aspects for p, (_, aspects) in zip(predictions, targets)]
+        confidence = [p['confidence'] for p in predictions]
+        report = {
+            'rows': len(texts),
+            'overall_agreement': round(sum(agree_overall) / len(texts), 4) if texts else 0.0,
+            'aspect_agreement': round(sum(agree_aspects) / len(texts), 4) if texts else 0.0,
+            'thresholds': []
+        }
+        for threshold in thresholds:
+            kept = [i for i, c in enumerate(confidence) if c >= threshold]
+            report['thresholds'].append({
+                'threshold': threshold,
+                'coverage': round(len(kept) / len(texts), 4) if texts else 0.0,
+                'overall_agreement': round(sum(agree_overall[i] for i in kept) / len(kept), 4) if kept else None,
+                'aspect_agreement': round(sum(agree_aspects[i] for i in kept) / len(kept), 4) if kept else None
+            })
+        return report
+
+    def save(self, path):
+        meta = {**self.meta, 'labels': self.labels, 'aspects': self.aspects, 'bits': self.bits}
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, weights=self.weights, bias=self.bias, meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(meta['labels'], meta['aspects'], meta['bits'], data['weights'], data['bias'], meta)
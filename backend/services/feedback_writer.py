@@ -0,0 +1,59 @@
+"""
+Feedback Persistence Helpers
+One place that turns an analyzer result into Feedback / AspectSentiment rows.
+"""
+import sys
+from pathlib import Path
+from datetime import datetime
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from models import db, Feedback, AspectSentiment
+from services.near_duplicates import simhash, signature_columns
+from utils.language_detector import detect_language
+
+
+def _add_aspects(feedback, result):
+    for aspect_name, sentiment_label in result.get('aspect_sentiments', {}).items():
+        if aspect_name:
+            db.session.add(AspectSentiment(
+                feedback_id=feedback.id,
+                aspect_name=aspect_name,
+                sentiment_label=sentiment_label,
+                model_fingerprint=feedback.model_fingerprint,
+                prompt_fingerprint=feedback.prompt_fingerprint
+            ))
+
+
+def apply_analysis(feedback, result):
+    """Copy labels from an analysis result onto a (flushed) feedback row and replace its aspects."""
+    feedback.sentiment_label = result.get('sentiment', {}).get('label', 'neutral')
+    feedback.sentiment_score = result.get('sentiment', {}).get('score', 0.5)
+    feedback.analysis_source = result.get('source', 'llm')
+    feedback.model_fingerprint = result.get('model_fingerprint')
+    feedback.prompt_fingerprint = result.get('prompt_fingerprint')
+    
+    AspectSentiment.query.filter_by(feedback_id=feedback.id).delete()
+    _add_aspects(feedback, result)
+
+
+def create_analyzed_feedback(user_id, text, result, hotel_name=None, rating=None, language=None, signature=None):
+    """Add a new feedback row with its analysis to the session (caller commits)."""
+    if signature is None:
+        signature, _ = simhash(text, hotel_name)
+    feedback = Feedback(
+        user_id=user_id,
+        text=text,
+        original_language=language or detect_language(text),
+        sentiment_label=result.get('sentiment', {}).get('label', 'neutral'),
+        sentiment_score=result.get('sentiment', {}).get('score', 0.5),
+        hotel_name=hotel_name,
+        rating=rating,
+        analysis_source=result.get('source', 'llm'),
+        model_fingerprint=result.get('model_fingerprint'),
+        prompt_fingerprint=result.get('prompt_fingerprint'),
+        created_at=datetime.utcnow(),
+        **signature_columns(signature)
+    )
+    db.session.add(feedback)
+    db.session.flush()
+    _add_aspects(feedback, result)
+    return feedback
@@ -0,0 +1,270 @@
+"""
+Inference Backends
+Everything SentimentAnalyzer needs from a model, behind one interface. The analyzer
+owns prompts, parsing and caching; a backend turns prompt requests into completions
+and answer-choice probabilities.
+
+- transformers: Qwen2 in PyTorch (services/transformers_backend.py)
+- onnx: the same model exported to ONNX Runtime (services/transformers_backend.py)
+- stub: deterministic canned answers with configurable latency and output size, so the
+  routes, job pipeline and database writes can be load-tested without model weights
+
+torch and transformers are only imported by the model backends, so the stub also runs
+on machines without the ML stack.
+"""
+import hashlib
+import json
+import re
+import sys
+import time
+from collections import namedtuple
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from services.aspect_extractor import ASPECT_LEXICON
+
+# One filled prompt template; `fields` are the values substituted into the body
+PromptRequest = namedtuple('PromptRequest', ['kind', 'system', 'head', 'body', 'fields'])
+
+BACKENDS = ('transformers', 'onnx', 'stub')
+
+
+class InferenceBackend:
+    """
+    Interface shared by all backends.
+    `generation_stats` is the analyzer's counter dict; backends add generate_calls,
+    sequences and generated_tokens to it.
+    """
+    name = None
+
+    def __init__(self, model_name, generation_stats, vocabularies=None):
+        self.model_name = model_name
+        self.generation_stats = generation_stats
+        # Allowed values for constrained decoding: {'labels': [...], 'aspects': [...]}
+        self.vocabularies = vocabularies or {}
+        self.device = 'cpu'
+        self.precision = None
+        # Seconds spent in each load phase
+        self.load_timings = {}
+
+    def load(self, warmup_requests=()):
+        """Load the model; `warmup_requests` are prompts worth preparing ahead (e.g. prefix caches)."""
+        raise NotImplementedError
+
+    def is_loaded(self):
+        raise NotImplementedError
+
+    def generate(self, requests, max_new_tokens, generate_kwargs=None, json_schema=False, row_vocabularies=None):
+        """
+        Completions for a batch of PromptRequests, in input order.
+        max_new_tokens is one int or one value per request; json_schema asks for the aspect
+        JSON to be constrained to `vocabularies` (narrowed per row by row_vocabularies).
+        """
+        raise NotImplementedError
+
+    def stream(self, request, max_new_tokens, generate_kwargs=None, json_schema=False, row_vocabularies=None):
+        """
+        Completion for one PromptRequest, yielded as text pieces while it is generated.
+        Backends without incremental decoding yield the whole completion at once.
+        """
+        yield self.generate([request], max_new_tokens, generate_kwargs, json_schema, row_vocabularies)[0]
+
+    def supports_choices(self, choices):
+        """Whether score_choices() can score these answer strings (e.g. each is one token)."""
+        return False
+
+    def score_choices(self, requests, choices):
+        """Next-token probability of each answer string, as one {choice: probability} dict per request."""
+        raise NotImplementedError
+
+    def token_counts(self, texts):
+        """Token length of each text."""
+        raise NotImplementedError
+
+    def token_windows(self, text, size):
+        """Split text into consecutive pieces of at most `size` tokens."""
+        raise NotImplementedError
+
+    def memory_footprint(self):
+        return {'precision': self.precision, 'parameter_bytes': 0, 'buffer_bytes': 0}
+
+    @property
+    def constrained_decoding(self):
+        return False
+
+    def _record_generation(self, token_counts):
+        self.generation_stats['generate_calls'] += 1
+        self.generation_stats['sequences'] += len(token_counts)
+        self.generation_stats['generated_tokens'] += sum(token_counts)
+
+
+def create_backend(name, model_name, generation_stats, vocabularies=None):
+    """Instantiate the backend selected by Config.INFERENCE_BACKEND (not loaded yet)."""
+    if name == 'stub':
+        return StubBackend(model_name, generation_stats, vocabularies)
+    if name in ('transformers', 'onnx'):
+        # Imported here so the stub never pulls in torch/transformers
+        from services.transformers_backend import TransformersBackend, OnnxBackend
+        backend_class = TransformersBackend if name == 'transformers' else OnnxBackend
+        return backend_class(model_name, generation_stats, vocabularies)
+    raise ValueError(f"Unsupported INFERENCE_BACKEND: {name} (use {', '.join(BACKENDS)})")
+
+
+class StubBackend(InferenceBackend):
+    """
+    Deterministic stand-in for the model.
+    Labels come from a small sentiment lexicon applied to the review text and aspects
+    from the keyword tables, so the same review always gets the same, plausible answer.
+    Each call sleeps STUB_CALL_LATENCY_MS plus STUB_MS_PER_TOKEN per decoding step
+    (rows of a batch decode in parallel, as on the real model).
+    """
+    name = 'stub'
+
+    # Leading whitespace belongs to the token, so joining tokens reproduces the text
+    _TOKEN_RE = re.compile(r'\s*(?:[\u4e00-\u9fff]|[A-Za-z0-9_]+|[^\sA-Za-z0-9_\u4e00-\u9fff])|\s+')
+    _SENTENCE_RE = re.compile(r'[^.!?。！？；;\n]+[.!?。！？；;\n]*')
+    POSITIVE_WORDS = (
+        'great', 'excellent', 'clean', 'friendly', 'comfortable', 'good', 'nice', 'helpful', 'perfect',
+        'love', 'quiet', 'spacious', 'delicious', 'convenient', 'amazing',
+        '好', '干净', '满意', '热情', '舒适', '方便', '不错', '推荐'
+    )
+    NEGATIVE_WORDS = (
+        'dirty', 'rude', 'noisy', 'bad', 'terrible', 'slow', 'broken', 'awful', 'worst', 'poor',
+        'smelly', 'disappointing', 'overpriced', 'cold', 'never',
+        '差', '脏', '吵', '慢', '失望', '坏', '难吃', '不好'
+    )
+    LABELS = ('very_negative', 'negative', 'neutral', 'positive', 'very_positive')
+    SYMBOLS = {'very_positive': '++', 'positive': '+', 'neutral': '0', 'negative': '-', 'very_negative': '--'}
+    CODES = {'Room': 'R', 'Location': 'L', 'Price': 'P', 'Service': 'S', 'Food': 'F', 'Facilities': 'A'}
+
+    def __init__(self, model_name, generation_stats, vocabularies=None):
+        super().__init__(model_name, generation_stats, vocabularies)
+        self.precision = 'stub'
+        self._loaded = False
+
+    def load(self, warmup_requests=()):
+        self.load_timings = {'weights_seconds': 0.0}
+        self._loaded = True
+        print(f"✅ Stub inference backend ready (call {Config.STUB_CALL_LATENCY_MS}ms, {Config.STUB_MS_PER_TOKEN}ms/token)")
+
+    def is_loaded(self):
+        return self._loaded
+
+    def generate(self, requests, max_new_tokens, generate_kwargs=None, json_schema=False, row_vocabularies=None):
+        if isinstance(max_new_tokens, int):
+            max_new_tokens = [max_new_tokens] * len(requests)
+        row_vocabularies = row_vocabularies or [None] * len(requests)
+
+        outputs, counts = [], []
+        for request, limit, vocab in zip(requests, max_new_tokens, row_vocabularies):
+            tokens = self._answer_tokens(request, limit, vocab)
+            outputs.append(''.join(tokens))
+            counts.append(len(tokens))
+
+        self._sleep(max(counts, default=0))
+        self._record_generation(counts)
+        return outputs
+
+    def stream(self, request, max_new_tokens, generate_kwargs=None, json_schema=False, row_vocabularies=None):
+        tokens = self._answer_tokens(request, max_new_tokens, row_vocabularies[0] if row_vocabularies else None)
+        self._sleep(0)
+        for token in tokens:
+            time.sleep(Config.STUB_MS_PER_TOKEN / 1000.0)
+            yield token
+        self._record_generation([len(tokens)])
+
+    def _answer_tokens(self, request, limit, vocab):
+        """Answer for one request as tokens, truncated like a real model running out of budget."""
+        allowed = vocab.get('aspects') if vocab else None
+        return self._TOKEN_RE.findall(self._answer(request, allowed))[:limit]
+
+    def supports_choices(self, choices):
+        return True
+
+    def score_choices(self, requests, choices):
+        self._sleep(0)
+        distributions = []
+        for request in requests:
+            label = self._polarity(self._subject_text(request))
+            peak = min(self.LABELS.index(label), len(choices) - 1)
+            # Most mass on the answer, some on its neighbours
+            weights = [0.7 if i == peak else 0.15 / (abs(i - peak)) for i in range(len(choices))]
+            total = sum(weights)
+            distributions.append({choice: w / total for choice, w in zip(choices, weights)})
+        return distributions
+
+    def token_counts(self, texts):
+        return [len(self._TOKEN_RE.findall(text)) for text in texts]
+
+    def token_windows(self, text, size):
+        tokens = self._TOKEN_RE.findall(text)
+        return [''.join(tokens[i:i + size]) for i in range(0, len(tokens), size)]
+
+    def _sleep(self, decode_steps):
+        seconds = (Config.STUB_CALL_LATENCY_MS + Config.STUB_MS_PER_TOKEN * decode_steps) / 1000.0
+        if seconds > 0:
+            time.sleep(seconds)
+
+    @staticmethod
+    def _subject_text(request):
+        fields = request.fields or {}
+        text = fields.get('text', request.body)
+        return f"{text} {fields['aspect']}" if fields.get('aspect') else text
+
+    def _polarity(self, text):
+        text_lower = text.lower()
+        balance = sum(text_lower.count(w) for w in self.POSITIVE_WORDS) - sum(text_lower.count(w) for w in self.NEGATIVE_WORDS)
+        if balance == 0:
+            # Deterministic tie-break so neutral is not over-represented
+            balance = int(hashlib.md5(text.encode('utf-8')).hexdigest(), 16) % 3 - 1
+        return self.LABELS[max(-2, min(2, balance)) + 2]
+
+    def _aspect_mentions(self, text, allowed):
+        """[(aspect, sentence)] for the first sentence mentioning each aspect."""
+        sentences = [sentence.strip() for sentence in self._SENTENCE_RE.findall(text)]
+        mentions = {}
+        for sentence, aspects in zip(sentences, ASPECT_LEXICON.find_many(sentences)):
+            for aspect in aspects:
+                if aspect not in mentions and (allowed is None or aspect in allowed):
+                    mentions[aspect] = sentence
+        return list(mentions.items())
+
+    def _filler(self, seed_text):
+        words = ('guests', 'noted', 'the', 'stay', 'overall', 'with', 'specific', 'comments', 'about', 'their', 'experience')
+        offset = len(seed_text) % len(words)
+        return ' '.join(words[(offset + i) % len(words)] for i in range(Config.STUB_REASONING_WORDS))
+
+    def _labels_answer(self, text, allowed_aspects=None):
+        mentions = self._aspect_mentions(text, allowed_aspects)
+        parts = [f"O:{self.SYMBOLS[self._polarity(text)]}"]
+        parts.extend(f"{self.CODES[aspect]}:{self.SYMBOLS[self._polarity(sentence)]}" for aspect, sentence in mentions)
+        return ';'.join(parts)
+
+    def _answer(self, request, allowed_aspects):
+        text = (request.fields or {}).get('text', request.body)
+        if request.kind in ('overall', 'aspect', 'overall_score', 'aspect_score'):
+            return self._polarity(self._subject_text(request))
+        if request.kind == 'aspects_labels':
+            return self._labels_answer(text, allowed_aspects)
+        if request.kind == 'aspects_labels_packed':
+            return json.dumps([
+                {'id': n, 'labels': self._labels_answer(review)} for n, review in enumerate(request.fields['texts'], 1)
+            ], ensure_ascii=False)
+
+        overall = self._polarity(text)
+        mentions = [(aspect, sentence, self._polarity(sentence)) for aspect, sentence in self._aspect_mentions(text, allowed_aspects)]
+
+        return json.dumps({
+            'overall': overall,
+            'aspects': {aspect: label for aspect, _, label in mentions},
+            'reasoning': f"The review is {overall.replace('_', ' ')}; {self._filler(text)}.",
+            'aspect_details': [
+                {
+                    'aspect': aspect,
+                    'sentiment': label,
+                    'evidence': sentence,
+                    'explanation': f"{aspect} is described as {label.replace('_', ' ')}; {self._filler(sentence)}."
+                }
+                for aspect, sentence, label in mentions
+            ]
+        }, ensure_ascii=False, indent=2)
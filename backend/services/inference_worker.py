@@ -0,0 +1,305 @@
+"""
+Inference Worker
+A standalone process that owns the SentimentAnalyzer and serves requests from any
+number of web workers over local IPC (Unix socket, or localhost TCP on Windows).
+Aspect-analysis requests arriving within a short window are merged into one
+batched generate call.
+
+Run it next to the web server (from the backend directory):
+    python services/inference_worker.py
+"""
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing.connection import Listener, Client
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+
+# Requests for these methods are merged into one analyze_with_aspects_batch call
+BATCHABLE_METHODS = {'analyze_with_aspects', 'analyze_with_aspects_batch'}
+# Everything a client may call; anything else is rejected
+ALLOWED_METHODS = BATCHABLE_METHODS | {
+    'analyze', 'analyze_aspect', 'get_generation_stats', 'get_cache_stats', 'get_fingerprints', 'registry_stats'
+}
+
+
+def _address_family(address):
+    return 'AF_UNIX' if isinstance(address, str) else 'AF_INET'
+
+
+class _PendingRequest:
+    __slots__ = ('request_id', 'method', 'args', 'kwargs', 'reply')
+
+    def __init__(self, request_id, method, args, kwargs, reply):
+        self.request_id = request_id
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.reply = reply
+
+
+class InferenceWorker:
+    """Server side: accepts connections, queues requests and runs them on a single model thread."""
+
+    def __init__(self, address=None, authkey=None, batch_window_ms=None, max_batch=None):
+        self.address = address or Config.INFERENCE_WORKER_ADDRESS
+        self.authkey = authkey or Config.INFERENCE_WORKER_AUTHKEY
+        self.batch_window = (batch_window_ms if batch_window_ms is not None else Config.INFERENCE_BATCH_WINDOW_MS) / 1000.0
+        self.max_batch = max_batch or Config.INFERENCE_MAX_BATCH
+        self._queue = queue.Queue()
+        self.analyzer = None
+        self.stats = {'requests': 0, 'batches': 0, 'batched_texts': 0}
+
+    def serve_forever(self):
+        listener = self._listen()
+        print(f"🚀 Inference worker listening on {self.address}")
+
+        # Accept clients right away; requests queue up while the model is still loading
+        from services.model_registry import registry
+        # This process is where the model actually lives
+        registry.remote = False
+        self.registry = registry
+        threading.Thread(target=self._accept_loop, args=(listener,), daemon=True).start()
+
+        self.analyzer = registry.get()
+        print("✅ Inference worker ready")
+        self._model_loop()
+
+    def _listen(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            # Remove a stale socket left by a crashed worker, but never steal a live one
+            try:
+                Client(self.address, family='AF_UNIX', authkey=self.authkey).close()
+                raise RuntimeError(f"Another inference worker is already listening on {self.address}")
+            except (ConnectionRefusedError, FileNotFoundError, socket.error):
+                os.unlink(self.address)
+        return Listener(self.address, family=_address_family(self.address), authkey=self.authkey)
+
+    def _accept_loop(self, listener):
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"⚠️ Inference worker accept failed: {str(e)}")
+                continue
+            threading.Thread(target=self._connection_loop, args=(conn,), daemon=True).start()
+
+    def _connection_loop(self, conn):
+        send_lock = threading.Lock()
+
+        def reply(request_id, ok, payload):
+            with send_lock:
+                try:
+                    conn.send((request_id, ok, payload))
+                except (OSError, EOFError):
+                    pass
+
+        while True:
+            try:
+                request_id, method, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                conn.close()
+                return
+            if method == 'readiness':
+                # Answered here, not queued behind the model thread, so it works while loading
+                reply(request_id, True, {**self.registry.readiness(), 'remote': True})
+                continue
+            if method not in ALLOWED_METHODS:
+                reply(request_id, False, f"Unsupported method: {method}")
+                continue
+            self._queue.put(_PendingRequest(request_id, method, args, kwargs, reply))
+
+    def _model_loop(self):
+        """Single thread that owns the model: drains the queue in micro-batches."""
+        while True:
+            first = self._queue.get()
+            batch, others = [], []
+            (batch if first.method in BATCHABLE_METHODS else others).append(first)
+
+            # Collect whatever else arrives within the batching window
+            deadline = time.monotonic() + self.batch_window
+            while self._batched_text_count(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                (batch if item.method in BATCHABLE_METHODS else others).append(item)
+
+            # Full and labels-only requests use different prompts, so they batch separately;
+            # single-review requests keep the interactive logit scoring, batch requests do not
+            groups = {}
+            for item in batch:
+                groups.setdefault((item.kwargs.get('detail', 'full'), item.method == 'analyze_with_aspects'), []).append(item)
+            for (detail, interactive), items in groups.items():
+                self._run_batch(items, detail, rescore=True if interactive else None)
+            for item in others:
+                self._run_single(item)
+
+    @staticmethod
+    def _batched_text_count(batch):
+        return sum(len(item.args[0]) if item.method == 'analyze_with_aspects_batch' else 1 for item in batch)
+
+    def _run_batch(self, batch, detail='full', rescore=None):
+        texts, spans = [], []
+        # Per-row hints of batch requests (None for rows that came without them)
+        hints = {'aspects': [], 'token_lengths': []}
+        for item in batch:
+            item_texts = list(item.args[0]) if item.method == 'analyze_with_aspects_batch' else [item.args[0]]
+            spans.append((len(texts), len(item_texts)))
+            texts.extend(item_texts)
+            for name, column in hints.items():
+                column.extend(item.kwargs.get(name) or [None] * len(item_texts))
+        hints = {name: column if any(value is not None for value in column) else None for name, column in hints.items()}
+
+        self.stats['requests'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['batched_texts'] += len(texts)
+
+        try:
+            results = self.analyzer.analyze_with_aspects_batch(texts, detail=detail, rescore=rescore, **hints)
+        except Exception as e:
+            traceback.print_exc()
+            for item in batch:
+                item.reply(item.request_id, False, str(e))
+            return
+
+        for item, (start, count) in zip(batch, spans):
+            item_results = results[start:start + count]
+            if item.method == 'analyze_with_aspects_batch':
+                item.reply(item.request_id, True, item_results)
+            elif item_results[0] is None:
+                item.reply(item.request_id, False, "Failed to analyze aspects: model output could not be parsed")
+            else:
+                item.reply(item.request_id, True, item_results[0])
+
+    def _run_single(self, item):
+        self.stats['requests'] += 1
+        try:
+            if item.method == 'registry_stats':
+                result = {**self.registry.stats(), 'worker': dict(self.stats)}
+            else:
+                result = getattr(self.analyzer, item.method)(*item.args, **item.kwargs)
+            item.reply(item.request_id, True, result)
+        except Exception as e:
+            item.reply(item.request_id, False, str(e))
+
+
+class InferenceClient:
+    """
+    Web-side proxy with the SentimentAnalyzer methods the routes use.
+    Calls are sent to the inference worker; the calling thread blocks until its result arrives.
+    """
+
+    def __init__(self, address=None, authkey=None, timeout=None):
+        self.address = address or Config.INFERENCE_WORKER_ADDRESS
+        self.authkey = authkey or Config.INFERENCE_WORKER_AUTHKEY
+        self.timeout = timeout or Config.INFERENCE_WORKER_TIMEOUT
+        self.device = 'remote'
+        self._conn = None
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._next_id = 0
+
+    def _connect(self):
+        if self._conn is not None:
+            return self._conn
+        try:
+            self._conn = Client(self.address, family=_address_family(self.address), authkey=self.authkey)
+        except (ConnectionRefusedError, FileNotFoundError, OSError) as e:
+            raise RuntimeError(f"Inference worker not reachable at {self.address}: {str(e)}")
+        threading.Thread(target=self._reader_loop, args=(self._conn,), daemon=True).start()
+        return self._conn
+
+    def _reader_loop(self, conn):
+        while True:
+            try:
+                request_id, ok, payload = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._futures.pop(request_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+        # Connection lost: fail everything still waiting and reconnect on the next call
+        with self._lock:
+            if self._conn is conn:
+                self._conn = None
+            pending, self._futures = self._futures, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("Inference worker connection lost"))
+
+    def _call(self, method, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            conn = self._connect()
+            self._next_id += 1
+            request_id = self._next_id
+            self._futures[request_id] = future
+            try:
+                conn.send((request_id, method, args, kwargs))
+            except (OSError, EOFError) as e:
+                self._futures.pop(request_id, None)
+                self._conn = None
+                raise RuntimeError(f"Inference worker send failed: {str(e)}")
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # The worker may still answer; the reader loop then finds no future and drops the reply
+            with self._lock:
+                self._futures.pop(request_id, None)
+            raise RuntimeError(f"Inference worker did not answer {method} within {self.timeout}s")
+
+    def analyze(self, text):
+        return self._call('analyze', text)
+
+    def analyze_aspect(self, text, aspect):
+        return self._call('analyze_aspect', text, aspect)
+
+    def analyze_with_aspects(self, text, detail='full'):
+        return self._call('analyze_with_aspects', text, detail=detail)
+
+    def analyze_with_aspects_batch(self, texts, batch_size=None, detail='full', rescore=None,
+                                   aspects=None, token_lengths=None):
+        # The worker merges requests into its own batches and decides rescoring per request kind
+        return self._call(
+            'analyze_with_aspects_batch', list(texts), detail=detail,
+            aspects=list(aspects) if aspects is not None else None,
+            token_lengths=list(token_lengths) if token_lengths is not None else None
+        )
+
+    def analyze_with_aspects_stream(self, text):
+        # Tokens are not relayed over IPC; the worker's batched result arrives as one event
+        yield {'type': 'result', 'result': self.analyze_with_aspects(text)}
+
+    def get_generation_stats(self):
+        return self._call('get_generation_stats')
+
+    def get_cache_stats(self):
+        return self._call('get_cache_stats')
+
+    def get_fingerprints(self):
+        return self._call('get_fingerprints')
+
+    def worker_stats(self):
+        return self._call('registry_stats')
+
+    def readiness(self):
+        return self._call('readiness')
+
+
+if __name__ == '__main__':
+    InferenceWorker().serve_forever()
@@ -0,0 +1,449 @@
+"""
+Background Job Runner
+Runs persisted AnalysisJob rows on a background thread. Each chunk of rows is
+committed together with the job cursor, so after a crash or restart a job resumes
+from the last committed row. Runners claim jobs atomically and keep a heartbeat,
+so a job owned by a dead process is picked up again once its heartbeat goes stale.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from models import db, AnalysisJob, Feedback
+from services.feedback_writer import apply_analysis, create_analyzed_feedback
+from services.model_registry import get_analyzer
+from services.near_duplicates import (
+    BandIndex, NearDuplicateStats, find_analyzed, max_distance_for, result_from_feedback, verified_match
+)
+from services.reanalysis import current_fingerprints, describe_filters, stale_pairs, stale_query
+from services.sharded_executor import get_sharded_executor
+from utils.preprocess import preprocess_batch
+
+TERMINAL_STATUSES = {'completed', 'failed', 'cancelled'}
+ACTIVE_STATUSES = {'queued', 'running'}
+
+
+def create_batch_job(user_id, rows, source_name=None):
+    """Persist a batch job for `rows` (dicts with 'text' and optional 'hotel_name'/'rating')."""
+    job = AnalysisJob(
+        user_id=user_id,
+        kind='batch',
+        status='queued',
+        source_name=source_name,
+        payload=json.dumps(rows, ensure_ascii=False),
+        total=len(rows)
+    )
+    db.session.add(job)
+    db.session.commit()
+    if job_runner is not None:
+        job_runner.notify()
+    return job
+
+
+def create_reanalyze_job(user_id, filters=None, rows_per_minute=None):
+    """
+    Persist a job that re-analyzes stored feedback with stale fingerprints, narrowed by `filters`
+    (services.reanalysis.parse_filters). Returns (job, None), or (None, active_job) when a
+    re-analysis job is already queued or running (two would analyze the same rows).
+    """
+    active = AnalysisJob.query.filter(
+        AnalysisJob.kind == 'reanalyze', AnalysisJob.status.in_(ACTIVE_STATUSES)
+    ).first()
+    if active is not None:
+        return None, active
+    filters = filters or {}
+    job = AnalysisJob(
+        user_id=user_id,
+        kind='reanalyze',
+        status='queued',
+        source_name=describe_filters(filters),
+        payload=json.dumps({'filters': filters, 'rows_per_minute': rows_per_minute, 'last_id': 0}, ensure_ascii=False),
+        total=stale_query(filters, stale_pairs(current_fingerprints())).count()
+    )
+    db.session.add(job)
+    db.session.commit()
+    if job_runner is not None:
+        job_runner.notify()
+    return job, None
+
+
+def request_cancel(job):
+    """Queued jobs are cancelled immediately; running jobs stop after the current chunk."""
+    if job.status in TERMINAL_STATUSES:
+        return job
+    job.cancel_requested = True
+    if job.status == 'queued':
+        job.status = 'cancelled'
+        job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+class JobRunner:
+    """One background thread per process that executes jobs chunk by chunk."""
+
+    def __init__(self, app):
+        self.app = app
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = threading.Event()
+        self._current_job_id = None
+        self._stop = False
+
+    def start(self):
+        threading.Thread(target=self._loop, name='job-runner', daemon=True).start()
+        threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True).start()
+        print(f"✅ Job runner started ({self.worker_id})")
+
+    def notify(self):
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop:
+            try:
+                with self.app.app_context():
+                    job = self._claim_next_job()
+                    if job is not None:
+                        self._run_job(job)
+                        continue
+            except Exception as e:
+                print(f"❌ Job runner error: {str(e)}")
+                print(traceback.format_exc())
+            self._wake.wait(Config.JOB_POLL_SECONDS)
+            self._wake.clear()
+
+    def _heartbeat_loop(self):
+        """Keep the claim on the current job fresh, even while a long chunk is being generated."""
+        while not self._stop:
+            time.sleep(Config.JOB_HEARTBEAT_SECONDS)
+            job_id = self._current_job_id
+            if job_id is None:
+                continue
+            try:
+                with self.app.app_context():
+                    AnalysisJob.query.filter_by(id=job_id, worker_id=self.worker_id).update(
+                        {'heartbeat_at': datetime.utcnow()}
+                    )
+                    db.session.commit()
+            except Exception as e:
+                print(f"⚠️ Job heartbeat failed: {str(e)}")
+
+    def _claim_next_job(self):
+        """
+        Atomically take the oldest queued job, or a running job whose owner stopped heartbeating.
+        Uploaded batches go before re-analysis jobs, which only refresh rows that already have labels.
+        """
+        stale_before = datetime.utcnow() - timedelta(seconds=Config.JOB_STALE_SECONDS)
+        claimable = db.or_(
+            AnalysisJob.status == 'queued',
+            db.and_(AnalysisJob.status == 'running', AnalysisJob.heartbeat_at < stale_before)
+        )
+        candidate = AnalysisJob.query.filter(claimable).order_by(
+            db.case((AnalysisJob.kind == 'reanalyze', 1), else_=0), AnalysisJob.created_at.asc()
+        ).first()
+        if candidate is None:
+            return None
+
+        claimed = AnalysisJob.query.filter(AnalysisJob.id == candidate.id, claimable).update({
+            'status': 'running',
+            'worker_id': self.worker_id,
+            'heartbeat_at': datetime.utcnow(),
+            'started_at': candidate.started_at or datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return None
+
+        job = db.session.get(AnalysisJob, candidate.id)
+        db.session.refresh(job)
+        if job.cursor:
+            print(f"🔁 Resuming job {job.id} ({job.kind}) at row {job.cursor}/{job.total}")
+        return job
+
+    def _run_job(self, job):
+        self._current_job_id = job.id
+        try:
+            if job.kind == 'reanalyze':
+                self._process_reanalyze_job(job)
+            else:
+                self._process_batch_job(job)
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Job {job.id} failed: {str(e)}")
+            print(traceback.format_exc())
+            job = db.session.get(AnalysisJob, job.id)
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            self._record_errors(job, [f"任务失败: {str(e)}"])
+            db.session.commit()
+        finally:
+            self._current_job_id = None
+
+    @staticmethod
+    def _job_analyzer():
+        """
+        (analyzer, rows per chunk) for job processing: the shard workers with BATCH_SHARD_ENABLED,
+        otherwise the registry's analyzer (an InferenceClient in inference-worker mode).
+        """
+        if Config.BATCH_SHARD_ENABLED:
+            analyzer = get_sharded_executor()
+            # Enough rows per chunk to give every worker a sub-batch
+            return analyzer, max(Config.JOB_CHUNK_SIZE, analyzer.workers * analyzer.shard_size)
+        return get_analyzer(), Config.JOB_CHUNK_SIZE
+
+    def _still_owned(self, job):
+        """
+        Refresh the claim inside the chunk's transaction. False (and the chunk rolled back) when
+        another runner took the job over after a stale heartbeat, so rows are never written twice.
+        """
+        owned = AnalysisJob.query.filter_by(id=job.id, worker_id=self.worker_id).update(
+            {'heartbeat_at': datetime.utcnow()}, synchronize_session=False
+        )
+        if owned:
+            return True
+        db.session.rollback()
+        print(f"⚠️ Job {job.id} was taken over by another runner; dropping this runner's chunk")
+        return False
+
+    @staticmethod
+    def _cancelled(job):
+        """Pick up cancel requests made from another request/thread; True once the job is cancelled."""
+        db.session.refresh(job)
+        if not job.cancel_requested:
+            return False
+        job.status = 'cancelled'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        print(f"⏹️ Job {job.id} cancelled at row {job.cursor}/{job.total}")
+        return True
+
+    def _process_batch_job(self, job):
+        rows = json.loads(job.payload or '[]')
+        # Language, dedupe keys etc. for the whole job in one pass, outside the inference loop
+        batch = preprocess_batch([row['text'] for row in rows], [row.get('hotel_name') for row in rows])
+        near_stats = None
+        if Config.NEAR_DUPLICATE_ENABLED:
+            near_stats = NearDuplicateStats(json.loads(job.near_duplicate_stats or '{}'))
+        analyzer, chunk_size = self._job_analyzer()
+        # What this job's analyzer stamps, so its own rows (and earlier ones like them) count as current
+        current = current_fingerprints(analyzer)
+
+        while job.cursor < job.total:
+            if self._cancelled(job):
+                return
+
+            start = job.cursor
+            chunk = rows[start:start + chunk_size]
+            indices = range(start, start + len(chunk))
+            # Duplicate reviews in the chunk are sent to the model once
+            first_of_key = {}
+            for i in indices:
+                first_of_key.setdefault(batch.dedupe_key[i], i)
+            # Near duplicates of analyzed reviews reuse their analysis; near duplicates within
+            # the chunk follow the one review of their group that is sent to the model
+            result_of_key, followers = {}, {}
+            if near_stats is not None:
+                result_of_key, followers = self._match_near_duplicates(batch, first_of_key, near_stats, current)
+            pending = {key: i for key, i in first_of_key.items() if key not in result_of_key and key not in followers}
+            errors = []
+            try:
+                # Candidates and token estimates from preprocessing: the analyzer skips its own passes
+                unique_results = analyzer.analyze_with_aspects_batch(
+                    [batch.text[i] for i in pending.values()], detail=Config.BATCH_ANALYSIS_DETAIL,
+                    aspects=[batch.aspects[i] for i in pending.values()],
+                    token_lengths=[batch.token_length[i] for i in pending.values()]
+                ) if pending else []
+                result_of_key.update(zip(pending, unique_results))
+                for key, leader in followers.items():
+                    result_of_key[key] = result_of_key[leader]
+            except Exception as e:
+                errors.append(f"第{start+1}-{start+len(chunk)}条评论批量分析失败: {str(e)}")
+
+            for i, row in zip(indices, chunk):
+                if batch.dedupe_key[i] not in result_of_key:
+                    # The model call for the chunk failed; already reported above
+                    continue
+                result = result_of_key[batch.dedupe_key[i]]
+                if result is None:
+                    errors.append(f"第{i+1}条评论处理失败: 模型输出无法解析")
+                    continue
+                create_analyzed_feedback(
+                    job.user_id, batch.text[i], result,
+                    hotel_name=row.get('hotel_name'), rating=row.get('rating'),
+                    language=batch.language[i], signature=batch.simhash[i]
+                )
+                job.processed += 1
+
+            # Rows and cursor commit together: a restart resumes exactly after this chunk
+            if not self._still_owned(job):
+                return
+            job.cursor = start + len(chunk)
+            job.heartbeat_at = datetime.utcnow()
+            self._record_errors(job, errors)
+            if near_stats is not None:
+                job.near_duplicate_stats = json.dumps(near_stats.to_dict())
+            db.session.commit()
+            print(f"已处理 {job.cursor}/{job.total} 条评论 (任务 {job.id})")
+
+        job.status = 'completed'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        print(f"✅ Job {job.id} completed: {job.processed}/{job.total} rows analyzed, {job.error_count} errors")
+        if near_stats is not None:
+            report = near_stats.to_dict()
+            print(f"♻️ Job {job.id} near-duplicate reuse: {report['hits']}/{report['checked']} "
+                  f"({report['hit_rate']:.1%}), distances {report['distance_histogram']}")
+
+    def _process_reanalyze_job(self, job):
+        """
+        Re-analyze stored rows with stale fingerprints in id order. The last finished id is
+        committed with each chunk, so a restarted job continues after it; the rate limit
+        sleeps between chunks to leave the model to interactive requests.
+        """
+        payload = json.loads(job.payload or '{}')
+        filters = payload.get('filters') or {}
+        rows_per_minute = payload.get('rows_per_minute')
+        if rows_per_minute is None:
+            rows_per_minute = Config.REANALYZE_ROWS_PER_MINUTE
+        analyzer, chunk_size = self._job_analyzer()
+        if rows_per_minute:
+            # At most ~10 s of rate-limit sleep per chunk, so cancel requests and new uploads are seen promptly
+            chunk_size = max(1, min(chunk_size, rows_per_minute // 6))
+        # Measured now rather than at creation: a restart may have changed the model or prompts
+        current = current_fingerprints(analyzer)
+        query = stale_query(filters, stale_pairs(current))
+
+        while True:
+            if self._cancelled(job):
+                return
+            if AnalysisJob.query.filter_by(kind='batch', status='queued').first() is not None:
+                # Step aside for uploads; the claim order runs them first, then this job resumes
+                if not self._still_owned(job):
+                    return
+                job.status = 'queued'
+                job.worker_id = None
+                db.session.commit()
+                print(f"⏸️ Job {job.id} paused at row {job.cursor}/{job.total} for queued batch jobs")
+                return
+
+            started = time.monotonic()
+            feedbacks = query.filter(Feedback.id > payload.get('last_id', 0)).order_by(Feedback.id).limit(chunk_size).all()
+            if not feedbacks:
+                break
+            errors = []
+            try:
+                results = analyzer.analyze_with_aspects_batch(
+                    [feedback.text for feedback in feedbacks], detail=Config.BATCH_ANALYSIS_DETAIL
+                )
+            except Exception as e:
+                results = []
+                errors.append(f"反馈 {feedbacks[0].id}-{feedbacks[-1].id} 批量重新分析失败: {str(e)}")
+
+            for feedback, result in zip(feedbacks, results):
+                if result is None:
+                    errors.append(f"反馈 {feedback.id} 重新分析失败: 模型输出无法解析")
+                    continue
+                apply_analysis(feedback, result)
+                job.processed += 1
+
+            # Labels and the resume point commit together; failed rows stay stale for a later job
+            if not self._still_owned(job):
+                return
+            payload['last_id'] = feedbacks[-1].id
+            job.payload = json.dumps(payload, ensure_ascii=False)
+            job.cursor += len(feedbacks)
+            job.total = max(job.total, job.cursor)
+            job.heartbeat_at = datetime.utcnow()
+            self._record_errors(job, errors)
+            db.session.commit()
+            print(f"已重新分析 {job.cursor}/{job.total} 条评论 (任务 {job.id})")
+
+            if rows_per_minute:
+                time.sleep(max(0.0, len(feedbacks) * 60.0 / rows_per_minute - (time.monotonic() - started)))
+
+        # Rows re-analyzed elsewhere in the meantime drop out of the query; report what was left
+        if not self._still_owned(job):
+            return
+        job.total = job.cursor
+        job.status = 'completed'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        print(f"✅ Job {job.id} completed: {job.processed}/{job.total} stale rows re-analyzed, {job.error_count} errors")
+
+    @staticmethod
+    def _match_near_duplicates(batch, first_of_key, stats, current=None):
+        """
+        For the chunk's unique reviews: ({key: reused result} for near duplicates of analyzed
+        Feedback rows, {key: leader key} for near duplicates of another review in the chunk).
+        Every checked review is recorded in `stats` with its nearest-signature distance.
+        Only rows analyzed with the `current` fingerprints, and only texts that are the same
+        review after canonicalization (near_duplicates.same_review), are reused.
+        """
+        keys = [key for key, i in first_of_key.items() if batch.simhash_features[i]]
+        rows = [first_of_key[key] for key in keys]
+        signatures = [batch.simhash[i] for i in rows]
+        canonicals = [batch.canonical[i] for i in rows]
+        limits = [max_distance_for(batch.simhash_features[i]) for i in rows]
+        reused_ids, followers = {}, {}
+        leaders = BandIndex()
+        leader_canonical = {}
+        matches = find_analyzed(signatures, canonicals, limits, current)
+        for key, signature, canonical, limit, (feedback_id, distance) in zip(keys, signatures, canonicals, limits, matches):
+            if feedback_id is not None:
+                reused_ids[key] = (feedback_id, distance)
+                stats.record(distance, hit=True)
+                continue
+            leader, leader_distance = verified_match(leaders.candidates(signature), canonical, limit, leader_canonical.get)
+            if leader is not None:
+                followers[key] = leader
+                stats.record(leader_distance, hit=True)
+                continue
+            nearest = min((d for d in (distance, leader_distance) if d is not None), default=None)
+            stats.record(nearest, hit=False)
+            leaders.add(signature, key)
+            leader_canonical[key] = canonical
+
+        if not reused_ids:
+            return {}, followers
+        feedbacks = {
+            feedback.id: feedback for feedback in Feedback.query.options(db.selectinload(Feedback.aspects))
+            .filter(Feedback.id.in_({feedback_id for feedback_id, _ in reused_ids.values()}))
+        }
+        reused = {
+            key: result_from_feedback(feedbacks[feedback_id], distance)
+            for key, (feedback_id, distance) in reused_ids.items()
+        }
+        return reused, followers
+
+    @staticmethod
+    def _record_errors(job, errors):
+        if not errors:
+            return
+        job.error_count = (job.error_count or 0) + len(errors)
+        stored = json.loads(job.errors or '[]')
+        stored.extend(errors[:max(0, Config.JOB_MAX_STORED_ERRORS - len(stored))])
+        job.errors = json.dumps(stored, ensure_ascii=False)
+
+
+# Set by start_job_runner(); None in processes that only enqueue jobs
+job_runner = None
+
+
+def runner_started():
+    """Whether this process runs jobs (otherwise another process has to claim them)."""
+    return job_runner is not None
+
+
+def start_job_runner(app):
+    """Start the background runner for this process (once)."""
+    global job_runner
+    if job_runner is None:
+        job_runner = JobRunner(app)
+        job_runner.start()
+    return job_runner
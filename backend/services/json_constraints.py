@@ -0,0 +1,128 @@
+"""
+Schema-Constrained JSON Decoding
+Logits processor + stopping criteria for the aspect analysis prompt:
+- the first non-whitespace output character must open the JSON object
+- sentiment values and aspect names may only spell an allowed vocabulary entry
+- generation stops as soon as the top-level object closes
+"""
+import re
+import sys
+from pathlib import Path
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from services.json_scan import JsonScanState
+
+# Characters allowed to follow a closing quote inside the same token (e.g. '",' or '"}')
+_CLOSER_RE = re.compile(r'^([^"\\]*)"[\s,:}\]]*$')
+
+
+class JsonVocabularyIndex:
+    """
+    Per-tokenizer lookup tables, built once per model load.
+    Maps decoded token text to token ids so allowed continuations of a partially
+    written vocabulary value can be found without scanning the whole vocabulary.
+    """
+
+    def __init__(self, tokenizer, vocabularies):
+        self.vocabularies = {name: sorted(values) for name, values in vocabularies.items()}
+        self.vocab_size = len(tokenizer)
+        self.token_texts = tokenizer.batch_decode([[i] for i in range(self.vocab_size)])
+
+        self._by_text = {}
+        self._closers = {}
+        open_ids = []
+        for token_id, text in enumerate(self.token_texts):
+            self._by_text.setdefault(text, []).append(token_id)
+            match = _CLOSER_RE.match(text)
+            if match:
+                self._closers.setdefault(match.group(1), []).append(token_id)
+            stripped = text.lstrip()
+            if stripped.startswith('{') or (text and not stripped):
+                open_ids.append(token_id)
+        self.open_ids = torch.tensor(open_ids, dtype=torch.long)
+        self._allowed_cache = {}
+
+    def allowed_ids(self, vocabulary, written, values=None):
+        """
+        Token ids that keep `written` on track to spell a value of `vocabulary` and close it.
+        `values` optionally narrows the vocabulary for one row (e.g. only candidate aspects).
+        """
+        values = tuple(sorted(values)) if values is not None else tuple(self.vocabularies[vocabulary])
+        cache_key = (values, written)
+        if cache_key not in self._allowed_cache:
+            ids = set()
+            for value in values:
+                if not value.startswith(written):
+                    continue
+                remaining = value[len(written):]
+                for end in range(1, len(remaining) + 1):
+                    ids.update(self._by_text.get(remaining[:end], []))
+                ids.update(self._closers.get(remaining, []))
+            self._allowed_cache[cache_key] = torch.tensor(sorted(ids), dtype=torch.long) if ids else None
+        return self._allowed_cache[cache_key]
+
+
+class JsonDecodeTracker:
+    """Feeds newly generated tokens of every row into its JsonScanState (idempotent per step)."""
+
+    def __init__(self, index, prompt_len, batch_size, row_vocabularies=None):
+        self.index = index
+        self.prompt_len = prompt_len
+        self.states = [JsonScanState() for _ in range(batch_size)]
+        # Optional per-row overrides: [{'aspects': [...]}, None, ...]
+        self.row_vocabularies = row_vocabularies or [None] * batch_size
+        self._seen = prompt_len
+
+    def row_values(self, row, vocabulary):
+        overrides = self.row_vocabularies[row]
+        return overrides.get(vocabulary) if overrides else None
+
+    def update(self, input_ids):
+        length = input_ids.shape[1]
+        if length <= self._seen:
+            return
+        new_tokens = input_ids[:, self._seen:length].tolist()
+        for state, tokens in zip(self.states, new_tokens):
+            for token_id in tokens:
+                state.feed(self.index.token_texts[token_id] if token_id < self.index.vocab_size else '')
+        self._seen = length
+
+
+class ConstrainedJsonLogitsProcessor(LogitsProcessor):
+    """Masks every token that would break the allowed-vocabulary schema."""
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    def __call__(self, input_ids, scores):
+        self.tracker.update(input_ids)
+        index = self.tracker.index
+        for row, state in enumerate(self.tracker.states):
+            if state.done:
+                continue
+            if not state.started:
+                allowed = index.open_ids
+            else:
+                vocabulary = state.string_constraint()
+                if vocabulary is None:
+                    continue
+                allowed = index.allowed_ids(vocabulary, state.string_buf, self.tracker.row_values(row, vocabulary))
+                if allowed is None:
+                    continue
+            allowed = allowed[allowed < scores.shape[1]].to(scores.device)
+            mask = torch.full_like(scores[row], float('-inf'))
+            mask[allowed] = 0
+            scores[row] = scores[row] + mask
+        return scores
+
+
+class JsonObjectStoppingCriteria(StoppingCriteria):
+    """Stops each row once its top-level JSON object has closed."""
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+
+    def __call__(self, input_ids, scores, **kwargs):
+        self.tracker.update(input_ids)
+        return torch.tensor([state.done for state in self.tracker.states], dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,109 @@
+"""
+Incremental JSON Scanner
+Character-level scanner for model output that is still being generated. Used by
+constrained decoding (services/json_constraints.py) and by streaming analysis to
+spot completed objects; it has no torch dependency.
+"""
+
+
+class JsonScanState:
+    """
+    Incremental JSON scanner for one generated sequence.
+    Tracks just enough structure to know which string is being written and whether
+    the top-level object has closed.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.done = False
+        # Stack of containers: {'type': 'object'|'array', 'key': str|None, 'parent_key': str|None, 'expect': 'key'|'value'}
+        self.stack = []
+        self.in_string = False
+        self.string_role = None
+        self.string_buf = ''
+        self.escape = False
+        self.closed_objects = []
+        # (parent_key, start, end) character offsets of every closed object, in closing order
+        self.closed_spans = []
+        self.position = 0
+
+    def feed(self, text):
+        for ch in text:
+            if self.done:
+                return
+            if self.in_string:
+                self._feed_string_char(ch)
+            else:
+                self._feed_structural_char(ch)
+            self.position += 1
+
+    def _feed_string_char(self, ch):
+        if self.escape:
+            self.escape = False
+            self.string_buf += ch
+        elif ch == '\\':
+            self.escape = True
+        elif ch == '"':
+            self.in_string = False
+            top = self.stack[-1] if self.stack else None
+            if self.string_role == 'key' and top is not None:
+                top['key'] = self.string_buf
+        else:
+            self.string_buf += ch
+
+    def _feed_structural_char(self, ch):
+        top = self.stack[-1] if self.stack else None
+        if ch == '{':
+            self.started = True
+            parent_key = self._current_key(top)
+            self.stack.append({'type': 'object', 'key': None, 'parent_key': parent_key, 'expect': 'key', 'start': self.position})
+        elif ch == '[':
+            parent_key = self._current_key(top)
+            self.stack.append({'type': 'array', 'key': None, 'parent_key': parent_key, 'expect': 'value'})
+        elif ch in '}]':
+            if not self.stack:
+                return
+            closed = self.stack.pop()
+            if closed['type'] == 'object':
+                self.closed_objects.append(closed['parent_key'])
+                self.closed_spans.append((closed['parent_key'], closed['start'], self.position + 1))
+            if not self.stack and self.started:
+                self.done = True
+        elif ch == '"':
+            self.in_string = True
+            self.string_buf = ''
+            if top is not None and top['type'] == 'object' and top['expect'] == 'key':
+                self.string_role = 'key'
+            else:
+                self.string_role = 'value'
+        elif ch == ':':
+            if top is not None and top['type'] == 'object':
+                top['expect'] = 'value'
+        elif ch == ',':
+            if top is not None and top['type'] == 'object':
+                top['expect'] = 'key'
+                top['key'] = None
+
+    @staticmethod
+    def _current_key(top):
+        if top is None:
+            return None
+        if top['type'] == 'array':
+            return top['parent_key']
+        return top['key']
+
+    def string_constraint(self):
+        """Name of the vocabulary the open string must come from ('labels'/'aspects'), or None."""
+        if not self.in_string or not self.stack:
+            return None
+        top = self.stack[-1]
+        if top['type'] != 'object':
+            return None
+        if top['parent_key'] == 'aspects':
+            return 'aspects' if self.string_role == 'key' else 'labels'
+        if self.string_role == 'value':
+            if top['key'] in ('overall', 'sentiment'):
+                return 'labels'
+            if top['key'] == 'aspect':
+                return 'aspects'
+        return None
@@ -0,0 +1,168 @@
+"""
+Model Registry
+Process-wide, thread-safe home of the SentimentAnalyzer instances. Each model is
+loaded once and shared by every blueprint, so resident memory does not grow with
+the number of endpoints that need the model.
+"""
+import threading
+import time
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+
+
+def _process_rss_bytes():
+    """Resident set size of this process (Linux /proc, falls back to peak RSS)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except Exception:
+        return None
+
+
+class ModelRegistry:
+    """Loads each model at most once, even when several threads ask for it at the same time."""
+
+    def __init__(self):
+        # When True, analyzers live in the inference worker process and get() returns a client
+        self.remote = Config.INFERENCE_WORKER_ENABLED
+        self._client = None
+        self._lock = threading.Lock()
+        self._model_locks = {}
+        self._analyzers = {}
+        self._info = {}
+        # model_name -> {'status': 'loading'|'ready'|'failed', ...}; read by /api/ready
+        self._status = {}
+
+    def _model_lock(self, model_name):
+        with self._lock:
+            if model_name not in self._model_locks:
+                self._model_locks[model_name] = threading.Lock()
+            return self._model_locks[model_name]
+
+    def get(self, model_name=None):
+        """Return the shared analyzer for `model_name` (default Config.MODEL_NAME), loading it on first use."""
+        if self.remote:
+            return self._remote_client()
+
+        model_name = model_name or Config.MODEL_NAME
+        analyzer = self._analyzers.get(model_name)
+        if analyzer is not None:
+            return analyzer
+
+        with self._model_lock(model_name):
+            # Another thread may have finished loading while we waited
+            analyzer = self._analyzers.get(model_name)
+            if analyzer is not None:
+                return analyzer
+
+            self._status[model_name] = {'status': 'loading', 'started_at': time.time()}
+            rss_before = _process_rss_bytes()
+            start = time.perf_counter()
+            try:
+                # Imported here so the registry itself stays cheap to import
+                from services.sentiment_analyzer import SentimentAnalyzer
+                import_seconds = time.perf_counter() - start
+                analyzer = SentimentAnalyzer(model_name=model_name)
+            except Exception as e:
+                self._status[model_name].update({
+                    'status': 'failed', 'error': str(e), 'finished_at': time.time()
+                })
+                raise
+            load_seconds = time.perf_counter() - start
+            rss_after = _process_rss_bytes()
+
+            self._info[model_name] = {
+                'model_name': model_name,
+                'device': analyzer.device,
+                'load_seconds': round(load_seconds, 3),
+                'loaded_at': time.time(),
+                'rss_delta_bytes': (rss_after - rss_before) if rss_before and rss_after else None,
+                'timings': {'import_seconds': round(import_seconds, 3), **analyzer.load_timings},
+                **analyzer.memory_footprint()
+            }
+            self._analyzers[model_name] = analyzer
+            self._status[model_name].update({
+                'status': 'ready', 'finished_at': time.time(), 'load_seconds': round(load_seconds, 3),
+                'timings': self._info[model_name]['timings']
+            })
+            print(f"✅ Model registry: {model_name} loaded in {load_seconds:.1f}s")
+            return analyzer
+
+    def _remote_client(self):
+        with self._lock:
+            if self._client is None:
+                from services.inference_worker import InferenceClient
+                self._client = InferenceClient()
+            return self._client
+
+    def preload(self, model_name=None):
+        """Start loading the model on a background thread so no request pays the load cost."""
+        if self.remote:
+            return None
+        model_name = model_name or Config.MODEL_NAME
+
+        def load():
+            try:
+                self.get(model_name)
+            except Exception as e:
+                print(f"❌ Model preload failed: {str(e)}")
+
+        thread = threading.Thread(target=load, name=f'model-preload-{model_name}', daemon=True)
+        thread.start()
+        return thread
+
+    def readiness(self, model_name=None):
+        """Load status of the model: not_loaded, loading, ready or failed (with timings)."""
+        model_name = model_name or Config.MODEL_NAME
+        if self.remote:
+            try:
+                return self._remote_client().readiness()
+            except Exception as e:
+                return {'model_name': model_name, 'status': 'failed', 'remote': True, 'error': str(e)}
+        status = dict(self._status.get(model_name) or {'status': 'not_loaded'})
+        if status['status'] == 'loading':
+            status['elapsed_seconds'] = round(time.time() - status['started_at'], 3)
+        return {'model_name': model_name, **status}
+
+    def is_loaded(self, model_name=None):
+        return (model_name or Config.MODEL_NAME) in self._analyzers
+
+    def warm_up(self, model_name=None):
+        """Load the model (if needed) and run one short analysis so the first real request is fast."""
+        analyzer = self.get(model_name)
+        start = time.perf_counter()
+        analyzer.analyze("Great hotel, friendly staff.")
+        warmup_seconds = time.perf_counter() - start
+        if self.remote:
+            return {'model_name': model_name or Config.MODEL_NAME, 'remote': True, 'warmup_seconds': round(warmup_seconds, 3)}
+        info = self._info[model_name or Config.MODEL_NAME]
+        info['warmup_seconds'] = round(warmup_seconds, 3)
+        return dict(info)
+
+    def stats(self):
+        """Load time and memory footprint of every loaded model plus process RSS."""
+        if self.remote:
+            return {'remote': True, **self._remote_client().worker_stats()}
+        return {
+            'models': [dict(info) for info in self._info.values()],
+            'process_rss_bytes': _process_rss_bytes()
+        }
+
+
+# Shared by all blueprints
+registry = ModelRegistry()
+
+
+def get_analyzer(model_name=None):
+    """Shared SentimentAnalyzer for this process."""
+    return registry.get(model_name)
@@ -0,0 +1,307 @@
+"""
+Near-Duplicate Reviews
+Scraped feeds repeat the same review with different punctuation, emoji, case or a
+trailing hotel name. Each review gets a 64-bit SimHash of a canonical form of its text
+(those differences removed), stored on Feedback; a batch job reuses the analysis of an
+already-analyzed review whose signature is within NEAR_DUPLICATE_MAX_DISTANCE bits
+instead of calling the model.
+
+Signatures are built from ordered word shingles, so reordered or negated reviews
+("great location, terrible service" / "terrible location, great service") get different
+signatures. A signature match only nominates a candidate: its analysis is reused only if
+both canonical texts are the same review (same_review), since one flipped word can keep
+the signature close while changing every label.
+
+Signatures are also stored as four 16-bit bands (indexed columns). Two signatures at
+distance <= 3 differ in at most 3 bands, so they share at least one band value and a
+band lookup finds every such candidate; larger thresholds still work but may miss some.
+"""
+import hashlib
+import re
+import sys
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from models import db, Feedback
+from services.reanalysis import is_current
+
+BITS = 64
+# Bumped whenever features() changes; rows signed by an older version are re-signed at startup
+SIGNATURE_VERSION = 2
+BANDS = 4
+BAND_BITS = BITS // BANDS
+_MASK = (1 << BITS) - 1
+_BAND_COLUMNS = [getattr(Feedback, f'simhash_band{b}') for b in range(BANDS)]
+
+# CJK runs and word tokens; everything else (punctuation, emoji, symbols) is dropped
+_TOKEN_RE = re.compile(r'[\u4e00-\u9fff]+|[^\W_]+')
+# Distances above this share one histogram bucket
+_HISTOGRAM_MAX = 16
+SHINGLE_SIZES = (2, 3)
+
+
+def canonical_text(text, hotel_name=None):
+    """Lower-cased tokens joined by spaces, with a trailing `hotel_name` removed."""
+    canonical = ' '.join(_TOKEN_RE.findall(unicodedata.normalize('NFKC', text or '').lower()))
+    if hotel_name:
+        hotel = canonical_text(hotel_name)
+        if hotel and canonical.endswith(hotel) and len(hotel) < len(canonical):
+            canonical = canonical[:-len(hotel)].rstrip()
+    return canonical
+
+
+def tokens(canonical):
+    """Words of a canonical text, with every CJK character its own token."""
+    out = []
+    for token in canonical.split():
+        if '\u4e00' <= token[0] <= '\u9fff':
+            out.extend(token)
+        else:
+            out.append(token)
+    return out
+
+
+def features(canonical):
+    """
+    Ordered shingles: every run of 2 and 3 consecutive tokens, so word order and negations
+    change the features around them. Texts shorter than a shingle use their tokens.
+    """
+    words = tokens(canonical)
+    shingles = [' '.join(words[i:i + n]) for n in SHINGLE_SIZES for i in range(len(words) - n + 1)]
+    return shingles or words
+
+
+@lru_cache(maxsize=65536)
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _majority_bits(hashes):
+    """
+    Bits set in more than half of `hashes`, i.e. the SimHash of equally weighted features
+    (repeated features are simply repeated). Counts are kept bit-sliced - counters[k] holds
+    bit k of the count of every position - so each feature costs a few integer ops
+    instead of a 64-step loop.
+    """
+    counters = []
+    for h in hashes:
+        carry = h
+        for k in range(len(counters)):
+            counters[k], carry = counters[k] ^ carry, counters[k] & carry
+            if not carry:
+                break
+        if carry:
+            counters.append(carry)
+
+    # count >= threshold, compared from the most significant count bit down
+    threshold = len(hashes) // 2 + 1
+    greater, equal = 0, _MASK
+    for k in reversed(range(max(len(counters), threshold.bit_length()))):
+        count_bit = counters[k] if k < len(counters) else 0
+        if threshold >> k & 1:
+            equal &= count_bit
+        else:
+            greater |= equal & count_bit
+            equal &= ~count_bit & _MASK
+    return greater | equal
+
+
+def signature(canonical):
+    """(signature, feature count) for a canonical text; empty texts give (0, 0)."""
+    feats = features(canonical)
+    if not feats:
+        return 0, 0
+    return _majority_bits([_feature_hash(f) for f in feats]), len(feats)
+
+
+def simhash(text, hotel_name=None):
+    """(signature, feature count) for a review text; empty texts give (0, 0)."""
+    return signature(canonical_text(text, hotel_name))
+
+
+def same_review(a, b, max_edits=None):
+    """
+    Whether two canonical texts are the same review: equal, or at most `max_edits`
+    (Config.NEAR_DUPLICATE_MAX_TOKEN_EDITS) tokens inserted, deleted or replaced.
+    """
+    if a == b:
+        return True
+    max_edits = Config.NEAR_DUPLICATE_MAX_TOKEN_EDITS if max_edits is None else max_edits
+    if max_edits <= 0:
+        return False
+    x, y = tokens(a), tokens(b)
+    if abs(len(x) - len(y)) > max_edits:
+        return False
+    # Levenshtein over tokens, stopping once every entry of a row exceeds the budget
+    previous = list(range(len(y) + 1))
+    for i, token in enumerate(x, 1):
+        row = [i]
+        for j, other in enumerate(y, 1):
+            row.append(min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + (token != other)))
+        if min(row) > max_edits:
+            return False
+        previous = row
+    return previous[-1] <= max_edits
+
+
+def verified_match(candidates, canonical, limit, canonical_of):
+    """
+    (value, distance) of the closest of `candidates` ((distance, value), closest first) within
+    `limit` whose text is the same review as `canonical`, else (None, nearest distance or None).
+    """
+    for distance, value in candidates:
+        if distance > limit:
+            break
+        if same_review(canonical, canonical_of(value)):
+            return value, distance
+    return None, (candidates[0][0] if candidates else None)
+
+
+def hamming(a, b):
+    return bin((a ^ b) & _MASK).count('1')
+
+
+def bands(signature):
+    return [(signature >> (BAND_BITS * b)) & ((1 << BAND_BITS) - 1) for b in range(BANDS)]
+
+
+def signature_columns(signature):
+    """Feedback column values for a signature (SQLite integers are signed 64-bit)."""
+    signed = signature - (1 << BITS) if signature >= 1 << (BITS - 1) else signature
+    columns = {'simhash': signed, 'simhash_version': SIGNATURE_VERSION}
+    columns.update({f'simhash_band{b}': value for b, value in enumerate(bands(signature))})
+    return columns
+
+
+def max_distance_for(feature_count):
+    """Reuse threshold for a review: short texts only reuse an identical signature."""
+    return Config.NEAR_DUPLICATE_MAX_DISTANCE if feature_count >= Config.NEAR_DUPLICATE_MIN_FEATURES else 0
+
+
+class BandIndex:
+    """In-memory band index (signature -> value) for reviews that are not in the database yet."""
+
+    def __init__(self):
+        self._bands = [{} for _ in range(BANDS)]
+
+    def add(self, signature, value):
+        for table, band in zip(self._bands, bands(signature)):
+            table.setdefault(band, []).append((signature, value))
+
+    def candidates(self, signature):
+        """(distance, value) of every indexed signature sharing a band, closest first."""
+        found = {}
+        for table, band in zip(self._bands, bands(signature)):
+            for candidate, value in table.get(band, ()):
+                found[value] = hamming(signature, candidate)
+        return sorted((distance, value) for value, distance in found.items())
+
+
+def find_analyzed(signatures, canonicals, limits, current=None):
+    """
+    For each review (signature, canonical text, max distance): (feedback_id, distance) of the
+    closest analyzed Feedback row within the distance that is the same review, else
+    (None, nearest distance or None). Two queries per call (signatures, then the texts of
+    rows within reach), so callers pass a whole chunk.
+    With `current` fingerprints (services/reanalysis.py), rows analyzed by another model or
+    prompt version are not candidates, so stale labels are not copied onto new reviews.
+    """
+    if not signatures:
+        return []
+    band_values = [set() for _ in range(BANDS)]
+    for signature in signatures:
+        for values, band in zip(band_values, bands(signature)):
+            values.add(band)
+
+    index = BandIndex()
+    candidates = db.session.query(Feedback.id, Feedback.simhash).filter(
+        Feedback.sentiment_label.isnot(None),
+        Feedback.simhash_version == SIGNATURE_VERSION,
+        db.or_(*[column.in_(values) for column, values in zip(_BAND_COLUMNS, band_values)])
+    )
+    if current is not None:
+        candidates = candidates.filter(is_current(current))
+    for feedback_id, signed in candidates:
+        index.add(signed & _MASK, feedback_id)
+
+    per_review = [index.candidates(signature) for signature in signatures]
+    reachable = {
+        feedback_id for found, limit in zip(per_review, limits)
+        for distance, feedback_id in found if distance <= limit
+    }
+    texts = {}
+    if reachable:
+        texts = {
+            feedback_id: canonical_text(text, hotel_name) for feedback_id, text, hotel_name in
+            db.session.query(Feedback.id, Feedback.text, Feedback.hotel_name).filter(Feedback.id.in_(reachable))
+        }
+    return [
+        verified_match(found, canonical, limit, texts.get)
+        for found, canonical, limit in zip(per_review, canonicals, limits)
+    ]
+
+
+def result_from_feedback(feedback, distance):
+    """Analysis result rebuilt from a stored row, in the shape analyze_with_aspects returns."""
+    return {
+        'sentiment': {'label': feedback.sentiment_label, 'score': feedback.sentiment_score},
+        'aspect_sentiments': {aspect.aspect_name: aspect.sentiment_label for aspect in feedback.aspects},
+        'reasoning': '',
+        'aspect_details': [],
+        'source': feedback.analysis_source or 'llm',
+        'model_fingerprint': feedback.model_fingerprint,
+        'prompt_fingerprint': feedback.prompt_fingerprint,
+        'near_duplicate_of': feedback.id,
+        'near_duplicate_distance': distance
+    }
+
+
+class NearDuplicateStats:
+    """Per-job reuse report: hit rate and the distribution of nearest-signature distances."""
+
+    def __init__(self, stored=None):
+        stored = stored or {}
+        self.checked = stored.get('checked', 0)
+        self.hits = stored.get('hits', 0)
+        self.histogram = stored.get('distance_histogram', {})
+
+    def record(self, distance, hit):
+        self.checked += 1
+        self.hits += bool(hit)
+        if distance is None:
+            key = 'none'
+        else:
+            key = str(distance) if distance <= _HISTOGRAM_MAX else f'>{_HISTOGRAM_MAX}'
+        self.histogram[key] = self.histogram.get(key, 0) + 1
+
+    def to_dict(self):
+        return {
+            'checked': self.checked,
+            'hits': self.hits,
+            'hit_rate': round(self.hits / self.checked, 4) if self.checked else 0.0,
+            'max_distance': Config.NEAR_DUPLICATE_MAX_DISTANCE,
+            'distance_histogram': self.histogram
+        }
+
+
+def backfill_signatures(batch_size=1000):
+    """Sign analyzed rows stored before signatures existed or with an older SIGNATURE_VERSION (run at startup)."""
+    filled = 0
+    while True:
+        rows = Feedback.query.filter(
+            db.or_(Feedback.simhash_version.is_(None), Feedback.simhash_version != SIGNATURE_VERSION),
+            Feedback.sentiment_label.isnot(None)
+        ).limit(batch_size).all()
+        if not rows:
+            break
+        for feedback in rows:
+            signature, _ = simhash(feedback.text, feedback.hotel_name)
+            for column, value in signature_columns(signature).items():
+                setattr(feedback, column, value)
+        db.session.commit()
+        filled += len(rows)
+    if filled:
+        print(f"🔏 Added near-duplicate signatures to {filled} existing reviews")
+    return filled
@@ -0,0 +1,134 @@
+"""
+Stale Analysis Re-analysis
+Every stored analysis records the model and prompt templates that produced it
+(Feedback.model_fingerprint / prompt_fingerprint, see SentimentAnalyzer.fingerprints).
+After a model or prompt change, a 'reanalyze' job (services/job_runner.py) walks only
+the rows whose fingerprints differ from the current ones - optionally narrowed by hotel,
+date range or sentiment - in id order, so it can stop and resume anywhere.
+
+Stale rows are found through the (model_fingerprint, prompt_fingerprint) index: the few
+distinct fingerprint pairs are read from the index alone, and each stale pair becomes an
+equality lookup whose rows are already in id order. Rows never fingerprinted (analyzed
+before fingerprints were recorded, or never analyzed) count as stale.
+"""
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from models import db, Feedback
+
+_DATE_FORMAT = '%Y-%m-%d'
+
+
+def current_fingerprints(analyzer=None):
+    """
+    Fingerprints new results are stamped with ({'model', 'distilled', 'prompt'}, see
+    SentimentAnalyzer.fingerprints), as reported by `analyzer` (a SentimentAnalyzer,
+    InferenceClient or ShardedExecutor) or else by the analyzer jobs run on. The precision in
+    them is the one the backend chose when the model loaded, so nothing here probes the device:
+    in inference-worker mode this is a call to the worker and the web process never imports torch.
+    """
+    if analyzer is None:
+        # Imported here: the job runner imports this module
+        from services.job_runner import JobRunner
+        analyzer, _ = JobRunner._job_analyzer()
+    return analyzer.get_fingerprints()
+
+
+def _current_models(current):
+    # Answers of the loaded distilled model are as current as the LLM's
+    return [model for model in (current['model'], current['distilled']) if model]
+
+
+def is_current(current):
+    """SQL condition for rows analyzed with the `current` fingerprints."""
+    return db.and_(
+        Feedback.prompt_fingerprint == current['prompt'],
+        Feedback.model_fingerprint.in_(_current_models(current))
+    )
+
+
+def stale_pairs(current):
+    """Distinct (model_fingerprint, prompt_fingerprint) pairs in the table that are not current."""
+    models = _current_models(current)
+    pairs = db.session.query(Feedback.model_fingerprint, Feedback.prompt_fingerprint).distinct()
+    return [
+        (model, prompt) for model, prompt in pairs
+        if model not in models or prompt != current['prompt']
+    ]
+
+
+def parse_filters(raw):
+    """
+    Validated filters from a request body or the command line:
+    hotel_name, date_from / date_to (YYYY-MM-DD, inclusive, on created_at) and sentiment
+    (one label or a list). Raises ValueError with a message for the client.
+    """
+    from services.sentiment_analyzer import SentimentAnalyzer
+    raw = raw or {}
+    filters = {}
+    hotel_name = (raw.get('hotel_name') or '').strip()
+    if hotel_name:
+        filters['hotel_name'] = hotel_name
+    for key in ('date_from', 'date_to'):
+        value = raw.get(key)
+        if not value:
+            continue
+        try:
+            datetime.strptime(value, _DATE_FORMAT)
+        except (TypeError, ValueError):
+            raise ValueError(f"{key} 日期格式应为 YYYY-MM-DD")
+        filters[key] = value
+    if filters.get('date_from') and filters.get('date_to') and filters['date_from'] > filters['date_to']:
+        raise ValueError("date_from 不能晚于 date_to")
+    sentiment = raw.get('sentiment')
+    if sentiment:
+        labels = [sentiment] if isinstance(sentiment, str) else list(sentiment)
+        unknown = [str(label) for label in labels if label not in SentimentAnalyzer.SENTIMENT_LABELS]
+        if unknown:
+            raise ValueError(f"未知的情感标签: {', '.join(unknown)}")
+        filters['sentiment'] = labels
+    return filters
+
+
+def describe_filters(filters):
+    """Short label for the job list, e.g. 're-analysis: hotel_name=X, sentiment=negative'."""
+    if not filters:
+        return 're-analysis: all stale rows'
+    parts = [f"{key}={','.join(value) if isinstance(value, list) else value}" for key, value in filters.items()]
+    return f"re-analysis: {', '.join(parts)}"
+
+
+def _equals(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def stale_query(filters, pairs):
+    """Feedback rows carrying one of the stale fingerprint `pairs` and matching `filters`."""
+    if not pairs:
+        return Feedback.query.filter(db.false())
+    query = Feedback.query.filter(db.or_(*[
+        db.and_(_equals(Feedback.model_fingerprint, model), _equals(Feedback.prompt_fingerprint, prompt))
+        for model, prompt in pairs
+    ]))
+    if filters.get('hotel_name'):
+        query = query.filter(Feedback.hotel_name == filters['hotel_name'])
+    if filters.get('date_from'):
+        query = query.filter(Feedback.created_at >= datetime.strptime(filters['date_from'], _DATE_FORMAT))
+    if filters.get('date_to'):
+        day_after = datetime.strptime(filters['date_to'], _DATE_FORMAT) + timedelta(days=1)
+        query = query.filter(Feedback.created_at < day_after)
+    if filters.get('sentiment'):
+        query = query.filter(Feedback.sentiment_label.in_(filters['sentiment']))
+    return query
+
+
+def stale_summary(filters, current=None):
+    """Stale row count for `filters` and the fingerprints it was measured against."""
+    current = current or current_fingerprints()
+    pairs = stale_pairs(current)
+    return {
+        'stale': stale_query(filters, pairs).count(),
+        'current': current,
+        'stale_fingerprints': [{'model': model, 'prompt': prompt} for model, prompt in pairs]
+    }
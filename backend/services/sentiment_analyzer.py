@@ -1,17 +1,29 @@
 """
 Sentiment Analysis Service (Full Version)
 Integrates Qwen2 models with strict English aspect mapping and robust error handling.
+The model itself sits behind an inference backend (services/inference_backends.py).
 """
-from transformers import AutoTokenizer, AutoModelForCausalLM, Qwen2ForCausalLM
-import torch
 import sys
 from pathlib import Path
-import traceback
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from config import Config
-import os
 import json
 import re
+import copy
+import hashlib
+import time
+import zlib
+from services.analysis_cache import AnalysisCache
+from services.distilled_classifier import DistilledClassifier
+from services.aspect_extractor import ASPECT_KEYWORDS, ASPECT_LEXICON
+from services.inference_backends import PromptRequest, create_backend
+from services.json_scan import JsonScanState
+
+
+def _pick(values, indices):
+    """values[i] for each index, or None when no per-row values were given."""
+    return None if values is None else [values[i] for i in indices]
+
 
 class SentimentAnalyzer:
     """
@@ -21,158 +33,291 @@ class SentimentAnalyzer:
     
     # 1. Standard White-list (English)
     ALLOWED_ASPECTS = {'Room', 'Location', 'Price', 'Service', 'Food', 'Facilities'}
+    SENTIMENT_LABELS = ['very_positive', 'positive', 'neutral', 'negative', 'very_negative']
+    # Canonical aspect order and the hints listed for each category in prompts
+    ASPECT_DESCRIPTIONS = {
+        'Room': 'cleanliness, comfort, size, noise, bed',
+        'Location': 'proximity, view, neighborhood',
+        'Price': 'value, cost, deposit',
+        'Service': 'staff, check-in, attitude',
+        'Food': 'breakfast, restaurant, drinks',
+        'Facilities': 'wifi, pool, gym, parking, elevator'
+    }
+    # Compact "labels" output: one-letter aspect codes (O = overall) and polarity symbols
+    LABEL_CODES = {'O': 'overall', 'R': 'Room', 'L': 'Location', 'P': 'Price', 'S': 'Service', 'F': 'Food', 'A': 'Facilities'}
+    POLARITY_SYMBOLS = {'++': 'very_positive', '+': 'positive', '0': 'neutral', '-': 'negative', '--': 'very_negative'}
+    LABEL_SCORES = {'very_positive': 0.95, 'positive': 0.75, 'neutral': 0.5, 'negative': 0.3, 'very_negative': 0.1}
+    # Answer digit for each label in the *_score prompts
+    SCORE_CHOICES = {'1': 'very_negative', '2': 'negative', '3': 'neutral', '4': 'positive', '5': 'very_positive'}
     
-    # 2. Comprehensive Aspect Mapping (Chinese/English -> Standard English)
-    ASPECT_MAPPING = {
-        # Room Related
-        'room': 'Room', 'rooms': 'Room', 'bedroom': 'Room', 'suite': 'Room', 
-        'accommodation': 'Room', 'bed': 'Room', 'beds': 'Room', 'sleep': 'Room', 
-        'sleeping': 'Room', 'cleanliness': 'Room', 'clean': 'Room', 'cleaning': 'Room',
-        'noise': 'Room', 'soundproof': 'Room', 'space': 'Room', 'spacious': 'Room',
-        '房间': 'Room', '客房': 'Room', '卧室': 'Room', '床': 'Room', '卫生': 'Room', 
-        '睡眠': 'Room', '隔音': 'Room', '空间': 'Room',
-        
-        # Location Related
-        'location': 'Location', 'position': 'Location', 'place': 'Location', 'area': 'Location', 
-        'loc': 'Location', 'neighborhood': 'Location', 'accessibility': 'Location',
-        'traffic': 'Location', 'transport': 'Location', 'view': 'Location', # View often relates to location
-        '位置': 'Location', '交通': 'Location', '地点': 'Location', '周边': 'Location', 
-        '景色': 'Location', '风景': 'Location',
-        
-        # Price Related
-        'price': 'Price', 'cost': 'Price', 'value': 'Price', 'money': 'Price', 
-        'expensive': 'Price', 'cheap': 'Price', 'rate': 'Price', 'rates': 'Price',
-        'booking': 'Price', 'deposit': 'Price',
-        '价格': 'Price', '性价比': 'Price', '费用': 'Price', '贵': 'Price', '便宜': 'Price',
-        
-        # Service Related
-        'service': 'Service', 'staff': 'Service', 'services': 'Service', 'personnel': 'Service',
-        'reception': 'Service', 'check-in': 'Service', 'checkin': 'Service', 'crew': 'Service',
-        'manager': 'Service', 'attitude': 'Service', 'response': 'Service',
-        '服务': 'Service', '前台': 'Service', '态度': 'Service', '人员': 'Service', '管理': 'Service',
-        
-        # Food Related
-        'food': 'Food', 'breakfast': 'Food', 'meal': 'Food', 'meals': 'Food',
-        'dining': 'Food', 'restaurant': 'Food', 'drink': 'Food', 'drinks': 'Food',
-        'catering': 'Food', 'bar': 'Food', 'lunch': 'Food', 'dinner': 'Food',
-        '餐饮': 'Food', '早餐': 'Food', '吃饭': 'Food', '食物': 'Food', '餐厅': 'Food',
-        
-        # Facilities Related
-        'facility': 'Facilities', 'facilities': 'Facilities', 'amenities': 'Facilities', 
-        'equipment': 'Facilities', 'wifi': 'Facilities', 'internet': 'Facilities', 
-        'pool': 'Facilities', 'gym': 'Facilities', 'parking': 'Facilities', 
-        'elevator': 'Facilities', 'lift': 'Facilities', 'bathroom': 'Facilities',
-        'shower': 'Facilities', 'toilet': 'Facilities', 'lobby': 'Facilities',
-        '设施': 'Facilities', '设备': 'Facilities', '网络': 'Facilities', '泳池': 'Facilities',
-        '电梯': 'Facilities', '浴室': 'Facilities', '停车场': 'Facilities'
+    # 2. Comprehensive Aspect Mapping (Chinese/English -> Standard English), shared with
+    # the keyword extractor; matched through ASPECT_LEXICON
+    ASPECT_MAPPING = ASPECT_KEYWORDS
+    
+    # 3. Prompt Templates
+    # Each prompt is split into a fixed part (system message + instruction head) and a
+    # per-request body. The fixed part comes first so its KV cache can be computed once
+    # per model load and reused; only the body tokens are prefilled for each review.
+    PROMPTS = {
+        'overall': {
+            'system': "You are a sentiment analysis assistant. Analyze the overall sentiment of the review.",
+            'head': "Analyze the sentiment of this hotel review. Choose one: very_positive, positive, neutral, negative, very_negative.\n\nReview: ",
+            'body': "{text}\n\nSentiment:"
+        },
+        'aspect': {
+            'system': "Analyze sentiment for a specific aspect.",
+            'head': "Review: ",
+            'body': "{text}\nAspect: {aspect}\nSentiment (very_positive/positive/neutral/negative/very_negative):"
+        },
+        # Single-token answer prompts for logit scoring: the next-token distribution over
+        # the digits 1-5 is read directly, nothing is decoded.
+        'overall_score': {
+            'system': "You are a sentiment analysis assistant. Analyze the overall sentiment of the review.",
+            'head': "Rate the overall sentiment of this hotel review on a 1-5 scale: 1 = very_negative, 2 = negative, 3 = neutral, 4 = positive, 5 = very_positive. Answer with a single digit.\n\nReview: ",
+            'body': "{text}\n\nRating:"
+        },
+        'aspect_score': {
+            'system': "Analyze sentiment for a specific aspect.",
+            'head': "Rate the sentiment the hotel review expresses about the given aspect on a 1-5 scale: 1 = very_negative, 2 = negative, 3 = neutral, 4 = positive, 5 = very_positive. Answer with a single digit.\n\n",
+            'body': "Aspect: {aspect}\nReview: {text}\n\nRating:"
+        },
+        'aspects': {
+            'system': "You are an expert hotel feedback analyst. Your task is to extract specific aspects from reviews and evaluate their sentiment. IMPORTANT: All your responses must be in English, including all explanations and reasoning.",
+            'head': """Analyze the hotel review given at the end of this message.
+
+Instructions:
+1. **Identification**: Identify specific mentions related to these 6 categories ONLY:
+   - Room (cleanliness, comfort, size, noise, bed)
+   - Location (proximity, view, neighborhood)
+   - Price (value, cost, deposit)
+   - Service (staff, check-in, attitude)
+   - Food (breakfast, restaurant, drinks)
+   - Facilities (wifi, pool, gym, parking, elevator)
+
+2. **Classification**: Map any identified point to one of the 6 categories above. Ignore irrelevant points.
+
+3. **Sentiment**: Rate each identified aspect as: very_positive, positive, neutral, negative, or very_negative.
+
+4. **Reasoning**: Write a brief summary (1-2 sentences) in English explaining the overall impression.
+
+5. **Output**: Return a valid JSON object. Do not include markdown formatting like ```json.
+
+IMPORTANT: All text in your response MUST be in English, including the explanation field.
+
+JSON Structure:
+{
+  "overall": "sentiment_label",
+  "aspects": {
+    "CategoryName": "sentiment_label"
+  },
+  "reasoning": "English summary here",
+  "aspect_details": [
+    {
+      "aspect": "CategoryName",
+      "sentiment": "sentiment_label",
+      "evidence": "Quote from text",
+      "explanation": "Brief explanation in English"
+    }
+  ]
+}
+
+Review Text: \"""",
+            'body': '{text}"\n'
+        },
+        # Labels-only variant for batch analysis: no reasoning/evidence prose, just codes
+        'aspects_labels': {
+            'system': "You are an expert hotel feedback analyst. You answer in a compact code format only.",
+            'head': """Rate the overall sentiment of the hotel review at the end of this message and the sentiment of each category it mentions.
+
+Category codes:
+   R = Room (cleanliness, comfort, size, noise, bed)
+   L = Location (proximity, view, neighborhood)
+   P = Price (value, cost, deposit)
+   S = Service (staff, check-in, attitude)
+   F = Food (breakfast, restaurant, drinks)
+   A = Facilities (wifi, pool, gym, parking, elevator)
+
+Polarity symbols: ++ very_positive, + positive, 0 neutral, - negative, -- very_negative
+
+Output one line: O:<symbol> for the overall sentiment, then CODE:<symbol> for each mentioned category, separated by semicolons. Omit categories that are not mentioned. Nothing else.
+Example: O:+;R:++;S:--
+
+Review Text: \"""",
+            'body': '{text}"\n'
+        },
+        # Packed labels variant: K numbered reviews in one prompt, one JSON array entry per review
+        'aspects_labels_packed': {
+            'system': "You are an expert hotel feedback analyst. You answer in a compact code format only.",
+            'head': """Rate the overall sentiment of each numbered hotel review at the end of this message and the sentiment of each category it mentions.
+
+Category codes:
+   R = Room (cleanliness, comfort, size, noise, bed)
+   L = Location (proximity, view, neighborhood)
+   P = Price (value, cost, deposit)
+   S = Service (staff, check-in, attitude)
+   F = Food (breakfast, restaurant, drinks)
+   A = Facilities (wifi, pool, gym, parking, elevator)
+
+Polarity symbols: ++ very_positive, + positive, 0 neutral, - negative, -- very_negative
+
+For each review write one code string: O:<symbol> for the overall sentiment, then CODE:<symbol> for each mentioned category, separated by semicolons. Omit categories that are not mentioned.
+Output a JSON array with one object per review, in review order, and nothing else.
+Example: [{"id": 1, "labels": "O:+;R:++;S:--"}, {"id": 2, "labels": "O:-"}]
+
+Reviews:
+""",
+            'body': '{reviews}\n'
+        },
+        # Keyword-guided variant: the candidate categories are listed in the body, so the
+        # instruction head stays identical (and cacheable) whatever the candidates are.
+        'aspects_targeted': {
+            'system': "You are an expert hotel feedback analyst. Your task is to extract specific aspects from reviews and evaluate their sentiment. IMPORTANT: All your responses must be in English, including all explanations and reasoning.",
+            'head': """Analyze the hotel review given at the end of this message.
+
+Instructions:
+1. **Identification**: Identify specific mentions related ONLY to the categories listed right before the review.
+
+2. **Classification**: Map any identified point to one of those categories. Ignore everything else.
+
+3. **Sentiment**: Rate each identified aspect as: very_positive, positive, neutral, negative, or very_negative.
+
+4. **Reasoning**: Write a brief summary (1-2 sentences) in English explaining the overall impression.
+
+5. **Output**: Return a valid JSON object. Do not include markdown formatting like ```json.
+
+IMPORTANT: All text in your response MUST be in English, including the explanation field.
+
+JSON Structure:
+{
+  "overall": "sentiment_label",
+  "aspects": {
+    "CategoryName": "sentiment_label"
+  },
+  "reasoning": "English summary here",
+  "aspect_details": [
+    {
+      "aspect": "CategoryName",
+      "sentiment": "sentiment_label",
+      "evidence": "Quote from text",
+      "explanation": "Brief explanation in English"
+    }
+  ]
+}
+
+""",
+            'body': 'Categories:\n{categories}\n\nReview Text: "{text}"\n'
+        }
     }
     
-    def __init__(self):
-        self.model_name = Config.MODEL_NAME
-        self.device = Config.DEVICE
-        self.tokenizer = None
-        self.model = None
-        self._load_model()
+    # Sentence boundaries for long-review chunking (the delimiter stays with its sentence)
+    _SENTENCE_RE = re.compile(r'(?<=[.!?。！？；;\n])')
+    _LABELS_RE = re.compile(r'([ORLPSFA])\s*:\s*(\+\+|--|\+|-|0)')
+    _PACKED_ENTRY_RE = re.compile(r'\{[^{}]*\}')
+    # Tokens of numbering and line break around each review in a packed prompt
+    _PACKED_ROW_OVERHEAD = 4
     
-    def _load_model(self):
-        """Load model with robust error handling and device checking"""
-        cache_dir = Config.MODEL_CACHE_DIR
-        os.makedirs(cache_dir, exist_ok=True)
-        
-        # Check local path
-        model_local_path = Path(cache_dir) / self.model_name.replace('/', '--')
-        if not (model_local_path.exists() and (model_local_path / 'model.safetensors').exists()):
-            raise FileNotFoundError(f"Model not found at local path: {model_local_path}. Please download it first.")
-            
-        model_path = str(model_local_path)
-        print(f"Loading model from: {model_path}")
-        print(f"Target Device: {self.device}")
-        
-        if self.device == 'cuda':
-            print(f"GPU detected: {torch.cuda.get_device_name(0)}")
-            vram = torch.cuda.get_device_properties(0).total_memory / 1024**3
-            print(f"Total VRAM: {vram:.2f} GB")
+    def __init__(self, model_name=None):
+        self.model_name = model_name or Config.MODEL_NAME
+        self.generation_stats = {
+            'generate_calls': 0, 'sequences': 0, 'generated_tokens': 0, 'parsed': 0, 'fallback_parses': 0,
+            # Distilled cascade: reviews seen / answered without the LLM / escalated / audited, and
+            # agreement with the LLM on escalated (cascade_*) and audited (cascade_audit_*) reviews
+            'cascade_reviews': 0, 'cascade_distilled': 0, 'cascade_escalated': 0, 'cascade_audited': 0,
+            'cascade_compared': 0, 'cascade_agree_overall': 0, 'cascade_agree_aspects': 0,
+            'cascade_audit_compared': 0, 'cascade_audit_agree_overall': 0, 'cascade_audit_agree_aspects': 0,
+            # Packed prompts: prompts sent, reviews in them, reviews re-run alone because their entry failed
+            'packed_prompts': 0, 'packed_reviews': 0, 'packed_fallbacks': 0,
+            # Long reviews with chunks beyond LONG_REVIEW_MAX_CHUNKS left unanalyzed
+            'truncated_reviews': 0
+        }
+        # Per length bucket (longest prompt body in the batch, rounded up to a power of two):
+        # batches, rows, real / padded prompt tokens, generated tokens, seconds
+        self.bucket_stats = {}
+        # Prompt kind -> tokens of its body template without the review (see _body_overhead)
+        self._body_overheads = {}
+        # Config.INFERENCE_BACKEND: 'transformers', 'onnx' or 'stub'
+        self.backend = create_backend(
+            Config.INFERENCE_BACKEND, self.model_name, self.generation_stats,
+            vocabularies={'labels': self.SENTIMENT_LABELS, 'aspects': self.ALLOWED_ASPECTS}
+        )
+        # Fixed prompt parts the backend can prefill ahead of the first request
+        self.backend.load([
+            self._build_request(kind, text='', aspect='', categories='', reviews='') for kind in self.PROMPTS
+        ])
+        self.device = self.backend.device
+        self.precision = self.backend.precision
+        # Seconds spent in each load phase (tokenizer, weights, prefix/vocabulary warm-up)
+        self.load_timings = self.backend.load_timings
         
-        try:
-            # 1. Load Tokenizer
-            print("Loading tokenizer...")
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                model_path,
-                trust_remote_code=True,
-                local_files_only=True
+        # Result cache keyed by normalized text + model fingerprint + prompt version
+        self.cache = None
+        if Config.ANALYSIS_CACHE_ENABLED:
+            self.cache = AnalysisCache(
+                Config.ANALYSIS_CACHE_PATH,
+                model_fingerprint=self.model_fingerprint(self.model_name, self.precision),
+                prompt_version=self.prompt_version(),
+                max_memory_entries=Config.ANALYSIS_CACHE_MEMORY_SIZE,
+                max_disk_entries=Config.ANALYSIS_CACHE_DISK_SIZE
             )
-            print("✅ Tokenizer loaded.")
-            
-            # 2. Load Model
-            print("Loading model weights (this may take time)...")
-            load_kwargs = {
-                'trust_remote_code': True,
-                'local_files_only': True,
-            }
-            
-            if self.device == 'cuda':
-                load_kwargs['torch_dtype'] = torch.float16
-                load_kwargs['device_map'] = 'auto'
-                load_kwargs['low_cpu_mem_usage'] = True
-            else:
-                load_kwargs['torch_dtype'] = torch.float32
-            
-            self.model = Qwen2ForCausalLM.from_pretrained(
-                model_path,
-                **load_kwargs
-            )
-            
-            # Ensure model is on correct device
-            if self.device == 'cuda':
-                if not hasattr(self.model, 'device') or str(self.model.device) == 'cpu':
-                    self.model = self.model.to('cuda')
-                print(f"Model loaded on GPU: {next(self.model.parameters()).device}")
-            else:
-                self.model = self.model.to('cpu')
-                print(f"Model loaded on CPU")
-            
-            self.model.eval()
-            
-            # Memory usage report
-            if self.device == 'cuda':
-                allocated = torch.cuda.memory_allocated(0) / 1024**3
-                print(f"✅ Model loaded successfully! VRAM Used: {allocated:.2f} GB")
-            else:
-                print(f"✅ Model loaded successfully!")
-                
-        except Exception as e:
-            error_msg = f"❌ Critical Error loading model: {str(e)}"
-            print(error_msg)
-            print(traceback.format_exc())
-            raise RuntimeError(f"Failed to load model: {str(e)}")
+
+        # First cascade stage, once `python manage.py train-distilled` has written a model
+        self.distilled = None
+        if Config.DISTILLED_CASCADE_ENABLED and Path(Config.DISTILLED_MODEL_PATH).exists():
+            self.distilled = DistilledClassifier.load(Config.DISTILLED_MODEL_PATH)
+            print(f"✅ Distilled classifier loaded ({self.distilled.meta.get('rows')} training rows, "
+                  f"trained {self.distilled.meta.get('trained_at')})")
+
+        # Stamped on every result and stored with the labels; rows carrying other values are
+        # stale and picked up by re-analysis jobs (services/reanalysis.py)
+        self.fingerprints = {
+            'model': self.model_fingerprint(self.model_name, self.precision),
+            'distilled': self.distilled.fingerprint() if self.distilled is not None else None,
+            'prompt': self.prompt_version()
+        }
+    
+    def memory_footprint(self):
+        """Bytes held by the model weights (as reported by the backend)."""
+        return self.backend.memory_footprint()
+
+    @classmethod
+    def prompt_version(cls):
+        """Short fingerprint of the prompt templates; changes whenever a template is edited."""
+        raw = json.dumps(cls.PROMPTS, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:12]
+
+    @staticmethod
+    def model_fingerprint(model_name, precision):
+        """
+        Model, inference backend and weight precision (as the loaded backend chose it) that
+        produce LLM results, e.g. 'Qwen/Qwen2-1.5B-Instruct@transformers/bf16'.
+        """
+        return f"{model_name}@{Config.INFERENCE_BACKEND}/{precision}"
+
+    def get_fingerprints(self):
+        """The fingerprints this analyzer stamps on its results (see services/reanalysis.py)."""
+        return dict(self.fingerprints)
+
+    def _stamp(self, result):
+        """Record on a result which model and prompt templates produced it."""
+        if result is not None:
+            distilled = result.get('source') == 'distilled' and self.distilled is not None
+            result['model_fingerprint'] = self.fingerprints['distilled' if distilled else 'model']
+            result['prompt_fingerprint'] = self.fingerprints['prompt']
+        return result
     
     def analyze(self, text):
         """
         Analyze overall sentiment (Simple version).
         Returns: {'label': 'very_positive/...', 'score': float}
         """
-        if not self.model or not self.tokenizer:
+        if not self.backend.is_loaded():
             raise RuntimeError("Model not initialized.")
         
         try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are a sentiment analysis assistant. Analyze the overall sentiment of the review."
-                },
-                {
-                    "role": "user",
-                    "content": f"Analyze the sentiment of this hotel review. Choose one: very_positive, positive, neutral, negative, very_negative.\n\nReview: {text}\n\nSentiment:"
-                }
-            ]
-            
-            text_prompt = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-            inputs = self.tokenizer(text_prompt, return_tensors="pt").to(self.device)
+            if self._use_logit_scoring():
+                return self.score_sentiment_batch([text])[0]
             
-            with torch.no_grad():
-                outputs = self.model.generate(**inputs, max_new_tokens=15, temperature=0.1, do_sample=False)
-            
-            response = self.tokenizer.decode(outputs[0][inputs.input_ids.shape[1]:], skip_special_tokens=True)
+            response = self._generate([self._build_request('overall', text=text)], max_new_tokens=15)[0]
             response = response.strip().lower()
             
             label, score = self._parse_sentiment_response(response)
@@ -208,88 +353,746 @@ class SentimentAnalyzer:
         # Neutral fallback
         return 'neutral', 0.5
     
-    def analyze_with_aspects(self, text):
+    def _build_request(self, kind, **fields):
+        """Fill a prompt template. Returns a PromptRequest for the backend."""
+        template = self.PROMPTS[kind]
+        return PromptRequest(kind, template['system'], template['head'], template['body'].format(**fields), fields)
+
+    def _generate(self, requests, max_new_tokens, generate_kwargs=None, json_schema=False, aspect_vocabularies=None):
+        """
+        Batched generation through the backend; returns completions in input order.
+        With json_schema=True (and Config.CONSTRAINED_DECODING) output is constrained to the
+        aspect JSON vocabularies; aspect_vocabularies optionally narrows the allowed aspect
+        names per request. max_new_tokens may be one int or one value per request.
+        """
+        row_vocabularies = [{'aspects': v} if v else None for v in (aspect_vocabularies or [None] * len(requests))]
+        return self.backend.generate(requests, max_new_tokens, generate_kwargs, json_schema, row_vocabularies)
+
+    def _score_choices(self, requests):
+        """Label distribution of each request from the next-token probabilities of the answer digits."""
+        distributions = self.backend.score_choices(requests, list(self.SCORE_CHOICES))
+        return [{self.SCORE_CHOICES[digit]: p for digit, p in d.items()} for d in distributions]
+
+    def _distribution_to_result(self, distribution):
+        """Most likely label plus the expected score under the label distribution."""
+        label = max(distribution, key=distribution.get)
+        score = sum(p * self.LABEL_SCORES[l] for l, p in distribution.items())
+        return {
+            'label': label,
+            'score': round(score, 4),
+            'probabilities': {l: round(p, 4) for l, p in distribution.items()}
+        }
+
+    def score_sentiment_batch(self, texts):
+        """Logit-scored overall sentiment for many reviews, one forward pass per batch."""
+        results = []
+        batch_size = Config.ANALYSIS_BATCH_SIZE
+        for start in range(0, len(texts), batch_size):
+            chunk = texts[start:start + batch_size]
+            distributions = self._score_choices([self._build_request('overall_score', text=t) for t in chunk])
+            results.extend(self._distribution_to_result(d) for d in distributions)
+        return results
+
+    def _use_logit_scoring(self):
+        return Config.SENTIMENT_SCORING_MODE == 'logits' and self.backend.supports_choices(list(self.SCORE_CHOICES))
+
+    def get_cache_stats(self):
+        """Result cache counters, or None when the cache is disabled."""
+        return self.cache.stats() if self.cache else None
+
+    def get_generation_stats(self):
+        """Generated-token and fallback-parse metrics since model load."""
+        stats = self.summarize_generation_stats(self.generation_stats, self.bucket_stats, self.distilled is not None)
+        stats['constrained_decoding'] = self.backend.constrained_decoding
+        stats['backend'] = self.backend.name
+        return stats
+
+    @staticmethod
+    def summarize_generation_stats(counters, bucket_stats, cascade=False):
+        """
+        Report for generation_stats-style `counters` and `bucket_stats` (one analyzer's, or
+        summed over shard workers): the counters plus rates, per-bucket padding and throughput.
+        """
+        stats = dict(counters)
+        sequences = stats['sequences']
+        parses = stats['parsed']
+        stats['avg_generated_tokens'] = round(stats['generated_tokens'] / sequences, 2) if sequences else 0.0
+        stats['fallback_parse_rate'] = round(stats['fallback_parses'] / parses, 4) if parses else 0.0
+        stats['length_buckets'] = [
+            {
+                'bucket': f'<={bound}',
+                'batches': b['batches'],
+                'rows': b['rows'],
+                'padding_ratio': round(1 - b['tokens'] / b['padded_tokens'], 4) if b['padded_tokens'] else 0.0,
+                'prompt_tokens_per_second': round(b['tokens'] / b['seconds'], 1) if b['seconds'] else None,
+                'generated_tokens_per_second': round(b['generated_tokens'] / b['seconds'], 1) if b['seconds'] else None
+            }
+            for bound, b in sorted(bucket_stats.items())
+        ]
+        tokens = sum(b['tokens'] for b in bucket_stats.values())
+        padded = sum(b['padded_tokens'] for b in bucket_stats.values())
+        stats['padding_ratio'] = round(1 - tokens / padded, 4) if padded else 0.0
+        if cascade:
+            def rate(count, total):
+                return round(count / total, 4) if total else None
+            reviews = stats['cascade_reviews']
+            stats['cascade_escalation_rate'] = rate(reviews - stats['cascade_distilled'], reviews)
+            stats['cascade_escalated_overall_agreement'] = rate(stats['cascade_agree_overall'], stats['cascade_compared'])
+            stats['cascade_audit_overall_agreement'] = rate(stats['cascade_audit_agree_overall'], stats['cascade_audit_compared'])
+            stats['cascade_audit_aspect_agreement'] = rate(stats['cascade_audit_agree_aspects'], stats['cascade_audit_compared'])
+        return stats
+
+    def analyze_with_aspects(self, text, detail='full'):
         """
         Complex Analysis: Extracts 6 specific aspects, sentiment, evidence, and reasoning.
         Output is strictly in English.
+        detail='labels' returns labels only (no reasoning/evidence) from a compact output format.
         """
-        if not self.model or not self.tokenizer:
+        if not self.backend.is_loaded():
             raise RuntimeError("Model not loaded.")
         
         try:
-            # Improved Prompt for strict JSON output and English content
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are an expert hotel feedback analyst. Your task is to extract specific aspects from reviews and evaluate their sentiment. IMPORTANT: All your responses must be in English, including all explanations and reasoning."
-                },
-                {
-                    "role": "user",
-                    "content": f"""Analyze the following hotel review.
-
-Review Text: "{text}"
+            if self.cache:
+                cached = self.cache.get(text, self._aspects_variant(detail))
+                if cached is not None:
+                    return self._stamp(cached)
+            
+            # Same generate + parse + scoring path as the batch API, with a batch of one
+            result = self._analyze_aspects_uncached([text], 1, detail)[0]
+            if result is None:
+                raise RuntimeError("Model output could not be generated or parsed")
+            self._stamp(result)
+            self._cache_put(text, result, self._aspects_variant(detail))
+            return result
+            
+        except Exception as e:
+            print(f"Aspect Analysis Failed: {str(e)}")
+            raise RuntimeError(f"Failed to analyze aspects: {str(e)}")
 
-Instructions:
-1. **Identification**: Identify specific mentions related to these 6 categories ONLY:
-   - Room (cleanliness, comfort, size, noise, bed)
-   - Location (proximity, view, neighborhood)
-   - Price (value, cost, deposit)
-   - Service (staff, check-in, attitude)
-   - Food (breakfast, restaurant, drinks)
-   - Facilities (wifi, pool, gym, parking, elevator)
+    def analyze_with_aspects_stream(self, text):
+        """
+        Streaming analyze_with_aspects for one review. Yields event dicts:
+        {'type': 'token', 'text': ...} for each generated piece,
+        {'type': 'aspect', 'aspect': {...}} each time an aspect_details entry is complete,
+        {'type': 'result', 'result': {...}} once, with the same result analyze_with_aspects returns.
+        Cache hits, long (chunked) reviews and reviews without aspect candidates only get the result event.
+        """
+        if not self.backend.is_loaded():
+            raise RuntimeError("Model not loaded.")
 
-2. **Classification**: Map any identified point to one of the 6 categories above. Ignore irrelevant points.
+        variant = self._aspects_variant()
+        if self.cache:
+            cached = self.cache.get(text, variant)
+            if cached is not None:
+                yield {'type': 'result', 'result': self._stamp(cached), 'cached': True}
+                return
 
-3. **Sentiment**: Rate each identified aspect as: very_positive, positive, neutral, negative, or very_negative.
+        prediction = None
+        if self._cascade_applies(detail='full'):
+            distilled, predictions = self._distilled_first([text])
+            if distilled[0] is not None:
+                yield {'type': 'result', 'result': self._stamp(distilled[0])}
+                return
+            prediction = predictions[0]
 
-4. **Reasoning**: Write a brief summary (1-2 sentences) in English explaining the overall impression.
+        plan = self._plan_aspects_request(text)
+        if plan is None or len(self._split_long_review(text)[0]) > 1:
+            result = self._analyze_aspects_llm([text], 1)[0]
+            if result is None:
+                raise RuntimeError("Failed to analyze aspects: Model output could not be generated or parsed")
+            self._apply_logit_scores([text], [result])
+            self._record_agreement(prediction, result)
+            self._stamp(result)
+            self._cache_put(text, result, variant)
+            yield {'type': 'result', 'result': result}
+            return
 
-5. **Output**: Return a valid JSON object. Do not include markdown formatting like ```json.
+        state = JsonScanState()
+        response = ''
+        emitted = 0
+        for piece in self.backend.stream(
+            plan['request'], plan['max_new_tokens'], json_schema=True,
+            row_vocabularies=[{'aspects': plan['aspects']} if plan['aspects'] else None]
+        ):
+            response += piece
+            yield {'type': 'token', 'text': piece}
+            state.feed(piece)
+            for parent_key, start, end in state.closed_spans[emitted:]:
+                if parent_key != 'aspect_details':
+                    continue
+                try:
+                    details = self._extract_and_normalize_data({'aspect_details': [json.loads(response[start:end])]})['aspect_details']
+                except json.JSONDecodeError:
+                    continue
+                for detail in details:
+                    yield {'type': 'aspect', 'aspect': detail}
+            emitted = len(state.closed_spans)
 
-IMPORTANT: All text in your response MUST be in English, including the explanation field.
+        result = self._parse_aspects_response(response)
+        self._apply_logit_scores([text], [result])
+        self._record_agreement(prediction, result)
+        self._stamp(result)
+        self._cache_put(text, result, variant)
+        yield {'type': 'result', 'result': result}
 
-JSON Structure:
-{{
-  "overall": "sentiment_label",
-  "aspects": {{
-    "CategoryName": "sentiment_label"
-  }},
-  "reasoning": "English summary here",
-  "aspect_details": [
-    {{
-      "aspect": "CategoryName",
-      "sentiment": "sentiment_label",
-      "evidence": "Quote from text",
-      "explanation": "Brief explanation in English"
-    }}
-  ]
-}}
-"""
+    def analyze_with_aspects_batch(self, texts, batch_size=None, detail='full', rescore=None,
+                                   aspects=None, token_lengths=None):
+        """
+        Batched version of analyze_with_aspects.
+        Generates `batch_size` prompts per forward pass and returns one result per
+        input text, in input order. A row whose generation or parsing fails gets
+        None instead of failing the whole batch.
+        rescore: logit-score overall scores as analyze_with_aspects does (an extra forward
+        pass per row); defaults to Config.BATCH_LOGIT_SCORING.
+        aspects / token_lengths: optional per-row keyword candidates and estimated token
+        lengths (utils.preprocess columns), aligned with `texts`; rows without them (None)
+        go through the lexicon and the tokenizer here.
+        """
+        if rescore is None:
+            rescore = Config.BATCH_LOGIT_SCORING
+        if not self.backend.is_loaded():
+            raise RuntimeError("Model not loaded.")
+
+        batch_size = batch_size or Config.ANALYSIS_BATCH_SIZE
+        results = [None] * len(texts)
+
+        # Serve cache hits and collapse duplicate texts so each distinct review is generated once
+        variant = self._aspects_variant(detail)
+        pending = {}
+        for idx, text in enumerate(texts):
+            if self.cache:
+                cached = self.cache.get(text, variant)
+                if cached is not None:
+                    results[idx] = self._stamp(cached)
+                    continue
+                key = self.cache.make_key(text, variant)
+            else:
+                key = text
+            pending.setdefault(key, []).append(idx)
+
+        unique_texts = [texts[indices[0]] for indices in pending.values()]
+        firsts = [indices[0] for indices in pending.values()]
+        unique_results = self._analyze_aspects_uncached(
+            unique_texts, batch_size, detail, rescore,
+            aspects=_pick(aspects, firsts), token_lengths=_pick(token_lengths, firsts)
+        )
+
+        for indices, text, result in zip(pending.values(), unique_texts, unique_results):
+            if result is None:
+                continue
+            self._stamp(result)
+            self._cache_put(text, result, variant)
+            for n, idx in enumerate(indices):
+                results[idx] = result if n == 0 else copy.deepcopy(result)
+
+        return results
+
+    def _candidate_aspects(self, text):
+        """Aspects the review probably mentions, from the keyword tables (canonical order)."""
+        return ASPECT_LEXICON.find(text)
+
+    def _aspects_variant(self, detail='full'):
+        """Cache variant for the aspect analysis mode in use."""
+        if detail == 'labels':
+            return 'aspects_labels'
+        return 'aspects_targeted' if Config.TARGETED_PROMPTS else 'aspects'
+
+    def _plan_aspects_request(self, text, detail='full', candidates=None):
+        """
+        Prompt, token budget and allowed aspect names for one review.
+        Targeted mode lists only the keyword candidates and scales the budget with their
+        number. Returns None when nothing matched and the full-prompt fallback is off.
+        `candidates` may be passed in when they were already found for a whole batch.
+        """
+        if detail == 'labels':
+            return {
+                'request': self._build_request('aspects_labels', text=text),
+                'max_new_tokens': Config.LABELS_MAX_NEW_TOKENS,
+                'aspects': None
+            }
+        if Config.TARGETED_PROMPTS:
+            if candidates is None:
+                candidates = self._candidate_aspects(text)
+            if candidates:
+                categories = '\n'.join(f"- {a} ({self.ASPECT_DESCRIPTIONS[a]})" for a in candidates)
+                return {
+                    'request': self._build_request('aspects_targeted', text=text, categories=categories),
+                    'max_new_tokens': Config.TARGETED_BASE_TOKENS + Config.TARGETED_TOKENS_PER_ASPECT * len(candidates),
+                    'aspects': candidates
                 }
-            ]
-            
-            text_prompt = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-            inputs = self.tokenizer(text_prompt, return_tensors="pt").to(self.device)
-            
-            # Generate with slightly higher max tokens for detailed JSON
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=600,
-                    temperature=0.1, # Low temp for deterministic output
-                    do_sample=False
+            if not Config.TARGETED_FALLBACK_FULL:
+                return None
+
+        return {'request': self._build_request('aspects', text=text), 'max_new_tokens': 600, 'aspects': None}
+
+    def _overall_only_result(self, text):
+        """Result for a review with no aspect candidates: overall sentiment only, nothing generated."""
+        return {
+            'sentiment': self.analyze(text),
+            'aspect_sentiments': {},
+            'reasoning': 'No hotel aspects mentioned.',
+            'aspect_details': []
+        }
+
+    def _cache_put(self, text, result, variant):
+        # Distilled answers are not cached: they are cheap, and a retrained model must not be shadowed
+        if self.cache and result.get('source') != 'distilled':
+            self.cache.put(text, result, variant)
+
+    def _cascade_applies(self, detail):
+        return self.distilled is not None and (detail == 'labels' or Config.DISTILLED_CASCADE_FULL_DETAIL)
+
+    def _distilled_first(self, texts):
+        """
+        First cascade stage: (results, predictions). results[i] is the distilled answer, or None
+        when the review goes to the LLM (low confidence, or sampled for the agreement audit).
+        """
+        stats = self.generation_stats
+        predictions = self.distilled.predict_many(texts)
+        results = []
+        for text, prediction in zip(texts, predictions):
+            stats['cascade_reviews'] += 1
+            if not prediction['features'] or prediction['confidence'] < Config.DISTILLED_CONFIDENCE_THRESHOLD:
+                stats['cascade_escalated'] += 1
+                results.append(None)
+            elif zlib.crc32(text.encode('utf-8')) % 10000 < Config.DISTILLED_AUDIT_RATE * 10000:
+                prediction['audit'] = True
+                stats['cascade_audited'] += 1
+                results.append(None)
+            else:
+                stats['cascade_distilled'] += 1
+                results.append({
+                    'sentiment': self._distribution_to_result(prediction['overall']),
+                    'aspect_sentiments': dict(prediction['aspects']),
+                    'reasoning': '',
+                    'aspect_details': [],
+                    'source': 'distilled',
+                    'confidence': round(prediction['confidence'], 4)
+                })
+        return results, predictions
+
+    def _record_agreement(self, prediction, result):
+        """Compare the distilled prediction with the LLM answer for an escalated or audited review."""
+        if prediction is None or result is None:
+            return
+        stats = self.generation_stats
+        prefix = 'cascade_audit_' if prediction.get('audit') else 'cascade_'
+        overall = max(prediction['overall'], key=prediction['overall'].get)
+        stats[prefix + 'compared'] += 1
+        stats[prefix + 'agree_overall'] += overall == result['sentiment']['label']
+        stats[prefix + 'agree_aspects'] += prediction['aspects'] == result.get('aspect_sentiments', {})
+
+    def _analyze_aspects_uncached(self, texts, batch_size, detail='full', rescore=True,
+                                  aspects=None, token_lengths=None):
+        """
+        Analyze reviews that missed the cache; failed reviews are None. With a distilled model
+        loaded, reviews it is confident about are answered by it and only the rest reach the LLM.
+        rescore: logit-score the overall score of LLM results (_apply_logit_scores).
+        """
+        if not self._cascade_applies(detail):
+            results = self._analyze_aspects_llm(texts, batch_size, detail, aspects=aspects, token_lengths=token_lengths)
+            if rescore:
+                self._apply_logit_scores(texts, results)
+            return results
+
+        results, predictions = self._distilled_first(texts)
+        escalated = [i for i, result in enumerate(results) if result is None]
+        if escalated:
+            llm_results = self._analyze_aspects_llm(
+                [texts[i] for i in escalated], batch_size, detail,
+                aspects=_pick(aspects, escalated), token_lengths=_pick(token_lengths, escalated)
+            )
+            if rescore:
+                self._apply_logit_scores([texts[i] for i in escalated], llm_results)
+            for i, result in zip(escalated, llm_results):
+                self._record_agreement(predictions[i], result)
+                results[i] = result
+        return results
+
+    def _analyze_aspects_llm(self, texts, batch_size, detail='full', pack=True, aspects=None, token_lengths=None):
+        """
+        Analyze reviews with the LLM, splitting long ones into sentence-aligned chunks.
+        All chunks of all reviews are generated together; each review's chunk results are
+        merged with Config.CHUNK_MERGE_RULE. Failed reviews are None; a review whose chunks
+        beyond Config.LONG_REVIEW_MAX_CHUNKS were not analyzed has result['truncated_chunks'].
+        In labels mode with Config.PACKED_PROMPTS, short reviews are first sent several per
+        prompt; reviews that were not packed or whose entry failed go through the normal path.
+        aspects / token_lengths: per-review hints as in analyze_with_aspects_batch; chunks of
+        a split review get none.
+        """
+        if pack and detail == 'labels' and Config.PACKED_PROMPTS:
+            results = self._analyze_packed(texts, batch_size, token_lengths)
+            single = [i for i, result in enumerate(results) if result is None]
+            if single:
+                retried = self._analyze_aspects_llm(
+                    [texts[i] for i in single], batch_size, detail, pack=False,
+                    aspects=_pick(aspects, single), token_lengths=_pick(token_lengths, single)
                 )
-            
-            response = self.tokenizer.decode(outputs[0][inputs.input_ids.shape[1]:], skip_special_tokens=True)
-            
-            # Parse the result
-            result = self._parse_aspects_response(response)
-            return result
-            
+                for i, result in zip(single, retried):
+                    results[i] = result
+            return results
+
+        owners, chunks, truncated = [], [], {}
+        for idx, text in enumerate(texts):
+            review_chunks, dropped = self._split_long_review(text, token_lengths[idx] if token_lengths else None)
+            if dropped:
+                truncated[idx] = dropped
+            for chunk in review_chunks:
+                owners.append(idx)
+                chunks.append(chunk)
+
+        if len(chunks) == len(texts) and not truncated:
+            return self._analyze_texts(texts, batch_size, detail, aspects, token_lengths)
+
+        per_review = [[] for _ in texts]
+        for idx, chunk, result in zip(owners, chunks, self._analyze_texts(chunks, batch_size, detail)):
+            if result is not None:
+                per_review[idx].append((result, self._token_count(chunk)))
+        results = [self._merge_chunk_results(parts) if parts else None for parts in per_review]
+        for idx, dropped in truncated.items():
+            if results[idx] is not None:
+                results[idx]['truncated_chunks'] = dropped
+        return results
+
+    def _plan_packs(self, token_counts):
+        """
+        Group short reviews (indices) into packs: greedily, in input order, as many as fit
+        PACKED_PROMPT_TOKEN_BUDGET and PACKED_MAX_REVIEWS, so K shrinks as reviews get longer.
+        Reviews over PACKED_MAX_REVIEW_TOKENS and packs of one are left out.
+        """
+        packs, current, used = [], [], 0
+        for idx, count in enumerate(token_counts):
+            if count > Config.PACKED_MAX_REVIEW_TOKENS:
+                continue
+            cost = count + self._PACKED_ROW_OVERHEAD
+            if current and (used + cost > Config.PACKED_PROMPT_TOKEN_BUDGET or len(current) >= Config.PACKED_MAX_REVIEWS):
+                packs.append(current)
+                current, used = [], 0
+            current.append(idx)
+            used += cost
+        if current:
+            packs.append(current)
+        return [pack for pack in packs if len(pack) > 1]
+
+    def _analyze_packed(self, texts, batch_size, token_lengths=None):
+        """Labels for packed reviews; None for reviews not packed or whose entry failed."""
+        results = [None] * len(texts)
+        packs = self._plan_packs(self._token_lengths(texts, token_lengths))
+        for start in range(0, len(packs), batch_size):
+            group = packs[start:start + batch_size]
+            requests = []
+            for pack in group:
+                # One line per review: newlines inside a review would break the numbering
+                reviews = '\n'.join(f"[{n}] {' '.join(texts[i].split())}" for n, i in enumerate(pack, 1))
+                requests.append(self._build_request('aspects_labels_packed', reviews=reviews, texts=[texts[i] for i in pack]))
+            try:
+                responses = self._generate(
+                    requests, max_new_tokens=[8 + Config.PACKED_TOKENS_PER_REVIEW * len(pack) for pack in group]
+                )
+            except Exception as e:
+                print(f"Packed generation failed ({str(e)}), analyzing {sum(map(len, group))} reviews individually")
+                continue
+            for pack, response in zip(group, responses):
+                for i, result in zip(pack, self._parse_packed_response(response, len(pack))):
+                    results[i] = result
+                self.generation_stats['packed_prompts'] += 1
+                self.generation_stats['packed_reviews'] += len(pack)
+                self.generation_stats['packed_fallbacks'] += sum(1 for i in pack if results[i] is None)
+
+        return results
+
+    def _parse_packed_response(self, response, count):
+        """
+        Map a packed JSON array back to its `count` reviews by "id" (1-based); entries that are
+        missing, duplicated after the first, or unparsable leave their review None. Objects are
+        read one by one, so a truncated or slightly malformed array still yields its complete entries.
+        """
+        results = [None] * count
+        for match in self._PACKED_ENTRY_RE.finditer(response):
+            try:
+                entry = json.loads(match.group())
+                n = int(entry.get('id'))
+                if 1 <= n <= count and results[n - 1] is None:
+                    results[n - 1] = self._parse_labels_response(str(entry.get('labels', '')))
+            except (ValueError, TypeError, AttributeError):
+                continue
+        return results
+
+    def _token_count(self, text):
+        return self.backend.token_counts([text])[0]
+
+    def _token_lengths(self, texts, estimates=None):
+        """Token count of each text: the estimate where one is given, the tokenizer (one call) for the rest."""
+        lengths = list(estimates) if estimates is not None else [None] * len(texts)
+        missing = [i for i, length in enumerate(lengths) if length is None]
+        if missing:
+            for i, count in zip(missing, self.backend.token_counts([texts[i] for i in missing])):
+                lengths[i] = count
+        return lengths
+
+    def _body_overhead(self, kind):
+        """Tokens a prompt body of `kind` adds around the review text (measured once per kind)."""
+        if kind not in self._body_overheads:
+            empty = self._build_request(kind, text='', categories='', reviews='')
+            self._body_overheads[kind] = self._token_count(empty.body)
+        return self._body_overheads[kind]
+
+    def _split_long_review(self, text, token_length=None):
+        """
+        (chunks, dropped): sentence-aligned chunks of at most Config.LONG_REVIEW_TOKEN_BUDGET
+        tokens. Over-long sentences are cut at the token budget, and at most
+        Config.LONG_REVIEW_MAX_CHUNKS chunks are kept so cost stays bounded; `dropped`
+        counts the chunks left out. `token_length` (an estimate) saves tokenizing short reviews.
+        """
+        budget = Config.LONG_REVIEW_TOKEN_BUDGET
+        if not budget:
+            return [text], 0
+        if (token_length if token_length is not None else self._token_count(text)) <= budget:
+            return [text], 0
+
+        sentences = [s for s in self._SENTENCE_RE.split(text) if s.strip()]
+        lengths = self.backend.token_counts(sentences)
+
+        chunks, current, current_len = [], [], 0
+        for sentence, length in zip(sentences, lengths):
+            if length > budget:
+                # A single run-on "sentence": flush, then cut it into budget-sized token windows
+                if current:
+                    chunks.append(''.join(current))
+                    current, current_len = [], 0
+                chunks.extend(self.backend.token_windows(sentence, budget))
+                continue
+            if current and current_len + length > budget:
+                chunks.append(''.join(current))
+                current, current_len = [], 0
+            current.append(sentence)
+            current_len += length
+        if current:
+            chunks.append(''.join(current))
+
+        dropped = max(0, len(chunks) - Config.LONG_REVIEW_MAX_CHUNKS)
+        if dropped:
+            print(f"⚠️ Review split into {len(chunks)} chunks, analyzing the first {Config.LONG_REVIEW_MAX_CHUNKS}")
+            self.generation_stats['truncated_reviews'] += 1
+        return chunks[:Config.LONG_REVIEW_MAX_CHUNKS], dropped
+
+    def _nearest_label(self, score):
+        return min(self.LABEL_SCORES, key=lambda label: abs(self.LABEL_SCORES[label] - score))
+
+    def _merge_chunk_results(self, parts):
+        """
+        Combine (result, token_count) pairs of one review's chunks.
+        'worst': the most negative label wins, per aspect and overall.
+        'weighted': label scores are averaged, weighted by chunk length (overall) or by
+        chunk length x evidence count (aspects), then mapped to the nearest label.
+        """
+        if len(parts) == 1:
+            return parts[0][0]
+        worst = Config.CHUNK_MERGE_RULE == 'worst'
+
+        def merge(votes):
+            # votes: [(label, weight)]
+            if worst:
+                return min((label for label, _ in votes), key=self.LABEL_SCORES.get)
+            total = sum(weight for _, weight in votes)
+            return self._nearest_label(sum(self.LABEL_SCORES[label] * weight for label, weight in votes) / total)
+
+        overall_votes = [(result['sentiment']['label'], tokens) for result, tokens in parts]
+        overall_scores = [(result['sentiment']['score'], tokens) for result, tokens in parts]
+        total_tokens = sum(tokens for _, tokens in parts)
+        if worst:
+            score = min(score for score, _ in overall_scores)
+        else:
+            score = sum(score * tokens for score, tokens in overall_scores) / total_tokens
+
+        aspect_votes = {}
+        for result, tokens in parts:
+            for aspect, label in result.get('aspect_sentiments', {}).items():
+                evidence = sum(1 for d in result.get('aspect_details', []) if d.get('aspect') == aspect) or 1
+                aspect_votes.setdefault(aspect, []).append((label, tokens * evidence))
+
+        merged = {
+            'sentiment': {'label': merge(overall_votes), 'score': round(score, 4)},
+            'aspect_sentiments': {aspect: merge(votes) for aspect, votes in aspect_votes.items()},
+            'reasoning': ' '.join(r['reasoning'] for r, _ in parts if r.get('reasoning')),
+            'aspect_details': [d for r, _ in parts for d in r.get('aspect_details', [])],
+            'chunks': len(parts)
+        }
+        if all('probabilities' in r['sentiment'] for r, _ in parts) and not worst:
+            merged['sentiment']['probabilities'] = {
+                label: round(sum(r['sentiment']['probabilities'][label] * t for r, t in parts) / total_tokens, 4)
+                for label in parts[0][0]['sentiment']['probabilities']
+            }
+        return merged
+
+    def _schedule_batches(self, indices, lengths, batch_size):
+        """
+        Split row indices into generate calls. With Config.LENGTH_BUCKETING rows are sorted by
+        prompt-body length, never share a batch across a length bucket (powers of two), and each
+        batch grows while rows x its longest body stays within ANALYSIS_TOKEN_BUDGET (at most
+        ANALYSIS_MAX_BATCH_ROWS rows), so short reviews are not padded to a long one's length;
+        otherwise fixed batches of `batch_size` in input order.
+        """
+        if not Config.LENGTH_BUCKETING:
+            return [indices[i:i + batch_size] for i in range(0, len(indices), batch_size)]
+        batches, current = [], []
+        for idx in sorted(indices, key=lengths.get):
+            # Ascending order: the new row is the longest, so it sets the padded length
+            if current and (self._length_bucket(lengths[idx]) != self._length_bucket(lengths[current[0]])
+                            or (len(current) + 1) * lengths[idx] > Config.ANALYSIS_TOKEN_BUDGET
+                            or len(current) >= Config.ANALYSIS_MAX_BATCH_ROWS):
+                batches.append(current)
+                current = []
+            current.append(idx)
+        if current:
+            batches.append(current)
+        return batches
+
+    @staticmethod
+    def _length_bucket(length):
+        """Upper bound of a length's bucket: the next power of two, at least 32."""
+        return 1 << max(5, (length - 1).bit_length())
+
+    def _record_bucket(self, lengths, generated_tokens, seconds):
+        longest = max(lengths)
+        bucket = self.bucket_stats.setdefault(self._length_bucket(longest), {
+            'batches': 0, 'rows': 0, 'tokens': 0, 'padded_tokens': 0, 'generated_tokens': 0, 'seconds': 0.0
+        })
+        bucket['batches'] += 1
+        bucket['rows'] += len(lengths)
+        bucket['tokens'] += sum(lengths)
+        bucket['padded_tokens'] += longest * len(lengths)
+        bucket['generated_tokens'] += generated_tokens
+        bucket['seconds'] += seconds
+
+    def _analyze_texts(self, texts, batch_size, detail='full', aspects=None, token_lengths=None):
+        """
+        Generate and parse aspect analyses; failed rows are None. Rows are batched by
+        _schedule_batches, results come back in input order. aspects / token_lengths are
+        optional per-row hints (see analyze_with_aspects_batch).
+        """
+        results = [None] * len(texts)
+        json_schema = detail != 'labels'
+        parse = self._parse_labels_response if detail == 'labels' else self._parse_aspects_response
+
+        candidates = [None] * len(texts)
+        if Config.TARGETED_PROMPTS:
+            candidates = [list(found) if found is not None else None for found in (aspects or candidates)]
+            missing = [idx for idx, found in enumerate(candidates) if found is None]
+            for idx, found in zip(missing, ASPECT_LEXICON.find_many([texts[idx] for idx in missing])):
+                candidates[idx] = found
+        plans = [self._plan_aspects_request(t, detail, c) for t, c in zip(texts, candidates)]
+
+        # Reviews without candidates (fallback disabled) skip generation entirely
+        for idx, plan in enumerate(plans):
+            if plan is None:
+                try:
+                    results[idx] = self._overall_only_result(texts[idx])
+                except Exception as e:
+                    print(f"Overall-only analysis failed for row {idx}: {str(e)}")
+
+        planned = [idx for idx, plan in enumerate(plans) if plan is not None]
+        if not planned:
+            return results
+        # Prompt-body lengths; with an estimated review length the body is estimated as well
+        # (review + the template's fixed text), so only rows without one are tokenized
+        estimates = [
+            token_lengths[idx] + self._body_overhead(plans[idx]['request'].kind)
+            if token_lengths and token_lengths[idx] is not None else None
+            for idx in planned
+        ]
+        lengths = dict(zip(planned, self._token_lengths([plans[idx]['request'].body for idx in planned], estimates)))
+
+        for batch in self._schedule_batches(planned, lengths, batch_size):
+            start = time.perf_counter()
+            generated_before = self.generation_stats['generated_tokens']
+            responses = {}
+            try:
+                batch_responses = self._generate(
+                    [plans[idx]['request'] for idx in batch],
+                    max_new_tokens=[plans[idx]['max_new_tokens'] for idx in batch],
+                    json_schema=json_schema,
+                    aspect_vocabularies=[plans[idx]['aspects'] for idx in batch]
+                )
+                responses = dict(zip(batch, batch_responses))
+            except Exception as e:
+                # A failed batch (e.g. out of memory) is retried row by row
+                print(f"Batch generation failed ({str(e)}), retrying {len(batch)} rows individually")
+                for idx in batch:
+                    try:
+                        responses[idx] = self._generate(
+                            [plans[idx]['request']], max_new_tokens=plans[idx]['max_new_tokens'],
+                            json_schema=json_schema, aspect_vocabularies=[plans[idx]['aspects']]
+                        )[0]
+                    except Exception as row_error:
+                        print(f"Aspect Analysis Failed: {str(row_error)}")
+            self._record_bucket(
+                [lengths[idx] for idx in batch],
+                self.generation_stats['generated_tokens'] - generated_before,
+                time.perf_counter() - start
+            )
+
+            for idx, response in responses.items():
+                try:
+                    results[idx] = parse(response)
+                except Exception as e:
+                    print(f"Aspect parsing failed for row {idx}: {str(e)}")
+
+        return results
+
+    def _label_band(self, label):
+        """(low, high) scores that _nearest_label maps back to `label`."""
+        scores = sorted(self.LABEL_SCORES.values())
+        value = self.LABEL_SCORES[label]
+        i = scores.index(value)
+        low = (scores[i - 1] + value) / 2 if i else 0.0
+        high = (value + scores[i + 1]) / 2 if i + 1 < len(scores) else 1.0
+        return low, high
+
+    def _apply_logit_scores(self, texts, results):
+        """
+        Replace the label-bucket overall score of each (non-None) result with the logit-scored
+        expectation, clamped into the band of the result's own label: the label still comes from
+        the analysis, and a stored row never pairs e.g. 'positive' with 0.3. Costs one extra
+        forward pass per review.
+        """
+        rows = [(text, result) for text, result in zip(texts, results) if result is not None]
+        if not self._use_logit_scoring() or not rows:
+            return
+        try:
+            for (_, result), sentiment in zip(rows, self.score_sentiment_batch([text for text, _ in rows])):
+                score = sentiment['score']
+                label = result['sentiment'].get('label')
+                if label in self.LABEL_SCORES:
+                    low, high = self._label_band(label)
+                    score = min(max(score, low + 0.001), high - 0.001)
+                result['sentiment']['score'] = round(score, 4)
+                result['sentiment']['probabilities'] = sentiment['probabilities']
         except Exception as e:
-            print(f"Aspect Analysis Failed: {str(e)}")
-            raise RuntimeError(f"Failed to analyze aspects: {str(e)}")
+            print(f"Logit scoring failed, keeping label scores: {str(e)}")
     
+    def _parse_labels_response(self, response):
+        """Parse the compact "O:+;R:++;S:--" format into the standard result shape."""
+        self.generation_stats['parsed'] += 1
+        overall = None
+        aspect_sentiments = {}
+        for code, symbol in self._LABELS_RE.findall(response):
+            label = self.POLARITY_SYMBOLS[symbol]
+            if code == 'O':
+                overall = overall or label
+            else:
+                aspect_sentiments.setdefault(self.LABEL_CODES[code], label)
+
+        if overall is None:
+            raise ValueError(f"No overall label in compact response: {response[:80]!r}")
+
+        return {
+            'sentiment': {'label': overall, 'score': self.LABEL_SCORES[overall]},
+            'aspect_sentiments': aspect_sentiments,
+            'reasoning': '',
+            'aspect_details': []
+        }
+
     def _parse_aspects_response(self, response):
         """
         Robustly parses the LLM response, handling JSON errors and enforcing English keys.
@@ -311,9 +1114,12 @@ JSON Structure:
             except:
                 pass
         
+        self.generation_stats['parsed'] += 1
+        
         # If JSON parsing completely fails, use fallback regex extraction
         if not data:
             print(f"⚠️ JSON parsing failed. Raw response: {response[:100]}...")
+            self.generation_stats['fallback_parses'] += 1
             return self._fallback_regex_extraction(response)
             
         return self._extract_and_normalize_data(data)
@@ -396,45 +1202,28 @@ JSON Structure:
     def _map_to_standard_aspect(self, input_str):
         """
         Maps an input string (Chinese or English) to one of the 6 Allowed Aspects.
-        Returns None if no match found.
+        Exact names/keywords first, then the longest keyword contained in the string
+        (e.g. "hotel location" -> Location). Returns None if no match found.
         """
-        key = input_str.strip().lower()
-        
-        # 1. Direct Exact Match
-        for allowed in self.ALLOWED_ASPECTS:
-            if key == allowed.lower():
-                return allowed
-                
-        # 2. Dictionary Lookup
-        if key in self.ASPECT_MAPPING:
-            return self.ASPECT_MAPPING[key]
-            
-        # 3. Fuzzy Match (Substring)
-        # e.g. "hotel location" -> contains "location" -> Location
-        for map_k, map_v in self.ASPECT_MAPPING.items():
-            if map_k in key:
-                return map_v
-                
-        return None
+        return ASPECT_LEXICON.map(input_str)
 
     def analyze_aspect(self, text, aspect):
         """
         Single aspect analysis (Legacy support).
         """
-        if not self.model: raise RuntimeError("Model not loaded")
+        if not self.backend.is_loaded(): raise RuntimeError("Model not loaded")
         
         try:
-            messages = [
-                {"role": "system", "content": "Analyze sentiment for a specific aspect."},
-                {"role": "user", "content": f"Review: {text}\nAspect: {aspect}\nSentiment (very_positive/positive/neutral/negative/very_negative):"}
-            ]
-            text_prompt = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-            inputs = self.tokenizer(text_prompt, return_tensors="pt").to(self.device)
-            
-            with torch.no_grad():
-                outputs = self.model.generate(**inputs, max_new_tokens=15)
+            if self._use_logit_scoring():
+                distribution = self._score_choices([self._build_request('aspect_score', text=text, aspect=aspect)])[0]
+                return self._distribution_to_result(distribution)
             
-            response = self.tokenizer.decode(outputs[0][inputs.input_ids.shape[1]:], skip_special_tokens=True)
+            # Sampling settings come from the model's own generation config here
+            response = self._generate(
+                [self._build_request('aspect', text=text, aspect=aspect)],
+                max_new_tokens=15,
+                generate_kwargs={}
+            )[0]
             label, score = self._parse_sentiment_score(response)
             return {'label': label, 'score': score}
         except:
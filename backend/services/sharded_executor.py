@@ -0,0 +1,249 @@
+"""
+Sharded Batch Executor
+Runs large batch jobs on N worker processes, each with its own SentimentAnalyzer,
+a fixed number of intra-op threads and (on Linux) its own set of physical cores.
+Small-batch decoding does not scale across many threads, so several narrow model
+instances keep a many-core CPU busier than one wide one.
+
+Reviews are split into sub-batches of ANALYSIS_BATCH_SIZE and handed out in order
+(Pool.imap), so results come back in input order for the job runner's DB writes.
+
+A worker that fails to load its model reports it to the parent, and every sub-batch
+has a deadline: either way the pool is torn down and the call raises instead of
+hanging (the job fails and the next one starts a fresh pool).
+"""
+import copy
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+
+# Set in each worker process by _init_worker
+_worker_analyzer = None
+
+
+def physical_cpus():
+    """One logical CPU id per physical core this process may run on (Linux sysfs; falls back to all CPUs)."""
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    chosen, seen_cores = [], set()
+    for cpu in available:
+        try:
+            with open(f'/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list') as f:
+                core = f.read().strip()
+        except OSError:
+            core = str(cpu)
+        if core not in seen_cores:
+            seen_cores.add(core)
+            chosen.append(cpu)
+    return chosen
+
+
+def plan_workers(workers=None, threads=None):
+    """
+    (workers, threads per worker, [cpu ids per worker or None]).
+    workers=0 means one worker per physical core / threads; threads=0 splits the cores evenly.
+    """
+    cpus = physical_cpus()
+    workers = workers if workers is not None else Config.BATCH_SHARD_WORKERS
+    threads = threads if threads is not None else Config.BATCH_SHARD_THREADS
+    if not workers:
+        workers = max(1, len(cpus) // (threads or 1))
+    if not threads:
+        threads = max(1, len(cpus) // workers)
+
+    if not Config.BATCH_SHARD_PIN_CORES or not hasattr(os, 'sched_setaffinity') or workers * threads > len(cpus):
+        # Pinning overlapping core sets would only make workers fight over them
+        return workers, threads, [None] * workers
+    return workers, threads, [cpus[i * threads:(i + 1) * threads] for i in range(workers)]
+
+
+def _init_worker(config_values, threads, cpu_queue, ready_queue):
+    """Pool initializer: report the outcome of _load_worker to the parent on ready_queue."""
+    try:
+        _load_worker(config_values, threads, cpu_queue)
+    except Exception as e:
+        ready_queue.put((os.getpid(), f"{type(e).__name__}: {e}", None))
+        raise
+    ready_queue.put((os.getpid(), None, {
+        # The worker's own fingerprints: it runs on CPU, whatever device the parent would pick
+        'fingerprints': _worker_analyzer.get_fingerprints(),
+        'counters': list(_worker_analyzer.generation_stats),
+        'backend': _worker_analyzer.backend.name,
+        'constrained_decoding': _worker_analyzer.backend.constrained_decoding,
+        'cascade': _worker_analyzer.distilled is not None
+    }))
+
+
+def _load_worker(config_values, threads, cpu_queue):
+    """Apply the parent's config, pin threads and cores, load the model."""
+    global _worker_analyzer
+    # A replacement for a failed worker finds the queue empty; the parent is tearing the pool down
+    cpus = cpu_queue.get(timeout=Config.BATCH_SHARD_START_TIMEOUT)
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    # Before torch is imported, so OpenMP/MKL size their pools accordingly
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+
+    for name, value in config_values.items():
+        setattr(Config, name, value)
+    Config.DEVICE = 'cpu'
+    Config.ONNX_INTRA_OP_THREADS = threads
+    Config.INFERENCE_WORKER_ENABLED = False
+
+    if Config.INFERENCE_BACKEND == 'transformers':
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+
+    from services.sentiment_analyzer import SentimentAnalyzer
+    _worker_analyzer = SentimentAnalyzer()
+    print(f"✅ Shard worker {os.getpid()} ready ({threads} threads, cpus {cpus or 'unpinned'})")
+
+
+def _analyze_shard(shard):
+    """Results for one sub-batch plus what it added to every generation counter and length bucket."""
+    texts, detail, rescore, aspects, token_lengths = shard
+    stats, buckets = _worker_analyzer.generation_stats, _worker_analyzer.bucket_stats
+    before, buckets_before = dict(stats), copy.deepcopy(buckets)
+    results = _worker_analyzer.analyze_with_aspects_batch(
+        texts, batch_size=len(texts), detail=detail, rescore=rescore, aspects=aspects, token_lengths=token_lengths
+    )
+    counters = {key: value - before.get(key, 0) for key, value in stats.items()}
+    bucket_deltas = {
+        bound: {field: value - buckets_before.get(bound, {}).get(field, 0) for field, value in bucket.items()}
+        for bound, bucket in buckets.items()
+    }
+    return results, counters, bucket_deltas
+
+
+class ShardedExecutor:
+    """Pool of model processes with the analyze_with_aspects_batch interface the job runner uses."""
+
+    def __init__(self, workers=None, threads=None, shard_size=None):
+        self.workers, self.threads, cpu_sets = plan_workers(workers, threads)
+        self.shard_size = shard_size or Config.ANALYSIS_BATCH_SIZE
+        # Summed over all workers: every generation_stats counter and bucket_stats entry
+        self.stats = {}
+        self.bucket_stats = {}
+        config_values = {
+            name: value for name, value in vars(Config).items()
+            if name.isupper() and name != 'DEVICE'
+        }
+
+        # spawn: a clean interpreter per worker (forking a process with threads and torch state is unsafe)
+        context = multiprocessing.get_context('spawn')
+        cpu_queue = context.Queue()
+        ready_queue = context.Queue()
+        for cpus in cpu_sets:
+            cpu_queue.put(cpus)
+        print(f"Starting {self.workers} shard workers x {self.threads} threads...")
+        self.closed = False
+        self.info = None
+        self._pool = context.Pool(
+            self.workers, initializer=_init_worker, initargs=(config_values, self.threads, cpu_queue, ready_queue)
+        )
+        self._wait_ready(ready_queue)
+
+    def _wait_ready(self, ready_queue):
+        """Block until every worker has loaded its model; terminate the pool and raise if one fails or stalls."""
+        deadline = time.monotonic() + Config.BATCH_SHARD_START_TIMEOUT
+        for _ in range(self.workers):
+            try:
+                pid, error, info = ready_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self.terminate()
+                raise RuntimeError(f"Shard workers not ready within {Config.BATCH_SHARD_START_TIMEOUT}s")
+            if error:
+                self.terminate()
+                raise RuntimeError(f"Shard worker {pid} failed to start: {error}")
+            self.info = info
+        self.stats = {key: 0 for key in self.info['counters']}
+
+    def analyze_with_aspects_batch(self, texts, batch_size=None, detail='full', rescore=None,
+                                   aspects=None, token_lengths=None):
+        """Same contract as SentimentAnalyzer.analyze_with_aspects_batch: one result (or None) per text, in order."""
+        texts = list(texts)
+        size = batch_size or self.shard_size
+        # Similar lengths share a shard, so each worker's own length buckets stay tight
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i])) if Config.LENGTH_BUCKETING else list(range(len(texts)))
+
+        def column(values, rows):
+            return None if values is None else [values[i] for i in rows]
+
+        shards = []
+        for start in range(0, len(order), size):
+            rows = order[start:start + size]
+            shards.append(([texts[i] for i in rows], detail, rescore, column(aspects, rows), column(token_lengths, rows)))
+        ordered_results = []
+        pending = self._pool.imap(_analyze_shard, shards)
+        for _ in shards:
+            try:
+                shard_results, counters, bucket_deltas = pending.next(timeout=Config.BATCH_SHARD_TIMEOUT)
+            except multiprocessing.TimeoutError:
+                # A dead or stuck worker never returns its sub-batch; the pool cannot be reused
+                self.terminate()
+                raise RuntimeError(f"Shard sub-batch not finished within {Config.BATCH_SHARD_TIMEOUT}s")
+            ordered_results.extend(shard_results)
+            for key, value in counters.items():
+                self.stats[key] = self.stats.get(key, 0) + value
+            for bound, delta in bucket_deltas.items():
+                bucket = self.bucket_stats.setdefault(bound, dict.fromkeys(delta, 0))
+                for field, value in delta.items():
+                    bucket[field] += value
+        results = [None] * len(texts)
+        for i, result in zip(order, ordered_results):
+            results[i] = result
+        return results
+
+    def get_fingerprints(self):
+        """Fingerprints the workers stamp on their results (identical across workers)."""
+        return dict(self.info['fingerprints'])
+
+    def get_generation_stats(self):
+        """SentimentAnalyzer.get_generation_stats over all workers since the pool started."""
+        from services.sentiment_analyzer import SentimentAnalyzer
+        stats = SentimentAnalyzer.summarize_generation_stats(self.stats, self.bucket_stats, self.info['cascade'])
+        stats.update({
+            'constrained_decoding': self.info['constrained_decoding'],
+            'backend': self.info['backend'],
+            'workers': self.workers,
+            'threads_per_worker': self.threads
+        })
+        return stats
+
+    def close(self):
+        self.closed = True
+        self._pool.close()
+        self._pool.join()
+
+    def terminate(self):
+        """Stop the workers without waiting for outstanding sub-batches."""
+        self.closed = True
+        self._pool.terminate()
+        self._pool.join()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def running_sharded_executor():
+    """The process-wide executor if it has been started and is usable, else None (never starts one)."""
+    executor = _executor
+    return executor if executor is not None and not executor.closed else None
+
+
+def get_sharded_executor():
+    """Process-wide executor, started on first use (worker model loads happen in parallel); restarted after a failure."""
+    global _executor
+    with _executor_lock:
+        if _executor is None or _executor.closed:
+            _executor = ShardedExecutor()
+        return _executor
+
@@ -0,0 +1,509 @@
+"""
+Qwen2 Inference Backends
+TransformersBackend runs the model in PyTorch with batched left-padded generation, a
+KV cache of the fixed prompt prefixes and schema-constrained JSON decoding.
+OnnxBackend serves the same model through ONNX Runtime (optimum).
+"""
+from transformers import AutoTokenizer, Qwen2ForCausalLM, LogitsProcessorList, StoppingCriteriaList, TextIteratorStreamer
+import torch
+import copy
+import os
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+from services.inference_backends import InferenceBackend
+from services.json_constraints import (
+    JsonVocabularyIndex, JsonDecodeTracker, ConstrainedJsonLogitsProcessor, JsonObjectStoppingCriteria
+)
+
+
+class TransformersBackend(InferenceBackend):
+    """Qwen2 in PyTorch on Config.DEVICE."""
+    name = 'transformers'
+
+    # Marks the boundary between the fixed prompt prefix and the body when rendering the chat template
+    _PREFIX_SENTINEL = '\ue000'
+
+    def __init__(self, model_name, generation_stats, vocabularies=None):
+        super().__init__(model_name, generation_stats, vocabularies)
+        self.device = Config.DEVICE
+        # fp16 on GPU; Config.CPU_PRECISION (fp32 / bf16 / int8) on CPU
+        self.precision = 'fp16' if self.device == 'cuda' else Config.CPU_PRECISION
+        if self.precision not in ('fp16', 'fp32', 'bf16', 'int8'):
+            raise ValueError(f"Unsupported CPU_PRECISION: {self.precision} (use fp32, bf16 or int8)")
+        self.tokenizer = None
+        self.model = None
+        # Prompt prefix string -> (prefix input_ids, past_key_values), filled lazily per model load
+        self._prefix_cache = {}
+        # Token lookup tables for constrained JSON decoding, built at load time
+        self.json_index = None
+        self._stop_token_ids = set()
+        # Answer strings -> their token ids for choice scoring (None when not single tokens)
+        self._choice_ids = {}
+
+    def prefix_cache_enabled(self):
+        return Config.PREFIX_CACHE_ENABLED
+
+    @property
+    def constrained_decoding(self):
+        return self.json_index is not None
+
+    def is_loaded(self):
+        return self.model is not None and self.tokenizer is not None
+
+    def load(self, warmup_requests=()):
+        """Load model with robust error handling and device checking"""
+        cache_dir = Config.MODEL_CACHE_DIR
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Check local path
+        model_local_path = Path(cache_dir) / self.model_name.replace('/', '--')
+        if not (model_local_path.exists() and (model_local_path / 'model.safetensors').exists()):
+            raise FileNotFoundError(f"Model not found at local path: {model_local_path}. Please download it first.")
+
+        model_path = str(model_local_path)
+        print(f"Loading model from: {model_path}")
+        print(f"Target Device: {self.device}")
+
+        if self.device == 'cuda':
+            print(f"GPU detected: {torch.cuda.get_device_name(0)}")
+            vram = torch.cuda.get_device_properties(0).total_memory / 1024**3
+            print(f"Total VRAM: {vram:.2f} GB")
+
+        try:
+            # 1. Load Tokenizer
+            print("Loading tokenizer...")
+            phase_start = time.perf_counter()
+            self.tokenizer = AutoTokenizer.from_pretrained(
+                model_path,
+                trust_remote_code=True,
+                local_files_only=True
+            )
+            # Left padding so that batched prompts all end at the generation position
+            self.tokenizer.padding_side = 'left'
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+            print("✅ Tokenizer loaded.")
+            self.load_timings['tokenizer_seconds'] = round(time.perf_counter() - phase_start, 3)
+
+            # 2. Load Model
+            print("Loading model weights (this may take time)...")
+            phase_start = time.perf_counter()
+            self.model = self._load_weights(model_path)
+            self.load_timings['weights_seconds'] = round(time.perf_counter() - phase_start, 3)
+            phase_start = time.perf_counter()
+
+            eos = self.model.generation_config.eos_token_id
+            self._stop_token_ids = set(eos if isinstance(eos, list) else [eos]) | {self.tokenizer.pad_token_id}
+
+            if Config.CONSTRAINED_DECODING and self.vocabularies:
+                self.json_index = JsonVocabularyIndex(self.tokenizer, self.vocabularies)
+                print("✅ Constrained JSON decoding enabled")
+
+            # Prefill the fixed prompt prefixes once so requests only pay for their own tokens
+            if self.prefix_cache_enabled():
+                for request in warmup_requests:
+                    prefix, _ = self.render(request)
+                    self.get_prefix_cache(prefix)
+                print(f"✅ Prompt prefix cache ready ({len(self._prefix_cache)} prefixes)")
+
+            self.load_timings['warmup_seconds'] = round(time.perf_counter() - phase_start, 3)
+
+            # Memory usage report
+            if self.device == 'cuda':
+                allocated = torch.cuda.memory_allocated(0) / 1024**3
+                print(f"✅ Model loaded successfully! VRAM Used: {allocated:.2f} GB")
+            else:
+                print(f"✅ Model loaded successfully!")
+
+        except Exception as e:
+            error_msg = f"❌ Critical Error loading model: {str(e)}"
+            print(error_msg)
+            print(traceback.format_exc())
+            raise RuntimeError(f"Failed to load model: {str(e)}")
+
+    def _load_weights(self, model_path):
+        # Safetensors are memory-mapped and copied straight into the final tensors,
+        # skipping the random-init pass and the extra full copy of the state dict
+        load_kwargs = {
+            'trust_remote_code': True,
+            'local_files_only': True,
+            'use_safetensors': True,
+            'low_cpu_mem_usage': True,
+        }
+
+        if self.device == 'cuda':
+            load_kwargs['torch_dtype'] = torch.float16
+            load_kwargs['device_map'] = 'auto'
+        else:
+            # int8 quantizes fp32 Linear weights after loading
+            load_kwargs['torch_dtype'] = torch.bfloat16 if self.precision == 'bf16' else torch.float32
+
+        model = Qwen2ForCausalLM.from_pretrained(
+            model_path,
+            **load_kwargs
+        )
+
+        # Ensure model is on correct device
+        if self.device == 'cuda':
+            if not hasattr(model, 'device') or str(model.device) == 'cpu':
+                model = model.to('cuda')
+            print(f"Model loaded on GPU: {next(model.parameters()).device}")
+        else:
+            model = model.to('cpu')
+            if self.precision == 'int8':
+                # Dynamic quantization: int8 weights, activations quantized on the fly per matmul
+                model = torch.ao.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+            print(f"Model loaded on CPU ({self.precision})")
+
+        model.eval()
+        return model
+
+    def memory_footprint(self):
+        """Bytes held by the model parameters and buffers (plus packed int8 weights when quantized)."""
+        param_bytes = sum(p.numel() * p.element_size() for p in self.model.parameters())
+        buffer_bytes = sum(b.numel() * b.element_size() for b in self.model.buffers())
+        packed_bytes = 0
+        for module in self.model.modules():
+            # Dynamically quantized Linear layers keep their weights outside parameters()
+            if hasattr(module, '_packed_params'):
+                weight, bias = module._weight_bias()
+                packed_bytes += weight.numel() * weight.element_size()
+                packed_bytes += bias.numel() * bias.element_size() if bias is not None else 0
+        return {
+            'precision': self.precision,
+            'parameter_bytes': param_bytes + packed_bytes,
+            'buffer_bytes': buffer_bytes
+        }
+
+    def render(self, request):
+        """
+        Render a request through the chat template and split it at the end of the fixed head.
+        Returns (prefix, rest): prefix is identical for every request of the same kind.
+        """
+        messages = [
+            {"role": "system", "content": request.system},
+            {"role": "user", "content": request.head + self._PREFIX_SENTINEL + request.body}
+        ]
+        rendered = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        prefix, rest = rendered.split(self._PREFIX_SENTINEL, 1)
+        return prefix, rest
+
+    def get_prefix_cache(self, prefix):
+        """Prefill the fixed prompt prefix once and keep its input_ids and past_key_values."""
+        if prefix not in self._prefix_cache:
+            prefix_ids = self.tokenizer(prefix, return_tensors="pt", add_special_tokens=False).input_ids.to(self.device)
+            with torch.no_grad():
+                outputs = self.model(input_ids=prefix_ids, use_cache=True)
+            self._prefix_cache[prefix] = (prefix_ids, outputs.past_key_values)
+        return self._prefix_cache[prefix]
+
+    def generate(self, requests, max_new_tokens, generate_kwargs=None, json_schema=False, row_vocabularies=None):
+        """
+        Run batched generation over PromptRequests.
+        Requests sharing a prompt prefix reuse its cached KV; only the body is prefilled.
+        With json_schema=True (and Config.CONSTRAINED_DECODING) output is constrained to the
+        aspect JSON vocabularies and stops when the top-level object closes.
+        Returns the decoded completions in input order.
+        """
+        if generate_kwargs is None:
+            generate_kwargs = {'temperature': 0.1, 'do_sample': False} # Low temp for deterministic output
+        json_schema = json_schema and self.json_index is not None
+        if isinstance(max_new_tokens, int):
+            max_new_tokens = [max_new_tokens] * len(requests)
+        row_vocabularies = row_vocabularies or [None] * len(requests)
+
+        rendered = [self.render(request) for request in requests]
+
+        if not self.prefix_cache_enabled():
+            return self._generate_full(
+                [prefix + rest for prefix, rest in rendered], max(max_new_tokens), generate_kwargs,
+                json_schema, row_vocabularies
+            )
+
+        # Group by prefix so each group shares one cached prefill
+        groups = {}
+        for idx, (prefix, rest) in enumerate(rendered):
+            groups.setdefault(prefix, []).append((idx, rest))
+
+        responses = [None] * len(requests)
+        for prefix, items in groups.items():
+            group_responses = self._generate_with_prefix(
+                prefix, [rest for _, rest in items],
+                max(max_new_tokens[idx] for idx, _ in items),
+                generate_kwargs, json_schema,
+                [row_vocabularies[idx] for idx, _ in items]
+            )
+            for (idx, _), response in zip(items, group_responses):
+                responses[idx] = response
+        return responses
+
+    def stream(self, request, max_new_tokens, generate_kwargs=None, json_schema=False, row_vocabularies=None):
+        """
+        Generate one completion on a background thread and yield decoded text as it arrives.
+        Uses the prefix cache and constrained decoding exactly like generate().
+        """
+        if generate_kwargs is None:
+            generate_kwargs = {'temperature': 0.1, 'do_sample': False}
+        json_schema = json_schema and self.json_index is not None
+
+        prefix, rest = self.render(request)
+        if self.prefix_cache_enabled():
+            input_ids, attention_mask, past_key_values = self._build_prefixed_inputs(prefix, [rest])
+        else:
+            inputs = self.tokenizer([prefix + rest], return_tensors="pt").to(self.device)
+            input_ids, attention_mask, past_key_values = inputs.input_ids, inputs.attention_mask, None
+
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=Config.INFERENCE_WORKER_TIMEOUT
+        )
+        failure = []
+
+        def run():
+            try:
+                self._run_generate(
+                    input_ids, attention_mask, past_key_values, max_new_tokens, generate_kwargs,
+                    json_schema, row_vocabularies, streamer=streamer
+                )
+            except Exception as e:
+                failure.append(e)
+                # Unblock the consumer; generate() only ends the streamer on success
+                streamer.end()
+
+        thread = threading.Thread(target=run, name='stream-generate', daemon=True)
+        thread.start()
+        for piece in streamer:
+            if piece:
+                yield piece
+        thread.join()
+        if failure:
+            raise failure[0]
+
+    def _generate_full(self, text_prompts, max_new_tokens, generate_kwargs, json_schema=False, row_vocabularies=None):
+        """Plain left-padded batched generation without prefix reuse."""
+        inputs = self.tokenizer(text_prompts, return_tensors="pt", padding=True).to(self.device)
+        return self._run_generate(
+            inputs.input_ids, inputs.attention_mask, None, max_new_tokens, generate_kwargs,
+            json_schema, row_vocabularies
+        )
+
+    def _generate_with_prefix(self, prefix, rests, max_new_tokens, generate_kwargs, json_schema=False, row_vocabularies=None):
+        """
+        Generate continuations for several bodies behind one cached prefix.
+        Each row is laid out as [prefix][padding][body]: padding sits between prefix and
+        body (masked out), so the cached prefix KV lines up with every row and the
+        position ids derived from the attention mask stay contiguous.
+        """
+        input_ids, attention_mask, past_key_values = self._build_prefixed_inputs(prefix, rests)
+        return self._run_generate(
+            input_ids, attention_mask, past_key_values, max_new_tokens, generate_kwargs,
+            json_schema, row_vocabularies
+        )
+
+    def _build_prefixed_inputs(self, prefix, rests):
+        """Input ids, attention mask and a private copy of the prefix cache for [prefix][padding][body] rows."""
+        prefix_ids, prefix_kv = self.get_prefix_cache(prefix)
+        prefix_len = prefix_ids.shape[1]
+        pad_id = self.tokenizer.pad_token_id
+
+        rest_ids = [self.tokenizer(rest, add_special_tokens=False).input_ids for rest in rests]
+        max_rest = max(len(ids) for ids in rest_ids)
+
+        input_rows, mask_rows = [], []
+        for ids in rest_ids:
+            pad = max_rest - len(ids)
+            input_rows.append(prefix_ids[0].tolist() + [pad_id] * pad + ids)
+            mask_rows.append([1] * prefix_len + [0] * pad + [1] * len(ids))
+
+        input_ids = torch.tensor(input_rows, dtype=torch.long, device=self.device)
+        attention_mask = torch.tensor(mask_rows, dtype=torch.long, device=self.device)
+
+        # generate() extends the cache in place, so every call works on its own copy
+        past_key_values = copy.deepcopy(prefix_kv)
+        if len(rests) > 1:
+            past_key_values.batch_repeat_interleave(len(rests))
+        return input_ids, attention_mask, past_key_values
+
+    def supports_choices(self, choices):
+        return self._choice_token_ids(choices) is not None
+
+    def _choice_token_ids(self, choices):
+        key = tuple(choices)
+        if key not in self._choice_ids:
+            ids = [self.tokenizer.encode(c, add_special_tokens=False) for c in choices]
+            self._choice_ids[key] = [i[0] for i in ids] if all(len(i) == 1 for i in ids) else None
+        return self._choice_ids[key]
+
+    def _forward_kwargs(self):
+        # Only the last position's logits are needed for choice scoring
+        return {'logits_to_keep': 1}
+
+    def score_choices(self, requests, choices):
+        """
+        One forward pass per prompt group: softmax of the next-token logits restricted to
+        the answer tokens. Returns a list of {choice: probability} dicts in input order.
+        """
+        rendered = [self.render(request) for request in requests]
+        groups = {}
+        for idx, (prefix, rest) in enumerate(rendered):
+            key = prefix if self.prefix_cache_enabled() else None
+            groups.setdefault(key, []).append((idx, prefix, rest))
+
+        choice_ids = torch.tensor(self._choice_token_ids(choices), device=self.device)
+        distributions = [None] * len(requests)
+
+        for prefix, items in groups.items():
+            if prefix is None:
+                inputs = self.tokenizer([p + r for _, p, r in items], return_tensors="pt", padding=True).to(self.device)
+                input_ids, attention_mask, past_key_values, start = inputs.input_ids, inputs.attention_mask, None, 0
+            else:
+                input_ids, attention_mask, past_key_values = self._build_prefixed_inputs(prefix, [r for _, _, r in items])
+                start = past_key_values.get_seq_length()
+
+            # Positions follow the attention mask so padded rows stay contiguous
+            position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+            with torch.no_grad():
+                outputs = self.model(
+                    input_ids=input_ids[:, start:],
+                    attention_mask=attention_mask,
+                    position_ids=position_ids[:, start:],
+                    past_key_values=past_key_values,
+                    use_cache=past_key_values is not None,
+                    **self._forward_kwargs()
+                )
+            probs = torch.softmax(outputs.logits[:, -1, :].float().index_select(-1, choice_ids), dim=-1)
+
+            for (idx, _, _), row in zip(items, probs.tolist()):
+                distributions[idx] = dict(zip(choices, row))
+        return distributions
+
+    def _run_generate(self, input_ids, attention_mask, past_key_values, max_new_tokens, generate_kwargs, json_schema, row_vocabularies=None, streamer=None):
+        """Call model.generate, record generated-token counts and decode the new tokens."""
+        extra = {}
+        if past_key_values is not None:
+            extra['past_key_values'] = past_key_values
+        if streamer is not None:
+            extra['streamer'] = streamer
+        if json_schema:
+            tracker = JsonDecodeTracker(self.json_index, input_ids.shape[1], input_ids.shape[0], row_vocabularies)
+            extra['logits_processor'] = LogitsProcessorList([ConstrainedJsonLogitsProcessor(tracker)])
+            extra['stopping_criteria'] = StoppingCriteriaList([JsonObjectStoppingCriteria(tracker)])
+
+        with torch.no_grad():
+            outputs = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                max_new_tokens=max_new_tokens,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **extra,
+                **generate_kwargs
+            )
+
+        prompt_len = input_ids.shape[1]
+        new_tokens = outputs[:, prompt_len:]
+        self._record_generation([self._count_generated(row) for row in new_tokens.tolist()])
+
+        return [
+            self.tokenizer.decode(row, skip_special_tokens=True)
+            for row in new_tokens
+        ]
+
+    def _count_generated(self, token_ids):
+        """Number of generated tokens up to and including the first stop token."""
+        for n, token_id in enumerate(token_ids):
+            if token_id in self._stop_token_ids:
+                return n + 1
+        return len(token_ids)
+
+    def token_counts(self, texts):
+        return [len(ids) for ids in self.tokenizer(list(texts), add_special_tokens=False)['input_ids']]
+
+    def token_windows(self, text, size):
+        ids = self.tokenizer(text, add_special_tokens=False)['input_ids']
+        return [self.tokenizer.decode(ids[i:i + size]) for i in range(0, len(ids), size)]
+
+
+class OnnxBackend(TransformersBackend):
+    """
+    Qwen2 as an ONNX Runtime session (optimum, CPU), with past key/value inputs so
+    decoding reuses the KV cache. The model is exported once to Config.ONNX_MODEL_DIR.
+    """
+    name = 'onnx'
+
+    def __init__(self, model_name, generation_stats, vocabularies=None):
+        super().__init__(model_name, generation_stats, vocabularies)
+        self.device = 'cpu'
+        self.precision = 'fp32'  # the exported graph is fp32
+
+    def prefix_cache_enabled(self):
+        # ONNX Runtime sessions take plain past tensors, not a reusable DynamicCache
+        return False
+
+    def _forward_kwargs(self):
+        # ONNX sessions always return logits for every position
+        return {}
+
+    def score_choices(self, requests, choices):
+        """
+        Same contract as TransformersBackend.score_choices, through the ORT model's own
+        generate() for one token with raw logits: optimum then derives position ids and the
+        (empty) past inputs for the exported graph itself, rather than being handed forward
+        kwargs that a past-key-values export does not necessarily accept.
+        """
+        choice_ids = torch.tensor(self._choice_token_ids(choices))
+        inputs = self.tokenizer([prefix + rest for prefix, rest in map(self.render, requests)], return_tensors="pt", padding=True)
+        with torch.no_grad():
+            outputs = self.model.generate(
+                input_ids=inputs.input_ids,
+                attention_mask=inputs.attention_mask,
+                max_new_tokens=1,
+                do_sample=False,
+                output_logits=True,
+                return_dict_in_generate=True,
+                pad_token_id=self.tokenizer.pad_token_id
+            )
+        probs = torch.softmax(outputs.logits[0].float().index_select(-1, choice_ids), dim=-1)
+        return [dict(zip(choices, row)) for row in probs.tolist()]
+
+    def _load_weights(self, model_path):
+        try:
+            import onnxruntime
+            from optimum.onnxruntime import ORTModelForCausalLM
+        except ImportError:
+            raise RuntimeError("INFERENCE_BACKEND='onnx' requires optimum[onnxruntime]: pip install \"optimum[onnxruntime]\"")
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if Config.ONNX_INTRA_OP_THREADS:
+            session_options.intra_op_num_threads = Config.ONNX_INTRA_OP_THREADS
+        load_kwargs = {
+            'use_cache': True,
+            'use_io_binding': False,
+            'provider': 'CPUExecutionProvider',
+            'session_options': session_options
+        }
+
+        onnx_path = Path(Config.ONNX_MODEL_DIR) / self.model_name.replace('/', '--')
+        if (onnx_path / 'model.onnx').exists():
+            model = ORTModelForCausalLM.from_pretrained(str(onnx_path), **load_kwargs)
+        else:
+            print(f"Exporting model to ONNX at {onnx_path} (one-time, may take several minutes)...")
+            model = ORTModelForCausalLM.from_pretrained(model_path, export=True, local_files_only=True, **load_kwargs)
+            model.save_pretrained(str(onnx_path))
+            print("✅ ONNX export saved")
+        print("Model loaded in ONNX Runtime (CPU)")
+        return model
+
+    def memory_footprint(self):
+        # Weights live inside the ONNX Runtime session; report the exported files instead
+        return {
+            'precision': self.precision,
+            'parameter_bytes': sum(f.stat().st_size for f in Path(self.model.model_save_dir).glob('*.onnx*')),
+            'buffer_bytes': 0
+        }
@@ -0,0 +1,59 @@
+"""
+Shared test setup: every test runs on the stub inference backend (no model weights, no
+torch) with a throwaway SQLite database, and nothing starts in the background.
+
+Run from the backend directory:
+    python -m pytest -q
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from config import Config
+
+# Set before the app, registry or any analyzer reads them
+Config.INFERENCE_BACKEND = 'stub'
+Config.STUB_CALL_LATENCY_MS = 0
+Config.STUB_MS_PER_TOKEN = 0
+Config.INFERENCE_WORKER_ENABLED = False
+Config.BATCH_SHARD_ENABLED = False
+Config.JOB_RUNNER_ENABLED = False
+Config.MODEL_PRELOAD = False
+Config.ANALYSIS_CACHE_ENABLED = False
+Config.DISTILLED_CASCADE_ENABLED = False
+
+from app import create_app
+from models import db, Feedback, AnalysisJob, AspectSentiment
+from services.model_registry import get_analyzer
+from services.sentiment_analyzer import SentimentAnalyzer
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    Config.DATABASE_URL = f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}"
+    return create_app()
+
+
+@pytest.fixture
+def db_session(app):
+    """App context with empty feedback and job tables (the default admin user is kept)."""
+    with app.app_context():
+        yield db.session
+        db.session.rollback()
+        for model in (AspectSentiment, Feedback, AnalysisJob):
+            model.query.delete()
+        db.session.commit()
+
+
+@pytest.fixture
+def analyzer():
+    """A fresh stub analyzer, so generation counters start at zero."""
+    return SentimentAnalyzer()
+
+
+@pytest.fixture
+def shared_analyzer(app):
+    """The registry's analyzer: the one JobRunner hands its jobs to."""
+    return get_analyzer()
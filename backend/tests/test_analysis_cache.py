@@ -0,0 +1,51 @@
+from services.analysis_cache import AnalysisCache, normalize_text
+
+RESULT = {'sentiment': {'label': 'positive', 'score': 0.75}, 'aspect_sentiments': {'Room': 'positive'}}
+
+
+def open_cache(tmp_path, model='Qwen/Qwen2-1.5B-Instruct@stub/fp32', prompt='v1'):
+    return AnalysisCache(tmp_path / 'cache.db', model_fingerprint=model, prompt_version=prompt)
+
+
+def test_normalize_text():
+    assert normalize_text('  Great\tROOM\n\nｆｏｏｄ ') == 'great room food'
+    assert normalize_text(None) == ''
+
+
+def test_hits_survive_reopening_with_the_same_fingerprint(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.put('Great room', RESULT)
+    # Same review up to case and whitespace
+    assert cache.get('  great   ROOM ') == RESULT
+
+    reopened = open_cache(tmp_path)
+    assert reopened.get('Great room') == RESULT
+    assert reopened.stats()['disk_hits'] == 1
+
+
+def test_other_model_or_precision_invalidates(tmp_path):
+    open_cache(tmp_path).put('Great room', RESULT)
+    other = open_cache(tmp_path, model='Qwen/Qwen2-1.5B-Instruct@stub/fp16')
+    assert other.get('Great room') is None
+    assert other.stats()['disk_entries'] == 0
+
+
+def test_other_prompt_version_invalidates(tmp_path):
+    open_cache(tmp_path).put('Great room', RESULT)
+    other = open_cache(tmp_path, prompt='v2')
+    assert other.get('Great room') is None
+    # The old rows are gone, not just hidden: switching back does not revive them
+    assert open_cache(tmp_path).get('Great room') is None
+
+
+def test_variants_are_cached_separately(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.put('Great room', RESULT, variant='aspects')
+    assert cache.get('Great room', variant='aspects_labels') is None
+
+
+def test_results_are_copies(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.put('Great room', RESULT)
+    cache.get('Great room')['sentiment']['label'] = 'negative'
+    assert cache.get('Great room')['sentiment']['label'] == 'positive'
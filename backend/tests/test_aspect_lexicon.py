@@ -0,0 +1,53 @@
+import pytest
+
+from services.aspect_extractor import ASPECT_LEXICON, extract_aspects_batch, extract_aspects_from_text
+from services.aspect_lexicon import AspectLexicon
+
+
+@pytest.mark.parametrize('text, aspects', [
+    # Latin keywords only match whole words
+    ('I barely slept', []),
+    ('Read my review', []),
+    ('The bar was great', ['Food']),
+    ('Great view from the bar', ['Location', 'Food']),
+    # CJK has no word breaks, and a Latin keyword right next to CJK still matches
+    ('房间wifi很慢', ['Room', 'Facilities']),
+    ('早餐不错，WiFi也快', ['Food', 'Facilities']),
+    ('Nice ROOM, rude Staff', ['Room', 'Service']),
+])
+def test_find(text, aspects):
+    assert ASPECT_LEXICON.find(text) == aspects
+
+
+def test_find_many_matches_find():
+    texts = ['I barely slept', '房间wifi很慢', 'The bar was great', '']
+    assert ASPECT_LEXICON.find_many(texts) == [ASPECT_LEXICON.find(text) for text in texts]
+
+
+def test_map_prefers_aspect_names_then_the_longest_keyword():
+    assert ASPECT_LEXICON.map(' Location ') == 'Location'
+    assert ASPECT_LEXICON.map('hotel location') == 'Location'
+    assert ASPECT_LEXICON.map('前台服务') == 'Service'
+    assert ASPECT_LEXICON.map('bathrooms') is None
+    assert ASPECT_LEXICON.map('barely anything') is None
+
+
+def test_longest_keyword_wins():
+    lexicon = AspectLexicon({'pool': 'Facilities', 'pool bar': 'Food'}, ['Food', 'Facilities'])
+    assert lexicon.find('the pool bar was shut') == ['Food']
+    assert lexicon.find('the pool was shut') == ['Facilities']
+
+
+def test_substring_mode_reports_every_aspect():
+    lexicon = AspectLexicon({'staff': 'Service', 'food': 'Food'}, ['Service', 'Food'], whole_words=False)
+    # Overlapping keywords ('staf[f]ood') both count
+    assert lexicon.find('staffood') == ['Service', 'Food']
+    assert lexicon.find('overstaffed') == ['Service']
+
+
+def test_extract_aspects_keeps_substring_semantics():
+    # Only COMMON_ASPECTS keywords, matched as plain substrings, reported by Chinese name
+    assert extract_aspects_from_text('barely a bar review') == []
+    assert extract_aspects_from_text('bedroom costs') == ['房间', '价格']
+    assert extract_aspects_from_text('房间wifi很慢') == ['房间', '设施']
+    assert extract_aspects_batch(['The WIFI', '', '前台服务员']) == [['设施'], [], ['服务']]
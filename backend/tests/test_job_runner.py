@@ -0,0 +1,147 @@
+"""
+JobRunner chunk commits: a job interrupted mid-run resumes after its last committed chunk,
+and a runner whose job was taken over writes nothing. Jobs run synchronously on the
+registry's stub analyzer.
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import Config
+from models import db, AnalysisJob, Feedback
+from services.job_runner import JobRunner, create_batch_job, create_reanalyze_job
+
+ROWS = [{'text': f'Stay number {i}: the room was clean and the staff were friendly', 'hotel_name': 'Lux'} for i in range(7)]
+STALE_MODEL = 'old-model@transformers/fp16'
+
+
+class Crash(BaseException):
+    """Stands in for the process dying: not an Exception, so _run_job does not mark the job failed."""
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(Config, 'JOB_CHUNK_SIZE', 3)
+
+
+@pytest.fixture
+def analyzed(shared_analyzer, monkeypatch):
+    """Texts of each analyzer call; `analyzed.on_call[n]` runs before call n (1-based)."""
+    real = shared_analyzer.analyze_with_aspects_batch
+    calls, on_call = [], {}
+
+    def wrapper(texts, *args, **kwargs):
+        calls.append(list(texts))
+        if len(calls) in on_call:
+            on_call[len(calls)]()
+        return real(texts, *args, **kwargs)
+
+    monkeypatch.setattr(shared_analyzer, 'analyze_with_aspects_batch', wrapper)
+    wrapper.calls, wrapper.on_call = calls, on_call
+    return wrapper
+
+
+def crash():
+    raise Crash()
+
+
+def take_over(job_id):
+    def run():
+        AnalysisJob.query.filter_by(id=job_id).update({'worker_id': 'other-runner'})
+        db.session.commit()
+    return run
+
+
+def run_until_crash(runner, job):
+    with pytest.raises(Crash):
+        runner._run_job(job)
+    db.session.rollback()
+    # The dead runner's heartbeat goes stale
+    AnalysisJob.query.filter_by(id=job.id).update({'heartbeat_at': datetime.utcnow() - timedelta(hours=1)})
+    db.session.commit()
+
+
+def store_stale(count):
+    ids = []
+    for i in range(count):
+        feedback = Feedback(
+            user_id=1, text=f'Old review {i}: the breakfast was cold', sentiment_label='neutral',
+            model_fingerprint=STALE_MODEL, prompt_fingerprint='old-prompt'
+        )
+        db.session.add(feedback)
+        db.session.flush()
+        ids.append(feedback.id)
+    db.session.commit()
+    return ids
+
+
+def test_batch_job_resumes_after_last_committed_chunk(app, db_session, analyzed):
+    job = create_batch_job(1, ROWS, 'reviews.csv')
+    analyzed.on_call[2] = crash
+    first = JobRunner(app)
+    run_until_crash(first, first._claim_next_job())
+
+    job = db.session.get(AnalysisJob, job.id)
+    assert (job.status, job.cursor, job.processed) == ('running', 3, 3)
+    assert Feedback.query.count() == 3
+
+    second = JobRunner(app)
+    resumed = second._claim_next_job()
+    assert resumed.id == job.id and resumed.worker_id == second.worker_id
+    second._run_job(resumed)
+
+    job = db.session.get(AnalysisJob, job.id)
+    assert (job.status, job.cursor, job.processed) == ('completed', 7, 7)
+    # Every row stored exactly once, in order; the crashed chunk was analyzed again, nothing before it
+    assert [f.text for f in Feedback.query.order_by(Feedback.id)] == [row['text'] for row in ROWS]
+    assert analyzed.calls[2] == [row['text'] for row in ROWS[3:6]]
+
+
+def test_reanalyze_job_resumes_after_last_committed_chunk(app, db_session, analyzed):
+    ids = store_stale(5)
+    job, _ = create_reanalyze_job(1, rows_per_minute=0)
+    assert job.total == 5
+    analyzed.on_call[2] = crash
+    first = JobRunner(app)
+    run_until_crash(first, first._claim_next_job())
+
+    job = db.session.get(AnalysisJob, job.id)
+    assert job.cursor == 3 and json.loads(job.payload)['last_id'] == ids[2]
+    assert Feedback.query.filter_by(model_fingerprint=STALE_MODEL).count() == 2
+
+    second = JobRunner(app)
+    second._run_job(second._claim_next_job())
+    job = db.session.get(AnalysisJob, job.id)
+    assert (job.status, job.processed, job.total) == ('completed', 5, 5)
+    assert Feedback.query.filter_by(model_fingerprint=STALE_MODEL).count() == 0
+    # The resumed runner only analyzed the rows after the committed cursor
+    assert analyzed.calls[2] == [f'Old review {i}: the breakfast was cold' for i in (3, 4)]
+
+
+def test_batch_job_taken_over_writes_nothing(app, db_session, analyzed):
+    job = create_batch_job(1, ROWS, 'reviews.csv')
+    analyzed.on_call[1] = take_over(job.id)
+    runner = JobRunner(app)
+    runner._run_job(runner._claim_next_job())
+
+    db.session.expire_all()
+    job = db.session.get(AnalysisJob, job.id)
+    assert (job.worker_id, job.status, job.cursor, job.processed) == ('other-runner', 'running', 0, 0)
+    assert Feedback.query.count() == 0
+    assert len(analyzed.calls) == 1
+
+
+def test_reanalyze_job_taken_over_writes_nothing(app, db_session, analyzed):
+    store_stale(5)
+    job, _ = create_reanalyze_job(1, rows_per_minute=0)
+    analyzed.on_call[1] = take_over(job.id)
+    runner = JobRunner(app)
+    runner._run_job(runner._claim_next_job())
+
+    db.session.expire_all()
+    job = db.session.get(AnalysisJob, job.id)
+    assert (job.worker_id, job.status, job.cursor, job.processed) == ('other-runner', 'running', 0, 0)
+    assert json.loads(job.payload)['last_id'] == 0
+    assert Feedback.query.filter_by(model_fingerprint=STALE_MODEL).count() == 5
+    assert len(analyzed.calls) == 1
@@ -0,0 +1,60 @@
+from services.json_scan import JsonScanState
+
+
+def scan(*pieces):
+    state = JsonScanState()
+    for piece in pieces:
+        state.feed(piece)
+    return state
+
+
+def test_done_once_top_level_object_closes():
+    state = scan('Sure: {"overall": "positive", ', '"aspects": {"Room": "negative"}', '} trailing {')
+    assert state.started and state.done
+    assert state.stack == []
+    # Nothing after the closing brace is consumed
+    assert state.position == len('Sure: {"overall": "positive", "aspects": {"Room": "negative"}}')
+
+
+def test_incomplete_object_is_not_done():
+    state = scan('{"overall": "positive", "aspects": {"Room": ')
+    assert state.started and not state.done
+    assert [container['type'] for container in state.stack] == ['object', 'object']
+
+
+def test_braces_and_escaped_quotes_inside_strings_are_text():
+    state = scan('{"reasoning": "a } b \\" ] c", "overall": "neutral"')
+    assert not state.done
+    assert state.stack[-1]['key'] == 'overall'
+    state.feed('}')
+    assert state.done
+
+
+def test_closed_spans_give_offsets_and_parent_keys():
+    text = '{"aspect_details": [{"aspect": "Room"}, {"aspect": "Food"}], "overall": "positive"}'
+    state = scan(text)
+    spans = state.closed_spans
+    assert [parent for parent, _, _ in spans] == ['aspect_details', 'aspect_details', None]
+    assert [text[start:end] for _, start, end in spans[:2]] == ['{"aspect": "Room"}', '{"aspect": "Food"}']
+    assert spans[-1][1:] == (0, len(text))
+    assert state.closed_objects == ['aspect_details', 'aspect_details', None]
+
+
+def test_string_constraint_follows_the_open_string():
+    state = scan('{"overall": "pos')
+    assert state.string_constraint() == 'labels'
+
+    state = scan('{"aspects": {"Ro')
+    assert state.string_constraint() == 'aspects'
+    state.feed('om": "neg')
+    assert state.string_constraint() == 'labels'
+
+    state = scan('{"aspect_details": [{"aspect": "Fo')
+    assert state.string_constraint() == 'aspects'
+    state.feed('od", "sentiment": "ne')
+    assert state.string_constraint() == 'labels'
+
+    # Free text and keys are unconstrained
+    assert scan('{"reasoning": "The ro').string_constraint() is None
+    assert scan('{"over').string_constraint() is None
+    assert scan('{"overall": ').string_constraint() is None
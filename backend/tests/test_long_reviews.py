@@ -0,0 +1,100 @@
+import pytest
+
+from config import Config
+
+# Four stub tokens per sentence
+LONG_REVIEW = 'Room was great. Staff were rude. Food was cold.'
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    def set_budget(tokens, max_chunks=8):
+        monkeypatch.setattr(Config, 'LONG_REVIEW_TOKEN_BUDGET', tokens)
+        monkeypatch.setattr(Config, 'LONG_REVIEW_MAX_CHUNKS', max_chunks)
+    return set_budget
+
+
+def result(label, aspects=None, details=0):
+    return {
+        'sentiment': {'label': label, 'score': {'positive': 0.75, 'negative': 0.3}[label]},
+        'aspect_sentiments': aspects or {},
+        'reasoning': label,
+        'aspect_details': [{'aspect': aspect} for aspect in (aspects or {}) for _ in range(details)]
+    }
+
+
+def test_short_review_is_one_chunk(analyzer, budget):
+    budget(8)
+    assert analyzer._split_long_review('Room was great.') == (['Room was great.'], 0)
+
+
+def test_token_length_hint_skips_tokenizing(analyzer, budget, monkeypatch):
+    budget(8)
+
+    def fail(texts):
+        raise AssertionError('tokenized despite the hint')
+    monkeypatch.setattr(analyzer.backend, 'token_counts', fail)
+    assert analyzer._split_long_review(LONG_REVIEW, token_length=4) == ([LONG_REVIEW], 0)
+
+
+def test_chunks_are_sentence_aligned(analyzer, budget):
+    budget(8)
+    chunks, dropped = analyzer._split_long_review(LONG_REVIEW)
+    assert chunks == ['Room was great. Staff were rude.', ' Food was cold.']
+    assert dropped == 0
+    assert all(n <= 8 for n in analyzer.backend.token_counts(chunks))
+
+
+def test_run_on_sentence_is_cut_into_token_windows(analyzer, budget):
+    budget(4)
+    chunks, dropped = analyzer._split_long_review('a b c d e f g h i j')
+    assert chunks == ['a b c d', ' e f g h', ' i j']
+    assert dropped == 0
+
+
+def test_chunks_beyond_the_limit_are_dropped_and_counted(analyzer, budget):
+    budget(4, max_chunks=2)
+    chunks, dropped = analyzer._split_long_review(LONG_REVIEW)
+    assert chunks == ['Room was great.', ' Staff were rude.']
+    assert dropped == 1
+    assert analyzer.generation_stats['truncated_reviews'] == 1
+
+
+def test_weighted_merge(analyzer, monkeypatch):
+    monkeypatch.setattr(Config, 'CHUNK_MERGE_RULE', 'weighted')
+    merged = analyzer._merge_chunk_results([
+        (result('positive', {'Room': 'positive'}), 30),
+        (result('negative', {'Room': 'very_negative', 'Food': 'negative'}, details=2), 10)
+    ])
+    # (0.75 * 30 + 0.3 * 10) / 40 = 0.6375, nearest label positive
+    assert merged['sentiment'] == {'label': 'positive', 'score': 0.6375}
+    # Room: 0.75 x 30 tokens and 0.1 x 10 tokens x 2 evidence -> 0.49, nearest neutral
+    assert merged['aspect_sentiments'] == {'Room': 'neutral', 'Food': 'negative'}
+    assert merged['chunks'] == 2
+    assert merged['reasoning'] == 'positive negative'
+    assert len(merged['aspect_details']) == 4
+
+
+def test_worst_merge(analyzer, monkeypatch):
+    monkeypatch.setattr(Config, 'CHUNK_MERGE_RULE', 'worst')
+    merged = analyzer._merge_chunk_results([
+        (result('positive', {'Room': 'positive'}), 30),
+        (result('negative', {'Room': 'very_negative'}), 10)
+    ])
+    assert merged['sentiment'] == {'label': 'negative', 'score': 0.3}
+    assert merged['aspect_sentiments'] == {'Room': 'very_negative'}
+
+
+def test_single_chunk_is_returned_unchanged(analyzer):
+    only = result('positive')
+    assert analyzer._merge_chunk_results([(only, 12)]) is only
+
+
+@pytest.mark.parametrize('detail', ['labels', 'full'])
+def test_truncated_chunks_reported_on_the_result(analyzer, budget, detail):
+    budget(4, max_chunks=2)
+    long_result, short_result = analyzer.analyze_with_aspects_batch([LONG_REVIEW, 'Nice room.'], detail=detail)
+    assert long_result['truncated_chunks'] == 1
+    assert long_result['chunks'] == 2
+    assert 'truncated_chunks' not in short_result
+    assert analyzer.generation_stats['truncated_reviews'] == 1
@@ -0,0 +1,91 @@
+import pytest
+
+from models import Feedback
+from services.near_duplicates import canonical_text, find_analyzed, same_review, signature_columns, simhash
+
+REVIEW = 'Great location near the metro, friendly staff, but the breakfast was cold and the room was noisy.'
+CURRENT = {'model': 'm@stub/fp32', 'distilled': None, 'prompt': 'p1'}
+
+
+def store(db_session, text, label='positive', hotel_name=None, model='m@stub/fp32', prompt='p1'):
+    feedback = Feedback(
+        user_id=1, text=text, hotel_name=hotel_name, sentiment_label=label,
+        model_fingerprint=model, prompt_fingerprint=prompt,
+        **signature_columns(simhash(text, hotel_name)[0])
+    )
+    db_session.add(feedback)
+    db_session.commit()
+    return feedback.id
+
+
+def lookup(text, limit=3, current=None):
+    canonical = canonical_text(text)
+    return find_analyzed([simhash(text)[0]], [canonical], [limit], current)[0]
+
+
+def test_canonical_text_drops_punctuation_case_and_hotel_name():
+    assert canonical_text('Great ROOM!!! 👍  Hotel Lux', 'Hotel Lux') == 'great room'
+    assert canonical_text('房间很好，服务一般。') == '房间很好 服务一般'
+
+
+def test_same_review_exact_and_within_edits():
+    a = canonical_text(REVIEW)
+    assert same_review(a, a, max_edits=0)
+    assert same_review(a, a.replace('cold', 'warm'), max_edits=1)
+    assert not same_review(a, a.replace('cold', 'warm'), max_edits=0)
+    assert not same_review(a, a.replace('cold and the', 'warm or a'), max_edits=2)
+    # Length difference alone exceeds the budget
+    assert not same_review(a, a + ' x y z', max_edits=2)
+
+
+def test_same_review_counts_cjk_characters():
+    assert same_review('房间很好', '房间不好', max_edits=1)
+    assert not same_review('房间很好', '房间不太好', max_edits=1)
+
+
+def test_same_review_uses_config_default(monkeypatch):
+    from config import Config
+    monkeypatch.setattr(Config, 'NEAR_DUPLICATE_MAX_TOKEN_EDITS', 1)
+    assert same_review('great room', 'great rooms')
+
+
+def test_find_analyzed_reuses_a_reformatted_copy(db_session):
+    feedback_id = store(db_session, REVIEW)
+    assert lookup(REVIEW.upper().replace(',', ' !!')) == (feedback_id, 0)
+
+
+def test_find_analyzed_skips_unlabelled_and_different_reviews(db_session):
+    store(db_session, REVIEW, label=None)
+    assert lookup(REVIEW) == (None, None)
+
+    store(db_session, 'Terrible location near the metro, rude staff, but the breakfast was warm and the room was quiet.')
+    # Close in wording, but not the same review: never reused
+    assert lookup(REVIEW, limit=64)[0] is None
+
+
+def test_find_analyzed_ignores_stale_fingerprints(db_session):
+    store(db_session, REVIEW, model='old@transformers/fp16')
+    assert lookup(REVIEW, current=CURRENT) == (None, None)
+    assert lookup(REVIEW)[1] == 0
+
+    feedback_id = store(db_session, REVIEW)
+    assert lookup(REVIEW, current=CURRENT) == (feedback_id, 0)
+
+
+def test_find_analyzed_keeps_input_order(db_session):
+    first = store(db_session, REVIEW)
+    second = store(db_session, '房间干净，前台服务热情，早餐种类很多，离地铁站也很近，下次还会再来。')
+    texts = ['房间干净，前台服务热情，早餐种类很多，离地铁站也很近，下次还会再来！', 'Nothing like the others at all', REVIEW]
+    results = find_analyzed(
+        [simhash(text)[0] for text in texts], [canonical_text(text) for text in texts], [3, 3, 3]
+    )
+    assert [found for found, _ in results] == [second, None, first]
+
+
+def test_find_analyzed_empty():
+    assert find_analyzed([], [], []) == []
+
+
+@pytest.mark.parametrize('text', ['', '!!!'])
+def test_empty_text_signature(text):
+    assert simhash(text) == (0, 0)
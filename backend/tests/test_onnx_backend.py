@@ -0,0 +1,40 @@
+"""
+Smoke test of choice scoring on the ONNX backend. Needs optimum[onnxruntime] and the local
+model in Config.MODEL_CACHE_DIR (the first run exports it to Config.ONNX_MODEL_DIR);
+skipped otherwise.
+"""
+from pathlib import Path
+
+import pytest
+
+from config import Config
+
+pytest.importorskip('optimum.onnxruntime')
+pytestmark = pytest.mark.skipif(
+    not (Path(Config.MODEL_CACHE_DIR) / Config.MODEL_NAME.replace('/', '--') / 'model.safetensors').exists(),
+    reason='local model not downloaded'
+)
+
+REVIEWS = ['Great room.', 'The staff were rude, the breakfast was cold and the room smelled of smoke all week.']
+
+
+@pytest.fixture(scope='module')
+def backend():
+    from services.transformers_backend import OnnxBackend
+    onnx_backend = OnnxBackend(Config.MODEL_NAME, {'generate_calls': 0, 'sequences': 0, 'generated_tokens': 0})
+    onnx_backend.load()
+    return onnx_backend
+
+
+def test_score_choices_batched_matches_single(backend, analyzer):
+    choices = list(analyzer.SCORE_CHOICES)
+    requests = [analyzer._build_request('overall_score', text=text) for text in REVIEWS]
+    assert backend.supports_choices(choices)
+
+    batched = backend.score_choices(requests, choices)
+    for request, distribution in zip(requests, batched):
+        assert list(distribution) == choices
+        assert sum(distribution.values()) == pytest.approx(1.0, abs=1e-4)
+        # Left padding in the batch does not change a review's distribution
+        single = backend.score_choices([request], choices)[0]
+        assert distribution == pytest.approx(single, abs=1e-3)
@@ -0,0 +1,49 @@
+import pytest
+
+
+def test_labels_response(analyzer):
+    result = analyzer._parse_labels_response('O:+;R:++;S:--;A:0')
+    assert result['sentiment'] == {'label': 'positive', 'score': analyzer.LABEL_SCORES['positive']}
+    assert result['aspect_sentiments'] == {
+        'Room': 'very_positive', 'Service': 'very_negative', 'Facilities': 'neutral'
+    }
+    assert result['aspect_details'] == [] and result['reasoning'] == ''
+
+
+def test_labels_response_first_label_wins(analyzer):
+    result = analyzer._parse_labels_response(' O : - ; F:+ ; O:++ ; F:-- ')
+    assert result['sentiment']['label'] == 'negative'
+    assert result['aspect_sentiments'] == {'Food': 'positive'}
+
+
+def test_labels_response_without_overall_fails(analyzer):
+    with pytest.raises(ValueError):
+        analyzer._parse_labels_response('R:+;S:-')
+
+
+def test_packed_response_maps_entries_by_id(analyzer):
+    response = '[{"id": 2, "labels": "O:-;S:--"}, {"id": 1, "labels": "O:++;R:+"}, {"id": 3, "labels": "O:0"}]'
+    results = analyzer._parse_packed_response(response, 3)
+    assert [r['sentiment']['label'] for r in results] == ['very_positive', 'negative', 'neutral']
+    assert results[0]['aspect_sentiments'] == {'Room': 'positive'}
+    assert results[1]['aspect_sentiments'] == {'Service': 'very_negative'}
+
+
+def test_packed_response_leaves_bad_entries_empty(analyzer):
+    response = (
+        '[{"id": 1, "labels": "O:+"}, {"id": 1, "labels": "O:--"}, '  # duplicate: first one kept
+        '{"id": 9, "labels": "O:+"}, {"id": "x", "labels": "O:+"}, '  # out of range, not a number
+        '{"id": 3, "labels": "R:+"}, '  # no overall label
+        '{"id": 4, "labels": "O:-'  # cut off mid-entry
+    )
+    results = analyzer._parse_packed_response(response, 4)
+    assert results[0]['sentiment']['label'] == 'positive'
+    assert results[1:] == [None, None, None]
+
+
+def test_packed_response_keeps_complete_entries_of_truncated_array(analyzer):
+    response = 'Here you go: [{"id": 1, "labels": "O:+"}, {"id": 2, "labels": "O:-;P:--"}, {"id": 3, "lab'
+    results = analyzer._parse_packed_response(response, 3)
+    assert results[0]['sentiment']['label'] == 'positive'
+    assert results[1]['aspect_sentiments'] == {'Price': 'very_negative'}
+    assert results[2] is None
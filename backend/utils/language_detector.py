@@ -1,20 +1,20 @@
 
 import re
 
+# Compiled once at import, not on every call
+CHINESE_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+
 def detect_language(text):
 
     if not text:
         return 'zh'
     
- 
-    chinese_pattern = re.compile(r'[\u4e00-\u9fff]')
-    
-   
-    chinese_chars = len(chinese_pattern.findall(text))
-    total_chars = len(text.replace(' ', '').replace('\n', ''))
+    chinese_chars = len(CHINESE_PATTERN.findall(text))
+    # Non-space characters, counted without building stripped copies of the text
+    total_chars = len(text) - text.count(' ') - text.count('\n')
  
     if total_chars > 0 and chinese_chars / total_chars > 0.3:
         return 'zh'
     else:
         return 'en'
-
@@ -0,0 +1,111 @@
+"""
+批量预处理
+One pass over a whole analysis job, before any model work: every per-row fact the
+inference and persistence stages need is computed here and returned as columns
+(lists / typed arrays aligned with the input), so nothing is recomputed row by row
+inside the inference loop. The job runner hands `aspects` and `token_length` to
+analyze_with_aspects_batch, which uses them for targeted prompts, chunking, packing
+and length scheduling instead of running the lexicon and the tokenizer per row.
+"""
+import hashlib
+import sys
+from array import array
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from services.analysis_cache import normalize_text
+from services.aspect_extractor import ASPECT_LEXICON
+from services.near_duplicates import canonical_text, signature
+from utils.language_detector import CHINESE_PATTERN
+
+
+class PreprocessedBatch:
+    """
+    Column store for one batch; column i of every field describes input row i.
+      text          stripped text (what is analyzed and stored)
+      normalized    NFKC, lower-cased, whitespace-collapsed text (the result-cache form)
+      language      'zh' / 'en', same rule as utils.language_detector.detect_language
+      char_length   array('I')
+      token_length  array('I'), estimated model tokens of the text
+      aspects       keyword-candidate aspects per row (tuples, canonical order)
+      dedupe_key    array('Q'), 64-bit hash of the normalized text (equal for duplicate reviews)
+      canonical     near-duplicate canonical text (services/near_duplicates.py)
+      simhash       array('Q'), near-duplicate signature of the canonical text
+      simhash_features  array('I'), number of features behind each signature
+    """
+    __slots__ = (
+        'text', 'normalized', 'language', 'char_length', 'token_length', 'aspects', 'dedupe_key',
+        'canonical', 'simhash', 'simhash_features'
+    )
+
+    def __init__(self, text, normalized, language, char_length, token_length, aspects, dedupe_key,
+                 canonical, simhash, simhash_features):
+        self.text = text
+        self.normalized = normalized
+        self.language = language
+        self.char_length = char_length
+        self.token_length = token_length
+        self.aspects = aspects
+        self.dedupe_key = dedupe_key
+        self.canonical = canonical
+        self.simhash = simhash
+        self.simhash_features = simhash_features
+
+    def __len__(self):
+        return len(self.text)
+
+    def nonempty(self):
+        """Indices of rows that have text left after stripping."""
+        return [i for i, length in enumerate(self.char_length) if length]
+
+    def stats(self):
+        rows = len(self.text)
+        return {
+            'rows': rows,
+            'empty_rows': rows - len(self.nonempty()),
+            'unique_rows': len(set(self.dedupe_key)),
+            'zh_rows': self.language.count('zh'),
+            'total_tokens': sum(self.token_length)
+        }
+
+
+def preprocess_batch(texts, hotel_names=None):
+    """
+    Preprocess raw review texts (None allowed) into a PreprocessedBatch aligned with the input.
+    hotel_names (optional, aligned) are left out of the near-duplicate signatures.
+    """
+    stripped = [(t or '').strip() for t in texts]
+    char_length = array('I', map(len, stripped))
+
+    language, token_length = [], array('I')
+    for text, length in zip(stripped, char_length):
+        if not length:
+            language.append('zh')
+            token_length.append(0)
+            continue
+        chinese_chars = len(CHINESE_PATTERN.findall(text))
+        # Rough model-token estimate without a tokenizer: one per CJK character plus one per
+        # whitespace-separated word (close enough to size batches, packs and chunks)
+        token_length.append(chinese_chars + len(text.split()))
+        total_chars = length - text.count(' ') - text.count('\n')
+        language.append('zh' if total_chars > 0 and chinese_chars / total_chars > 0.3 else 'en')
+
+    aspects = [tuple(found) for found in ASPECT_LEXICON.find_many(stripped)]
+    normalized = [normalize_text(text) for text in stripped]
+    dedupe_key = array('Q', (
+        int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+        for text in normalized
+    ))
+
+    canonical = [
+        canonical_text(text, hotel_name) for text, hotel_name in zip(stripped, hotel_names or [None] * len(stripped))
+    ]
+    signatures, signature_features = array('Q'), array('I')
+    for text in canonical:
+        value, feature_count = signature(text)
+        signatures.append(value)
+        signature_features.append(feature_count)
+
+    return PreprocessedBatch(
+        stripped, normalized, language, char_length, token_length, aspects, dedupe_key,
+        canonical, signatures, signature_features
+    )
@@ -28,7 +28,7 @@ const SmartAnalysis = () => {
   const [batchProcessing, setBatchProcessing] = useState(false)
   const [progress, setProgress] = useState({ current: 0, total: 0, percent: 0 })
 
-  // Single analysis logic (unchanged)
+  // Single analysis: aspects are streamed (SSE) and rendered as each one completes
   const handleAnalyze = async () => {
     if (!text.trim()) return message.warning('Please enter review text')
     setLoading(true)
@@ -36,9 +36,44 @@ const SmartAnalysis = () => {
     try {
       const createRes = await api.post('/feedback/submit', { text })
       const feedbackId = createRes.data.feedback?.id || createRes.data.id
-      const analyzeRes = await api.post(`/feedback/analyze/${feedbackId}`)
-      setResult(analyzeRes.data.analysis)
-      message.success('Analysis Complete')
+      const response = await fetch(`/api/feedback/analyze/${feedbackId}/stream`, { method: 'POST' })
+
+      if (!response.ok) {
+        const err = await response.json();
+        throw new Error(err.error || 'Analysis failed');
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        // Keep an incomplete trailing event in the buffer until the rest arrives
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const event of events) {
+          if (!event.startsWith('data: ')) continue;
+          const data = JSON.parse(event.replace('data: ', ''));
+
+          if (data.type === 'aspect') {
+            setResult(prev => ({
+              ...(prev || {}),
+              aspect_sentiments: { ...(prev?.aspect_sentiments || {}), [data.aspect.aspect]: data.aspect.sentiment },
+              aspect_details: [...(prev?.aspect_details || []), data.aspect]
+            }))
+          } else if (data.type === 'result') {
+            setResult(data.result)
+            message.success('Analysis Complete')
+          } else if (data.type === 'error') {
+            throw new Error(data.error)
+          }
+        }
+      }
     } catch (e) { 
       console.error(e)
       message.error('Analysis Failed') 
@@ -71,6 +106,8 @@ const SmartAnalysis = () => {
       // Get stream reader
       const reader = response.body.getReader();
       const decoder = new TextDecoder();
+      // Set once a final event arrives (any terminal job status, or the stream giving up)
+      let finished = false;
 
       while (true) {
         const { done, value } = await reader.read();
@@ -96,8 +133,18 @@ const SmartAnalysis = () => {
               });
 
               if (data.status === 'completed') {
+                finished = true;
                 message.success(`Complete! Processed ${data.total} reviews.`);
                 setTimeout(() => setBatchProcessing(false), 2000);
+              } else if (data.status === 'failed' || data.status === 'cancelled') {
+                finished = true;
+                message.error(`Batch job ${data.status} after ${data.current}/${data.total} reviews${data.error ? `: ${data.error}` : ''}`);
+                setBatchProcessing(false);
+              } else if (data.status === 'error' || data.status === 'timeout') {
+                // Server stopped following the job (no runner picked it up, or the stream timed out)
+                finished = true;
+                message.warning(data.error || 'Lost track of the batch job');
+                setBatchProcessing(false);
               }
             } catch (e) {
               // Ignore lines with parsing errors (may be empty lines)
@@ -106,6 +153,11 @@ const SmartAnalysis = () => {
         }
       }
 
+      if (!finished) {
+        message.warning('Progress stream closed; the batch job continues in the background.');
+        setBatchProcessing(false);
+      }
+
     } catch(e){ 
       console.error(e)
       message.error(e.message || 'Batch processing failed') 